@@ -3,7 +3,6 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import os
 import sys
-import threading
 import subprocess
 import time
 import pandas as pd
@@ -12,11 +11,21 @@ from models import User, db
 import logging
 from functools import wraps
 import glob
-import csv
-import tensorflow as tf
+from collections import deque
 import numpy as np
-import joblib
-import mysql.connector
+import db_pool
+import prices
+import forecast_cache
+import training_jobs
+import dataset_catalog
+import dataset_ingest
+import plot_index
+import preprocessing
+from config import Config
+import model_registry
+from scripts.forecast import forecast_prices
+from scripts.progress import parse_line as parse_progress_line
+from scripts.utils import load_json
 
 # Ambil logger yang sudah dikonfigurasi
 logger = logging.getLogger()
@@ -36,32 +45,18 @@ PLOT_DIR = os.path.join(BASE_DIR, "plots")
 for directory in [DATASET_DIR, MODEL_DIR, SCALER_DIR, PLOT_DIR]:
     os.makedirs(directory, exist_ok=True)
 
+# Katalog dataset (jumlah baris, rentang tanggal, checksum) untuk /datasets
+catalog = dataset_catalog.DatasetCatalog(DATASET_DIR)
+
+# Indeks plot terbaru per komoditas untuk endpoint gambar
+plots = plot_index.PlotIndex(PLOT_DIR)
+
 # Tambahkan path scripts ke sys.path agar bisa mengimport fungsi dari scripts
 if SCRIPTS_DIR not in sys.path:
     sys.path.append(SCRIPTS_DIR)
 
-# Import fungsi preprocessing dari scripts/utils.py
-try:
-    from scripts.utils import load_and_clean_data
-    logger.info("Berhasil import fungsi load_and_clean_data dari scripts/utils.py")
-except ImportError as e:
-    logger.error(f"Error saat import dari scripts/utils.py: {e}")
-    # Jika gagal import, buat fungsi kosong sebagai fallback
-    def load_and_clean_data(file_path):
-        return pd.read_csv(file_path, delimiter=';')
-
 # Validasi file
 ALLOWED_EXTENSIONS = {'csv'}
-TRAINING_STATUS = {
-    'is_training': False,
-    'komoditas': None,
-    'start_time': None,
-    'end_time': None,
-    'progress': 0,
-    'status': None,
-    'message': None
-}
-
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -74,7 +69,7 @@ def test_endpoint():
     return jsonify({
         "status": "success",
         "message": "Test endpoint berhasil diakses",
-        "training_status": TRAINING_STATUS
+        "training_status": training_jobs.to_training_status(training_queue.current())
     })
 
 # @admin_bp.route('/preprocess-data', methods=['POST'])
@@ -212,88 +207,24 @@ def preprocess_data():
                 "message": f"Tidak ada file CSV yang ditemukan untuk diproses"
             }), 404
         
-        # List untuk menyimpan hasil preprocessing
-        results = []
-        
-        # Import MinMaxScaler
-        from sklearn.preprocessing import MinMaxScaler
-        
-        # Proses setiap file
-        for file_path in csv_files:
-            try:
-                filename = os.path.basename(file_path)
-                komoditas_name = os.path.splitext(filename)[0]
-                
-                # Log info
-                logger.info(f"Preprocessing file: {filename}")
-                
-                # Baca ukuran file sebelum preprocessing
-                original_size = os.path.getsize(file_path)
-                
-                # Simpan beberapa baris file asli untuk debugging
-                original_sample = ""
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        original_sample = ''.join([next(f, '') for _ in range(5)])
-                except:
-                    pass
-                
-                # Preprocessing dataset menggunakan fungsi dari utils.py
-                start_time = time.time()
-                preprocessed_df = load_and_clean_data(file_path)
-                processing_time = time.time() - start_time
-                
-                # Normalisasi data untuk preview
-                scaler = MinMaxScaler(feature_range=(0, 1))
-                harga_normalized = scaler.fit_transform(preprocessed_df[['Harga']].values)
-                normalized_df = preprocessed_df.copy()
-                normalized_df['Harga_Normalized'] = harga_normalized
-                
-                # Simpan hasil preprocessing ke file yang sama (overwrite)
-                # PENTING: Simpan kolom Tanggal sebagai kolom (bukan index)
-                preprocessed_df.to_csv(file_path, sep=';', index=False)
-                
-                # Preview data untuk response (termasuk yang dinormalisasi)
-                preview_data = []
-                for _, row in normalized_df.head(5).iterrows():
-                    preview_data.append({
-                        'Tanggal': row['Tanggal'].strftime('%Y-%m-%d') if isinstance(row['Tanggal'], pd.Timestamp) else str(row['Tanggal']),
-                        'Harga': float(row['Harga']),
-                        'Harga_Normalized': float(row['Harga_Normalized'][0]) if isinstance(row['Harga_Normalized'], np.ndarray) else float(row['Harga_Normalized'])
-                    })
-                
-                # Tambahkan info ke hasil
-                results.append({
-                    "komoditas": komoditas_name,
-                    "file": filename,
-                    "rows": len(preprocessed_df),
-                    "original_sample": original_sample,
-                    "preview_data": preview_data,
-                    "processing_time": round(processing_time, 2),
-                    "status": "success"
-                })
-                
-                logger.info(f"Preprocessing berhasil untuk {filename}: {len(preprocessed_df)} baris")
-            except Exception as e:
-                # Jika error pada satu file, lanjut ke file berikutnya
-                logger.error(f"Error saat preprocessing {os.path.basename(file_path)}: {str(e)}")
-                results.append({
-                    "komoditas": os.path.splitext(os.path.basename(file_path))[0],
-                    "file": os.path.basename(file_path),
-                    "error": str(e),
-                    "status": "failed"
-                })
+        # Proses semua file secara paralel; file yang sudah bersih dilewati
+        force = bool(data.get('force')) if data else False
+        start_time = time.time()
+        results = preprocessing.preprocess_files(csv_files, catalog, force=force)
+        total_time = time.time() - start_time
         
         # Hitung statistik
         success_count = sum(1 for r in results if r['status'] == 'success')
         failed_count = sum(1 for r in results if r['status'] == 'failed')
+        skipped_count = sum(1 for r in results if r['status'] == 'skipped')
         
-        message = f"Preprocessing selesai: {success_count} berhasil, {failed_count} gagal"
+        message = f"Preprocessing selesai: {success_count} berhasil, {skipped_count} sudah bersih, {failed_count} gagal"
         
         return jsonify({
             "status": "success",
             "message": message,
-            "results": results
+            "results": results,
+            "total_time": round(total_time, 2)
         })
         
     except Exception as e:
@@ -334,69 +265,35 @@ def upload_csv():
             if os.path.exists(file_path):
                 logger.info(f"File {filename} sudah ada dan akan diganti")
             
-            # Simpan file (selalu menggantikan file lama jika ada)
-            file.save(file_path)
-            logger.info(f"File {filename} berhasil disimpan di {file_path}")
-            
-            # Baca file untuk mendeteksi format
+            # Baca, validasi dan normalisasi upload secara streaming, lalu ganti file
+            # lama secara atomik (file lama tetap utuh jika upload tidak valid)
             try:
-                # Coba baca beberapa baris pertama dari file untuk mendeteksi delimiter
-                with open(file_path, 'r') as f:
-                    sample = f.read(1000)  # Baca 1000 karakter pertama
-                
-                # Coba deteksi delimiter
-                sniffer = csv.Sniffer()
-                dialect = sniffer.sniff(sample)
-                delimiter = dialect.delimiter
-                
-                # Baca file dengan delimiter yang terdeteksi
-                df = pd.read_csv(file_path, delimiter=delimiter)
-                row_count = len(df)
-                
-                # Log kolom-kolom yang ada untuk debugging
-                logger.info(f"Kolom yang terdeteksi: {list(df.columns)}")
-                
+                stats = dataset_ingest.ingest_csv(file.stream, file_path)
+            except dataset_ingest.IngestError as e:
+                logger.error(f"Upload {filename} ditolak: {str(e)}")
                 return jsonify({
-                    "status": "success", 
-                    "message": f"File {filename} berhasil disimpan dengan {row_count} baris data",
-                    "file_path": file_path,
-                    "row_count": row_count,
-                    "detected_delimiter": delimiter,
-                    "detected_columns": list(df.columns),
-                    "requires_preprocessing": True,
-                    "filename": filename,
-                    "timestamp": datetime.now().isoformat(),
-                    "rows": row_count
-                })
-                
-            except Exception as e:
-                logger.error(f"Error saat membaca file CSV: {str(e)}")
-                
-                # Fallback: coba baca file tanpa mendeteksi format
-                try:
-                    df = pd.read_csv(file_path, sep=None, engine='python')
-                    row_count = len(df)
-                    return jsonify({
-                        "status": "success", 
-                        "message": f"File {filename} berhasil disimpan dengan {row_count} baris data (format tidak standar)",
-                        "file_path": file_path,
-                        "row_count": row_count,
-                        "detected_columns": list(df.columns),
-                        "requires_preprocessing": True,
-                        "filename": filename,
-                        "timestamp": datetime.now().isoformat(),
-                        "rows": row_count
-                    })
-                except Exception as e2:
-                    logger.error(f"Error lanjutan saat membaca file CSV: {str(e2)}")
-                    return jsonify({
-                        "status": "success", 
-                        "message": f"File {filename} berhasil disimpan, tetapi format file tidak dapat dideteksi",
-                        "file_path": file_path,
-                        "requires_preprocessing": True,
-                        "filename": filename,
-                        "timestamp": datetime.now().isoformat()
-                    })
+                    "status": "error",
+                    "message": f"File tidak valid: {str(e)}",
+                    "date_report": e.report
+                }), 400
+            
+            logger.info(f"File {filename} berhasil disimpan di {file_path}")
+            catalog.update(komoditas_formatted, file_path, stats=stats)
+            row_count = stats["rows"]
+            
+            return jsonify({
+                "status": "success", 
+                "message": f"File {filename} berhasil disimpan dengan {row_count} baris data",
+                "file_path": file_path,
+                "row_count": row_count,
+                "detected_delimiter": stats["delimiter"],
+                "detected_columns": stats["columns"],
+                "requires_preprocessing": True,
+                "filename": filename,
+                "timestamp": datetime.now().isoformat(),
+                "rows": row_count,
+                "stats": stats
+            })
                 
         return jsonify({"status": "error", "message": "Tipe file tidak diperbolehkan. Gunakan .csv"}), 400
         
@@ -412,68 +309,143 @@ def upload_dataset():
     """
     return upload_csv()
     
-def run_training_process(komoditas=None):
+def apply_progress_event(event, status, state):
+    """
+    Perbarui status training dari satu event progres trainer
+
+    Args:
+        event (dict): Event dari scripts/progress.py
+        status (dict): Status training yang ditampilkan ke frontend
+        state (dict): Fraksi selesai per komoditas dan waktu mulai
     """
-    Fungsi untuk menjalankan training model secara asynchronous
+    kind = event.get("event")
+    fractions = state["fractions"]
+    
+    if kind == "run_begin":
+        state["started"] = event["time"]
+        for name in event.get("komoditas", []):
+            fractions[name] = 0.0
+        status['komoditas_total'] = len(fractions)
+        status['epochs'] = event.get("epochs")
+    elif kind in ("commodity_begin", "train_begin"):
+        status['current_komoditas'] = event.get("komoditas")
+        if event.get("epochs"):
+            status['epochs'] = event["epochs"]
+    elif kind == "epoch":
+        status['current_komoditas'] = event.get("komoditas")
+        status['epoch'] = event.get("epoch")
+        status['epochs'] = event.get("epochs")
+        status['loss'] = event.get("loss")
+        status['val_loss'] = event.get("val_loss")
+        fractions[event["komoditas"]] = min(1.0, event["epoch"] / max(1, event["epochs"]))
+    elif kind == "commodity_end":
+        # Early stopping bisa berhenti sebelum epoch terakhir, hitung sebagai selesai
+        fractions[event["komoditas"]] = 1.0
+        status['komoditas_done'] = status.get('komoditas_done', 0) + 1
+        # Fine-tuning yang ditolak validasi juga tidak mengganti model
+        if event.get("status") in ("skipped", "rejected"):
+            status['komoditas_skipped'] = (status.get('komoditas_skipped') or []) + [event["komoditas"]]
+    else:
+        return
+    
+    if fractions:
+        done = sum(fractions.values()) / len(fractions)
+        status['progress'] = min(99, int(done * 100))
+        elapsed = event["time"] - state.get("started", event["time"])
+        status['eta_seconds'] = int(elapsed / done - elapsed) if done > 0 else None
+
+def consume_training_output(stream, status, output_tail):
+    """Baca output trainer baris per baris; event progres diterapkan, baris lain ke log"""
+    state = {"fractions": {}}
+    for line in stream:
+        event = parse_progress_line(line)
+        if event is not None:
+            apply_progress_event(event, status, state)
+            continue
+        line = line.rstrip()
+        if line:
+            output_tail.append(line)
+            logger.debug(f"[training] {line}")
+
+def run_training_process(komoditas=None, status=None, on_start=None, force=False, mode="train",
+                         epochs=None, tolerance=None):
     """
-    global TRAINING_STATUS
+    Menjalankan training model (dipanggil oleh antrian job training)
+    
+    Args:
+        komoditas: Nama komoditas, atau None untuk semua komoditas
+        status (dict): Status training yang diperbarui selama proses berjalan
+        on_start: Dipanggil dengan objek subprocess setelah trainer dimulai
+        force: Latih ulang walaupun fingerprint dataset tidak berubah
+        mode: 'train' (scripts/main.py) atau 'finetune' (scripts/finetune.py)
+        epochs, tolerance: Opsi fine-tuning (default FINETUNE_EPOCHS / FINETUNE_TOLERANCE)
+    """
+    if status is None:
+        status = {}
     
     try:
-        TRAINING_STATUS['is_training'] = True
-        TRAINING_STATUS['komoditas'] = komoditas
-        TRAINING_STATUS['start_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        TRAINING_STATUS['status'] = 'running'
-        TRAINING_STATUS['message'] = 'Proses training sedang berjalan'
+        status['is_training'] = True
+        status['komoditas'] = komoditas
+        status['start_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        status['status'] = 'running'
+        status['message'] = 'Proses fine-tuning sedang berjalan' if mode == 'finetune' else 'Proses training sedang berjalan'
+        status.update(progress=0, current_komoditas=None, epoch=None, epochs=None, loss=None,
+                               val_loss=None, eta_seconds=None, komoditas_done=0, komoditas_total=None,
+                               komoditas_skipped=[])
         
         # Log dimulainya training
-        logger.info(f"🔄 Memulai training model untuk komoditas: {komoditas}")
+        logger.info(f"🔄 Memulai {'fine-tuning' if mode == 'finetune' else 'training'} model untuk komoditas: {komoditas}")
         
         # Siapkan path ke script training
-        main_script = os.path.join(SCRIPTS_DIR, "main.py")
+        main_script = os.path.join(SCRIPTS_DIR, "finetune.py" if mode == 'finetune' else "main.py")
         
-        # Jalankan script main.py dengan subprocess
+        # Jalankan script dengan subprocess (-u: output tidak di-buffer)
         # Jika komoditas spesifik, tambahkan sebagai argument
-        cmd = ['python', main_script]
+        cmd = [sys.executable, '-u', main_script, '--source', Config.TRAINING_SOURCE]
         if komoditas:
             cmd.append('--komoditas')
             cmd.append(komoditas)
-            
-        # Simulasi progress (karena progress asli sulit didapat dari subprocess)
-        total_time = 1800  # 30 menit dalam detik
-        increment = 5  # update setiap 5 detik
-        steps = total_time // increment
-        
-        process = subprocess.Popen(cmd, 
-                                  stdout=subprocess.PIPE, 
-                                  stderr=subprocess.PIPE)
-        
-        # Simulasi update progress
-        for i in range(steps):
-            if process.poll() is not None:  # Proses selesai
-                break
-                
-            progress = min(99, int((i / steps) * 100))
-            TRAINING_STATUS['progress'] = progress
-            time.sleep(increment)
-        
-        # Tunggu hingga proses selesai
-        stdout, stderr = process.communicate()
+        if mode == 'finetune':
+            cmd += ['--epochs', str(epochs or Config.FINETUNE_EPOCHS),
+                    '--tolerance', str(Config.FINETUNE_TOLERANCE if tolerance is None else tolerance)]
+        elif force:
+            cmd.append('--force')
+        
+        # stderr digabung ke stdout dan dibaca baris per baris, sehingga pipe
+        # tidak pernah penuh walaupun output Keras panjang. Session baru membuat
+        # trainer dan worker ProcessPool-nya satu process group yang bisa
+        # dihentikan bersama.
+        process = subprocess.Popen(cmd,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT,
+                                  text=True,
+                                  bufsize=1,
+                                  start_new_session=True)
+        if on_start:
+            on_start(process)
+        output_tail = deque(maxlen=50)
+        consume_training_output(process.stdout, status, output_tail)
+        process.wait()
         
         if process.returncode == 0:
-            TRAINING_STATUS['status'] = 'completed'
-            TRAINING_STATUS['message'] = 'Training berhasil diselesaikan'
-            TRAINING_STATUS['progress'] = 100
+            status['status'] = 'completed'
+            status['message'] = 'Training berhasil diselesaikan'
+            skipped = set(status.get('komoditas_skipped') or [])
+            if skipped:
+                reason = "tidak ada data baru atau hasil tidak lebih baik" if mode == 'finetune' else "tidak berubah"
+                status['message'] += f" ({len(skipped)} komoditas dilewati karena {reason}: {', '.join(sorted(skipped))})"
+            status['progress'] = 100
+            status['eta_seconds'] = 0
             logger.info(f"✅ Training model berhasil untuk komoditas: {komoditas}")
             
+            # Model baru sudah ditulis, buang prediksi lama dari cache dan registry
+            forecast_cache.cache.invalidate(komoditas)
+            model_registry.registry.evict(komoditas)
+            
             # Simpan metadata ke database
             try:
                 # Jika komoditas spesifik, simpan 1 record, jika tidak, simpan untuk semua komoditas
-                db = mysql.connector.connect(
-                    host="localhost", 
-                    user="root", 
-                    password="", 
-                    database="harga_komoditas"
-                )
+                db = db_pool.get_connection()
                 cursor = db.cursor()
                 
                 # Tanggal training saat ini
@@ -496,6 +468,10 @@ def run_training_process(komoditas=None):
                     # Format nama komoditas
                     komoditas_formatted = k.lower().replace(" ", "_").replace("-", "_")
                     
+                    # Komoditas yang dilewati tidak dilatih ulang, riwayatnya tetap
+                    if komoditas_formatted in skipped:
+                        continue
+                    
                     # Get metrics if available
                     rmse = 0.0
                     mae = 0.0
@@ -558,26 +534,28 @@ def run_training_process(komoditas=None):
                 logger.error(f"❌ Error saving training metadata: {str(e)}")
             
         else:
-            TRAINING_STATUS['status'] = 'failed'
-            TRAINING_STATUS['message'] = f"Training gagal: {stderr.decode('utf-8')}"
-            logger.error(f"❌ Training model gagal: {stderr.decode('utf-8')}")
+            error_output = "\n".join(output_tail)
+            status['status'] = 'failed'
+            status['message'] = f"Training gagal: {error_output}"
+            logger.error(f"❌ Training model gagal: {error_output}")
             
     except Exception as e:
-        TRAINING_STATUS['status'] = 'failed'
-        TRAINING_STATUS['message'] = f"Training gagal: {str(e)}"
+        status['status'] = 'failed'
+        status['message'] = f"Training gagal: {str(e)}"
         logger.error(f"❌ Error saat training model: {str(e)}")
     finally:
-        TRAINING_STATUS['is_training'] = False
-        TRAINING_STATUS['end_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        status['is_training'] = False
+        status['end_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Antrian job training bersama (tabel training_jobs); dispatcher dimulai oleh app.py
+training_queue = training_jobs.TrainingJobQueue(run_training_process)
 
 @admin_bp.route('/train-model', methods=['POST'])
 # @jwt_required()  # Uncomment setelah JWT issue diselesaikan
 def train_model_endpoint():
     """
-    Endpoint untuk memulai proses training model
+    Endpoint untuk memasukkan job training model ke antrian
     """
-    global TRAINING_STATUS
-    
     # Uncomment untuk mengembalikan autentikasi
     # current_user_id = get_jwt_identity()
     # user = User.query.get(current_user_id)
@@ -585,19 +563,11 @@ def train_model_endpoint():
     # if not user or not user.is_admin:
     #     return jsonify({"status": "error", "message": "Unauthorized, admin only"}), 403
     
-    # Cek apakah proses training sedang berjalan
-    if TRAINING_STATUS['is_training']:
-        return jsonify({
-            "status": "error", 
-            "message": "Proses training sedang berjalan", 
-            "training_status": TRAINING_STATUS
-        }), 409
-    
-    data = request.get_json()
+    data = request.get_json(silent=True)
     komoditas = data.get("komoditas") if data else None
     
-    # Cek apakah file CSV untuk komoditas ada
-    if komoditas:
+    # Cek apakah file CSV untuk komoditas ada (sumber db membaca dari tabel harga_komoditas)
+    if komoditas and Config.TRAINING_SOURCE == 'csv':
         komoditas_formatted = komoditas.lower().replace(" ", "_").replace("-", "_")
         file_path = os.path.join(DATASET_DIR, f"{komoditas_formatted}.csv")
         
@@ -607,22 +577,107 @@ def train_model_endpoint():
                 "message": f"File CSV untuk {komoditas} tidak ditemukan"
             }), 404
     
-    # Mulai training dalam thread terpisah
-    training_thread = threading.Thread(target=run_training_process, args=(komoditas,))
-    training_thread.daemon = True
-    training_thread.start()
+    try:
+        job, created = training_queue.enqueue(komoditas, {"force": bool(data.get("force"))} if data else None)
+    except Exception as e:
+        logger.error(f"❌ Gagal memasukkan job training: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+    # Job yang sama masih antri atau berjalan
+    if not created:
+        return jsonify({
+            "status": "error", 
+            "message": "Proses training sedang berjalan", 
+            "job": job,
+            "training_status": training_jobs.to_training_status(job)
+        }), 409
     
+    training_queue.start()
     return jsonify({
         "status": "success", 
-        "message": "Proses training model telah dimulai",
-        "training_status": TRAINING_STATUS
+        "message": "Proses training model telah dimasukkan ke antrian",
+        "job": job,
+        "training_status": training_jobs.to_training_status(job)
+    })
+
+def finetune_after_scrape(job):
+    """
+    Masukkan job fine-tuning untuk komoditas yang datanya sudah melewati watermark
+    training (<komoditas>_training_meta.json) setelah job scraping selesai.
+    Hanya untuk sumber training db, karena data scraping tidak masuk ke CSV.
+    """
+    if not Config.FINETUNE_AFTER_SCRAPE or Config.TRAINING_SOURCE != 'db':
+        return []
+    if not (job.get("result") or {}).get("data_saved"):
+        return []
+
+    with db_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT komoditas, MAX(tanggal) FROM harga_komoditas GROUP BY komoditas")
+            latest = cursor.fetchall()
+
+    queued = []
+    for komoditas, last_date in latest:
+        komoditas_formatted = komoditas.lower().replace(" ", "_").replace("-", "_")
+        meta = load_json(os.path.join(MODEL_DIR, f"{komoditas_formatted}_training_meta.json"))
+        if not meta or last_date.strftime("%Y-%m-%d") <= meta.get("last_date", ""):
+            continue
+        finetune_job, created = training_queue.enqueue(komoditas, {"mode": "finetune"})
+        if created:
+            logger.info(f"📥 Fine-tuning {komoditas} dijadwalkan (data sampai {last_date}, watermark {meta['last_date']})")
+            queued.append(finetune_job)
+    if queued:
+        training_queue.start()
+    return queued
+
+@admin_bp.route('/finetune-model', methods=['POST'])
+# @jwt_required()  # Uncomment setelah JWT issue diselesaikan
+def finetune_model_endpoint():
+    """
+    Endpoint untuk memasukkan job fine-tuning model ke antrian. Model yang sudah
+    ada dilatih beberapa epoch pada data setelah watermark training dan hanya
+    dipromosikan jika RMSE tidak lebih buruk.
+    
+    Body JSON (opsional): komoditas, epochs, tolerance
+    """
+    data = request.get_json(silent=True) or {}
+    komoditas = data.get("komoditas")
+    epochs = data.get("epochs", Config.FINETUNE_EPOCHS)
+    tolerance = data.get("tolerance", Config.FINETUNE_TOLERANCE)
+    
+    if not isinstance(epochs, int) or not 1 <= epochs <= 100:
+        return jsonify({"status": "error", "message": "parameter epochs harus berupa angka antara 1-100"}), 400
+    if not isinstance(tolerance, (int, float)) or tolerance < 0:
+        return jsonify({"status": "error", "message": "parameter tolerance harus berupa angka >= 0"}), 400
+    
+    try:
+        job, created = training_queue.enqueue(komoditas, {"mode": "finetune", "epochs": epochs, "tolerance": tolerance})
+    except Exception as e:
+        logger.error(f"❌ Gagal memasukkan job fine-tuning: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+    if not created:
+        return jsonify({
+            "status": "error",
+            "message": "Proses training sedang berjalan",
+            "job": job,
+            "training_status": training_jobs.to_training_status(job)
+        }), 409
+    
+    training_queue.start()
+    return jsonify({
+        "status": "success",
+        "message": "Proses fine-tuning model telah dimasukkan ke antrian",
+        "job": job,
+        "training_status": training_jobs.to_training_status(job)
     })
 
 @admin_bp.route('/training-status', methods=['GET'])
 # @jwt_required()  # Uncomment setelah JWT issue diselesaikan
 def training_status():
     """
-    Endpoint untuk mendapatkan status training
+    Endpoint untuk mendapatkan status training (job yang berjalan, antrian
+    terdepan, atau job terakhir; job tertentu lewat ?job_id=)
     """
     # Uncomment untuk mengembalikan autentikasi
     # current_user_id = get_jwt_identity()
@@ -631,10 +686,51 @@ def training_status():
     # if not user:
     #     return jsonify({"status": "error", "message": "Unauthorized"}), 401
     
-    return jsonify({
-        "status": "success", 
-        "training_status": TRAINING_STATUS
-    })
+    try:
+        job_id = request.args.get('job_id', type=int)
+        job = training_queue.get(job_id) if job_id else training_queue.current()
+        if job_id and not job:
+            return jsonify({"status": "error", "message": "Job training tidak ditemukan"}), 404
+        
+        return jsonify({
+            "status": "success", 
+            "job": job,
+            "training_status": training_jobs.to_training_status(job)
+        })
+    except Exception as e:
+        logger.error(f"❌ Error mengambil status training: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@admin_bp.route('/training-jobs', methods=['GET'])
+# @jwt_required()  # Uncomment setelah JWT issue diselesaikan
+def list_training_jobs():
+    """
+    Endpoint untuk riwayat job training (?status=, ?limit=)
+    """
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        jobs = training_queue.history(limit=limit, status=request.args.get('status'))
+        return jsonify({"status": "success", "jobs": jobs})
+    except Exception as e:
+        logger.error(f"❌ Error mengambil riwayat job training: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@admin_bp.route('/training-jobs/<int:job_id>/cancel', methods=['POST'])
+# @jwt_required()  # Uncomment setelah JWT issue diselesaikan
+def cancel_training_job(job_id):
+    """
+    Endpoint untuk membatalkan job training (antrian atau yang sedang berjalan)
+    """
+    try:
+        job = training_queue.cancel(job_id)
+        if not job:
+            return jsonify({"status": "error", "message": "Job training tidak ditemukan"}), 404
+        if job["status"] in ("completed", "failed"):
+            return jsonify({"status": "error", "message": "Job training sudah selesai", "job": job}), 409
+        return jsonify({"status": "success", "message": "Pembatalan job training diproses", "job": job})
+    except Exception as e:
+        logger.error(f"❌ Error membatalkan job training: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
     
 @admin_bp.route('/training-history', methods=['GET'])
 # @jwt_required()  # Uncomment setelah JWT issue diselesaikan
@@ -643,12 +739,7 @@ def get_training_history():
     Endpoint untuk mendapatkan history training model
     """
     try:
-        db = mysql.connector.connect(
-            host="localhost", 
-            user="root", 
-            password="", 
-            database="harga_komoditas"
-        )
+        db = db_pool.get_connection()
         cursor = db.cursor(dictionary=True)
         
         query = """
@@ -746,6 +837,17 @@ def test_training():
         logger.error(f"Error saat test training: {str(e)}")
         return jsonify({"status": "error", "message": f"Error: {str(e)}"}), 500
 
+def send_plot(entry):
+    """Kirim file plot dengan ETag/Last-Modified; request kondisional dijawab 304"""
+    return send_file(
+        entry["path"],
+        mimetype='image/png',
+        conditional=True,
+        etag=entry["etag"],
+        last_modified=entry["mtime"],
+        max_age=0
+    )
+
 @admin_bp.route('/plot-image/<string:komoditas>', methods=['GET'])
 # @jwt_required()
 def get_plot_image(komoditas):
@@ -755,45 +857,22 @@ def get_plot_image(komoditas):
     try:
         komoditas_formatted = komoditas.lower().replace(" ", "_").replace("-", "_")
         
-        # Cari semua file prediksi dan training history untuk komoditas ini
-        import glob
-        prediction_files = glob.glob(os.path.join(PLOT_DIR, f"{komoditas_formatted}*predictions*.png"))
-        training_files = glob.glob(os.path.join(PLOT_DIR, f"{komoditas_formatted}*training_history*.png"))
-        
         # Jenis plot yang diminta (predictions atau training_history)
         plot_type = request.args.get('type', 'predictions')  # Default ke predictions
+        if plot_type not in plot_index.PLOT_TYPES:
+            plot_type = 'predictions'
+        
+        # Plot terbaru dari indeks, fallback ke tipe lain jika tidak ada
+        fallback_type = 'predictions' if plot_type == 'training_history' else 'training_history'
+        entry = plots.latest(komoditas_formatted, plot_type) or plots.latest(komoditas_formatted, fallback_type)
+        if entry is None:
+            logger.error(f"Tidak ada file plot ditemukan untuk {komoditas_formatted}")
+            return jsonify({
+                "status": "error", 
+                "message": f"Visualisasi untuk {komoditas} tidak ditemukan"
+            }), 404
         
-        # Log untuk debugging
-        logger.info(f"Mencari plot untuk {komoditas_formatted}, tipe: {plot_type}")
-        logger.info(f"Prediction files: {prediction_files}")
-        logger.info(f"Training files: {training_files}")
-        
-        # Pilih file terbaru sesuai tipe
-        if plot_type == 'training_history' and training_files:
-            # Urutkan berdasarkan timestamp terbaru (nama file berisi timestamp)
-            latest_file = sorted(training_files, key=os.path.getctime, reverse=True)[0]
-            logger.info(f"Menggunakan training history file terbaru: {latest_file}")
-        elif prediction_files:
-            # Urutkan berdasarkan timestamp terbaru
-            latest_file = sorted(prediction_files, key=os.path.getctime, reverse=True)[0]
-            logger.info(f"Menggunakan prediction file terbaru: {latest_file}")
-        else:
-            # Jika tidak ada file yang sesuai, coba fallback ke tipe lain
-            if plot_type == 'training_history' and prediction_files:
-                latest_file = sorted(prediction_files, key=os.path.getctime, reverse=True)[0]
-                logger.info(f"Fallback ke prediction file: {latest_file}")
-            elif plot_type == 'predictions' and training_files:
-                latest_file = sorted(training_files, key=os.path.getctime, reverse=True)[0]
-                logger.info(f"Fallback ke training history file: {latest_file}")
-            else:
-                logger.error(f"Tidak ada file plot ditemukan untuk {komoditas_formatted}")
-                return jsonify({
-                    "status": "error", 
-                    "message": f"Visualisasi untuk {komoditas} tidak ditemukan"
-                }), 404
-        
-        # Return file gambar terbaru dengan cache_timeout=0 untuk menghindari caching
-        return send_file(latest_file, mimetype='image/png')
+        return send_plot(entry)
         
     except Exception as e:
         logger.error(f"Error saat mengambil file gambar: {str(e)}")
@@ -809,29 +888,20 @@ def get_prediction_plot(komoditas):
     try:
         komoditas_formatted = komoditas.lower().replace(" ", "_").replace("-", "_")
         
-        # Cari semua file prediksi untuk komoditas ini
-        import glob
-        prediction_files = glob.glob(os.path.join(PLOT_DIR, f"{komoditas_formatted}*predictions*.png"))
-        
-        if not prediction_files:
+        entry = plots.latest(komoditas_formatted, 'predictions')
+        if entry is None:
             logger.error(f"Tidak ada file plot prediksi ditemukan untuk {komoditas_formatted}")
             return jsonify({
                 "status": "error", 
                 "message": f"Plot prediksi untuk {komoditas} tidak ditemukan"
             }), 404
-            
-        # Ambil file terbaru
-        latest_file = sorted(prediction_files, key=os.path.getctime, reverse=True)[0]
-        logger.info(f"Menggunakan prediction file terbaru: {latest_file}")
         
-        # Return file gambar terbaru dengan cache_timeout=0 untuk menghindari caching
-        return send_file(latest_file, mimetype='image/png')
+        return send_plot(entry)
         
     except Exception as e:
         logger.error(f"Error saat mengambil file plot prediksi: {str(e)}")
         return jsonify({"status": "error", "message": f"Error: {str(e)}"}), 500
 
-# Perbaikan pada endpoint get_all_plot_images
 @admin_bp.route('/plot-images', methods=['GET'])
 # @jwt_required()
 def get_all_plot_images():
@@ -846,60 +916,22 @@ def get_all_plot_images():
                          "cabai_merah_keriting", "cabai_rawit_merah", "daging_ayam_ras",
                          "daging_sapi", "gula_pasir", "kedelai", "telur_ayam_ras"]
         
-        import glob
-        
-        # Loop untuk setiap komoditas
+        index = plots.all()
         for komoditas in komoditas_list:
-            
-            # Cari semua file plot untuk komoditas ini
-            prediction_files = glob.glob(os.path.join(PLOT_DIR, f"{komoditas}*predictions*.png"))
-            training_files = glob.glob(os.path.join(PLOT_DIR, f"{komoditas}*training_history*.png"))
-            
-            # Log untuk debugging
-            print(f"Komoditas: {komoditas}")
-            print(f"Prediction files: {prediction_files}")
-            print(f"Training files: {training_files}")
-            
-            # Ambil file terbaru dari masing-masing tipe jika ada
-            latest_prediction = None
-            latest_training = None
-            
-            if prediction_files:
-                latest_prediction = sorted(prediction_files, key=os.path.getctime, reverse=True)[0]
-                latest_prediction = os.path.basename(latest_prediction)
-            
-            if training_files:
-                latest_training = sorted(training_files, key=os.path.getctime, reverse=True)[0]
-                latest_training = os.path.basename(latest_training)
+            prediction = index.get(komoditas, {}).get('predictions')
+            training = index.get(komoditas, {}).get('training_history')
             
             # Konversi nama komoditas untuk tampilan
             display_name = komoditas.replace('_', ' ').title()
             
-            # Dapatkan timestamp dari file untuk mengetahui kapan terakhir diupdate
-            prediction_timestamp = None
-            training_timestamp = None
-            
-            if latest_prediction:
-                try:
-                    prediction_timestamp = datetime.fromtimestamp(os.path.getctime(
-                        os.path.join(PLOT_DIR, latest_prediction))).strftime("%Y-%m-%d %H:%M:%S")
-                except Exception as e:
-                    print(f"Error getting prediction timestamp: {e}")
-                
-            if latest_training:
-                try:
-                    training_timestamp = datetime.fromtimestamp(os.path.getctime(
-                        os.path.join(PLOT_DIR, latest_training))).strftime("%Y-%m-%d %H:%M:%S")
-                except Exception as e:
-                    print(f"Error getting training timestamp: {e}")
-            
+            # URL berisi ETag agar browser memakai cache sampai plot berubah
             plots_data[display_name] = {
-                'prediction_plot': latest_prediction,
-                'training_plot': latest_training,
-                'prediction_url': f"/api/admin/prediction-plot/{komoditas}?t={time.time()}" if latest_prediction else None,
-                'training_url': f"/api/admin/plot-image/{komoditas}?type=training_history&t={time.time()}" if latest_training else None,
-                'prediction_timestamp': prediction_timestamp,
-                'training_timestamp': training_timestamp
+                'prediction_plot': prediction['file'] if prediction else None,
+                'training_plot': training['file'] if training else None,
+                'prediction_url': f"/api/admin/prediction-plot/{komoditas}?v={prediction['etag']}" if prediction else None,
+                'training_url': f"/api/admin/plot-image/{komoditas}?type=training_history&v={training['etag']}" if training else None,
+                'prediction_timestamp': plot_index.PlotIndex.timestamp(prediction),
+                'training_timestamp': plot_index.PlotIndex.timestamp(training)
             }
         
         return jsonify({
@@ -915,33 +947,14 @@ def get_all_plot_images():
 # @jwt_required()  # Uncomment setelah JWT issue diselesaikan
 def get_datasets():
     """
-    Endpoint untuk mendapatkan daftar dataset yang sudah diupload
+    Endpoint untuk mendapatkan daftar dataset yang sudah diupload.
+    Dijawab dari katalog tanpa membaca file; ?refresh=1 membangun ulang katalog.
     """
     try:
-        datasets = []
-        
-        # Ambil semua file CSV dari folder datasets
-        csv_files = glob.glob(os.path.join(DATASET_DIR, "*.csv"))
-        
-        for file_path in csv_files:
-            filename = os.path.basename(file_path)
-            komoditas = os.path.splitext(filename)[0]
-            
-            # Coba baca file untuk mendapatkan jumlah baris
-            try:
-                df = pd.read_csv(file_path, delimiter=';')
-                row_count = len(df)
-            except Exception as e:
-                logger.error(f"Error saat membaca file {filename}: {str(e)}")
-                row_count = 0
-                
-            # Tambahkan ke list datasets
-            datasets.append({
-                "komoditas": komoditas,
-                "filename": filename,
-                "rows": row_count,
-                "timestamp": datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d %H:%M:%S")
-            })
+        if request.args.get('refresh') == '1':
+            datasets = catalog.rebuild()
+        else:
+            datasets = catalog.list()
             
         return jsonify({
             "status": "success",
@@ -977,6 +990,7 @@ def delete_dataset():
         
         # Hapus file
         os.remove(file_path)
+        catalog.remove(komoditas_formatted)
         
         # Hapus juga file hasil preprocessing jika ada
         preprocessed_dir = os.path.join(BASE_DIR, "preprocessed")
@@ -995,10 +1009,8 @@ def delete_dataset():
         if os.path.exists(scaler_file):
             os.remove(scaler_file)
         
-        # Hapus plot terkait jika ada
-        plot_file = os.path.join(PLOT_DIR, f"{komoditas_formatted}_predictions.png")
-        if os.path.exists(plot_file):
-            os.remove(plot_file)
+        # Hapus plot terkait beserta entri indeksnya
+        plots.remove(komoditas_formatted)
         
         return jsonify({
             "status": "success",
@@ -1030,77 +1042,40 @@ def predict_future(komoditas):
                 "message": f"Model atau scaler untuk {komoditas} tidak ditemukan"
             }), 404
             
-        # Ambil data harga terakhir 60 hari
-        from app import get_last_60_prices  # Import fungsi dari app.py
-        
-        harga_60_hari = get_last_60_prices(komoditas)
-        if not harga_60_hari:
+        # Ambil data harga terakhir 60 hari beserta tanggal terakhirnya (satu query)
+        window = prices.fetch_price_window(komoditas)
+        if not window:
             return jsonify({
                 "status": "error", 
                 "message": f"Data harga 60 hari terakhir untuk {komoditas} tidak ditemukan"
             }), 404
         
-        # Load model dan scaler
-        model = tf.keras.models.load_model(model_path)
-        scaler = joblib.load(scaler_path)
-        
-        # Preprocess data
-        harga_np = np.array(harga_60_hari, dtype=np.float32).reshape(-1, 1)
-        harga_scaled = scaler.transform(harga_np)
-        
-        # Prediksi 30 hari ke depan
-        future_predictions = []
-        current_sequence = harga_scaled.flatten()[-60:]  # Ambil 60 data terakhir
+        # Load model dan scaler dari registry bersama
+        model, scaler = model_registry.registry.get(komoditas)
+        if model is None or scaler is None:
+            return jsonify({
+                "status": "error", 
+                "message": f"Model atau scaler untuk {komoditas} tidak dapat dimuat"
+            }), 500
         
         # Tanggal terakhir dari data
-        # Ambil tanggal terakhir dari database
-        db = mysql.connector.connect(
-            host="localhost", 
-            user="root", 
-            password="", 
-            database="harga_komoditas"
-        )
-        cursor = db.cursor()
-        query = """
-            SELECT MAX(tanggal) FROM harga_komoditas
-            WHERE LOWER(REPLACE(REPLACE(komoditas, ' ', '_'), '-', '_')) = LOWER(%s)
-        """
-        cursor.execute(query, (komoditas_formatted,))
-        last_date = cursor.fetchone()[0]
-        cursor.close()
-        db.close()
-        
-        if not last_date:
-            # Fallback jika tidak ada data tanggal
-            last_date = datetime.now().date()
+        last_date = window.last_date
             
         # Generate tanggal 30 hari ke depan
         future_dates = [(last_date + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(30)]
         
-        # Prediksi 30 hari ke depan
-        for _ in range(30):
-            # Reshape untuk prediksi
-            current_reshape = current_sequence.reshape(1, 60, 1)
-            
-            # Prediksi satu langkah ke depan
-            next_pred = model.predict(current_reshape)[0, 0]
-            
-            # Tambahkan ke daftar prediksi
-            future_predictions.append(next_pred)
-            
-            # Update sequence (hapus elemen pertama, tambahkan prediksi)
-            current_sequence = np.append(current_sequence[1:], next_pred)
-        
-        # Denormalisasi hasil prediksi
-        future_predictions_np = np.array(future_predictions).reshape(-1, 1)
-        future_predictions_denorm = scaler.inverse_transform(future_predictions_np)
+        # Prediksi 30 hari ke depan dalam satu graph (autoregresif)
+        future_predictions_denorm = forecast_cache.get_or_compute(
+            komoditas, 30, window,
+            lambda: forecast_prices(model, scaler, window.prices, 30)
+        )
         
         # Buat result dengan tanggal dan prediksi
         result = []
         for i in range(30):
             result.append({
                 'tanggal': future_dates[i],
-                'prediksi': round(float(future_predictions_denorm[i][0]), 2)
+                'prediksi': round(float(future_predictions_denorm[i]), 2)
             })
         
         return jsonify({
@@ -1,22 +1,29 @@
 import os
 import numpy as np
-import tensorflow as tf
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
-import joblib
 import mysql.connector
 from models import db, User
 from config import Config
 from auth import auth_bp
-from admin import admin_bp  # Impor blueprint admin yang sudah berisi semua route
+from admin import admin_bp, training_queue, finetune_after_scrape  # Impor blueprint admin yang sudah berisi semua route
 from datetime import datetime, timedelta
 import logging
 import scraping
+import scrape_jobs
+import model_registry
+import db_pool
+import schema
+import prices
+import forecast_cache
+import history_writer
+from scripts.forecast import forecast_prices, forecast_prices_batch
  
 
 app = Flask(__name__)
 app.config.from_object(Config)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_pool.sqlalchemy_engine_options()
 
 # Konfigurasi JWT
 app.config['JWT_SECRET_KEY'] = 'rahasia-kunci-yang-sangat-aman'  # Ganti dengan secret key yang benar
@@ -65,6 +72,12 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 with app.app_context():
     db.create_all()
     
+    # Terapkan migrasi skema tabel harga (kolom komoditas_key + index)
+    try:
+        schema.ensure_schema()
+    except Exception as e:
+        logger.error(f"❌ Gagal menerapkan migrasi skema: {e}")
+    
     # Buat user admin jika belum ada
     if not User.query.filter_by(username='admin').first():
         admin = User(username='admin', is_admin=True)
@@ -86,80 +99,38 @@ DATASET_DIR = os.path.join(BASE_DIR, "datasets")
 for directory in [SCALER_DIR, MODEL_DIR, DATASET_DIR]:
     os.makedirs(directory, exist_ok=True)
 
-# Fungsi koneksi database
+# Muat semua model ke memori saat aplikasi dimulai agar request pertama tidak lambat
+if app.config.get('MODEL_WARMUP_ON_STARTUP'):
+    model_registry.registry.warm_up(sorted(scraping.KOMODITAS_DIPERLUKAN))
+
+# Dispatcher antrian training; job yang terputus dipulihkan dari tabel training_jobs
+training_queue.start()
+
+# Scraping yang menambah data setelah watermark training menjadwalkan fine-tuning
+scrape_jobs.manager.on_success = finetune_after_scrape
+
+# Lanjutkan job scraping yang terputus karena proses berhenti
+try:
+    scrape_jobs.manager.resume_interrupted()
+except Exception as e:
+    logger.error(f"❌ Gagal memeriksa job scraping yang terputus: {e}")
+
+# Fungsi koneksi database (dari pool bersama, close() mengembalikan koneksi ke pool)
 def connect_db():
-    try:
-        return mysql.connector.connect(
-            host="localhost", 
-            user="root", 
-            password="", 
-            database="harga_komoditas", 
-            autocommit=True
-        )
-    except mysql.connector.Error as err:
-        print(f"❌ Gagal koneksi database: {err}")
-        return None
+    return db_pool.connect_db()
 
-# Load model dan scaler
+# Load model dan scaler (dari registry di memori, dimuat ulang jika file berubah)
 def load_model(komoditas):
-    # Format nama komoditas
-    komoditas_formatted = komoditas.lower().replace(" ", "_").replace("-", "_")
-    
-    # Buat nama file yang diharapkan
-    model_filename = f"{komoditas_formatted}_model.h5"
-    scaler_filename = f"{komoditas_formatted}_scaler.pkl"
-    
-    model_path = os.path.join(MODEL_DIR, model_filename)
-    scaler_path = os.path.join(SCALER_DIR, scaler_filename)
-    
-    logger.info(f"🔍 Mencari model di: {model_path}")
-    logger.info(f"🔍 Mencari scaler di: {scaler_path}")
-
-    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
-        print(f"❌ Model atau scaler untuk {komoditas} tidak ditemukan.")
-        return None, None
-    
-    try:
-        model = tf.keras.models.load_model(model_path)
-        scaler = joblib.load(scaler_path)
-        print("✅ Model dan scaler berhasil dimuat.")
-        return model, scaler
-    except Exception as e:
-        print(f"❌ Gagal memuat model atau scaler: {e}")
-        return None, None
+    return model_registry.registry.get(komoditas)
 
-# Ambil 60 harga terakhir dari database
+# Ambil 60 harga terakhir dari database (urut terlama -> terbaru)
 def get_last_60_prices(komoditas):
-    db = connect_db()
-    if not db:
-        return None
-    
     try:
-        with db.cursor() as cursor:
-            query = """
-                SELECT harga FROM harga_komoditas
-                WHERE LOWER(REPLACE(REPLACE(komoditas, ' ', '_'), '-', '_')) = LOWER(%s)
-                ORDER BY tanggal DESC LIMIT 60
-            """
-            cursor.execute(query, (komoditas.lower().replace(" ", "_").replace("-", "_"),))
-            result = cursor.fetchall()
-
-        if not result:
-            print(f"⚠️ Tidak ada data harga untuk {komoditas}")
-            return None
-
-        prices = [row[0] for row in result]
-        
-        if len(prices) < 60:
-            avg_price = np.mean(prices)
-            prices.extend([avg_price] * (60 - len(prices)))
-
-        return list(reversed(prices))
+        window = prices.fetch_price_window(komoditas)
     except mysql.connector.Error as err:
         print(f"❌ Gagal mengambil data harga: {err}")
         return None
-    finally:
-        db.close()
+    return window.prices if window else None
 
 
 @app.route("/api/predict-with-filter", methods=["POST"])
@@ -176,30 +147,18 @@ def predict_with_filter():
         if filter_days not in [3, 7, 30]:
             return jsonify({"status": "error", "message": "Filter hari harus 3, 7, atau 30."}), 400
         
-        # Ambil data historis untuk visualisasi
-        db = connect_db()
-        if not db:
-            return jsonify({"status": "error", "message": "Gagal terhubung ke database"}), 500
-            
+        # Ambil harga untuk prediksi dan data historis untuk visualisasi (satu query)
         try:
-            with db.cursor(dictionary=True) as cursor:
-                query = """
-                    SELECT harga, tanggal FROM harga_komoditas
-                    WHERE LOWER(REPLACE(REPLACE(komoditas, ' ', '_'), '-', '_')) = LOWER(%s)
-                    ORDER BY tanggal DESC LIMIT 60
-                """
-                cursor.execute(query, (komoditas.lower().replace(" ", "_").replace("-", "_"),))
-                historical_data = cursor.fetchall()
-        finally:
-            db.close()
+            window = prices.fetch_price_window(komoditas)
+        except mysql.connector.Error as err:
+            logger.error(f"❌ Gagal mengambil data harga: {err}")
+            return jsonify({"status": "error", "message": "Gagal terhubung ke database"}), 500
             
-        if not historical_data:
+        if window is None:
             return jsonify({"status": "error", "message": f"Data historis tidak ditemukan untuk komoditas '{komoditas}'"}), 404
         
-        # Siapkan data untuk prediksi
-        harga = get_last_60_prices(komoditas)
-        if harga is None:
-            return jsonify({"status": "error", "message": f"Data tidak ditemukan untuk '{komoditas}'"}), 404
+        historical_data = window.rows
+        harga = window.prices
 
         # Load model dan scaler
         model, scaler = load_model(komoditas)
@@ -208,10 +167,6 @@ def predict_with_filter():
         
         # Proses prediksi untuk jumlah hari yang diminta
         predictions = []
-        harga_np = np.array(harga, dtype=np.float32).reshape(-1, 1)
-        
-        # Data yang akan digunakan untuk prediksi
-        current_data = harga_np.copy()
         
         # Dapatkan tanggal terakhir dari data historis untuk mulai prediksi
         from datetime import datetime, timedelta
@@ -239,19 +194,13 @@ def predict_with_filter():
             # Fallback ke tanggal saat ini jika tidak ada data historis
             start_date = datetime.now()
         
-        for i in range(filter_days):
-            # Ambil 60 data terbaru untuk prediksi
-            input_data = current_data[-60:].reshape(1, 60, 1)
-            
-            # Normalisasi data
-            input_scaled = scaler.transform(input_data.reshape(-1, 1)).reshape(1, 60, 1)
-            
-            # Prediksi
-            pred = model.predict(input_scaled)
-            
-            # Denormalisasi hasil
-            predicted_price = scaler.inverse_transform(pred).flatten()[0]
-            
+        # Prediksi seluruh horizon dalam satu graph (autoregresif), atau dari cache
+        # jika data terakhir dan model belum berubah
+        predicted_prices = forecast_cache.get_or_compute(
+            komoditas, filter_days, window,
+            lambda: forecast_prices(model, scaler, harga, filter_days)
+        )
+        for i, predicted_price in enumerate(predicted_prices):
             # Tanggal prediksi
             prediction_date = start_date + timedelta(days=i)
             
@@ -261,10 +210,6 @@ def predict_with_filter():
                 "prediksi": float(predicted_price),
                 "hari_ke": i+1
             })
-            
-            # Update data untuk prediksi selanjutnya
-            new_value = np.array([[predicted_price]], dtype=np.float32)
-            current_data = np.vstack((current_data, new_value))
         
         # Format data historis untuk chart
         historical_data_formatted = []
@@ -286,31 +231,22 @@ def predict_with_filter():
                 "harga": float(item["harga"])
             })
         
-        # Simpan riwayat prediksi ke database
+        # Simpan riwayat prediksi ke database lewat writer di background
+        # (multi-row INSERT, tidak menambah latensi request)
         try:
-            db = connect_db()
-            if db:
-                with db.cursor() as cursor:
-                    for pred in predictions:
-                        query = """
-                            INSERT INTO prediksi_history 
-                            (komoditas, tanggal_prediksi, tanggal_dibuat, harga_prediksi, filter_days, user_id)
-                            VALUES (%s, %s, NOW(), %s, %s, %s)
-                        """
-                        # Gunakan user_id dari JWT atau null jika tidak ada
-                        user_id = None
-                        if request.headers.get('Authorization'):
-                            try:
-                                from flask_jwt_extended import get_jwt_identity
-                                user_id = get_jwt_identity()
-                            except:
-                                pass
-                                
-                        cursor.execute(
-                            query,
-                            (komoditas, pred["tanggal"], pred["prediksi"], filter_days, user_id)
-                        )
-                db.close()
+            # Gunakan user_id dari JWT atau null jika tidak ada
+            user_id = None
+            if request.headers.get('Authorization'):
+                try:
+                    user_id = get_jwt_identity()
+                except:
+                    pass
+            
+            tanggal_dibuat = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            history_writer.writer.submit([
+                (komoditas, pred["tanggal"], tanggal_dibuat, pred["prediksi"], filter_days, user_id)
+                for pred in predictions
+            ])
         except Exception as e:
             logger.error(f"Error menyimpan riwayat prediksi: {e}")
             # Lanjutkan meskipun ada error, tidak perlu return
@@ -371,8 +307,8 @@ def get_prediction_history():
                 
                 # Tambahkan filter jika ada
                 if komoditas:
-                    query += " AND LOWER(REPLACE(REPLACE(ph.komoditas, ' ', '_'), '-', '_')) = LOWER(%s)"
-                    params.append(komoditas.lower().replace(" ", "_").replace("-", "_"))
+                    query += " AND ph.komoditas_key = %s"
+                    params.append(schema.komoditas_key(komoditas))
                     
                 if start_date:
                     query += " AND ph.tanggal_dibuat >= %s"
@@ -409,6 +345,22 @@ def get_prediction_history():
         return jsonify({"status": "error", "message": f"Gagal mendapatkan riwayat prediksi: {str(e)}"}), 500
 
 
+# API status writer riwayat prediksi (kedalaman antrian, baris dibuang, dll)
+@app.route("/api/admin/prediction-history/writer-status", methods=["GET"])
+@jwt_required()
+def get_history_writer_status():
+    current_user_id = get_jwt_identity()
+    admin_check = db.session.query(User).filter_by(id=current_user_id, is_admin=True).first()
+    
+    if not admin_check:
+        return jsonify({"status": "error", "message": "Unauthorized access"}), 403
+    
+    return jsonify({
+        "status": "success",
+        "writer": history_writer.writer.stats()
+    })
+
+
 # API prediksi harga
 @app.route("/api/predict", methods=["POST"])
 def predict():
@@ -419,9 +371,10 @@ def predict():
         if not komoditas:
             return jsonify({"status": "error", "message": "Parameter 'komoditas' dibutuhkan."}), 400
         
-        harga = get_last_60_prices(komoditas)
-        if harga is None:
+        window = prices.fetch_price_window(komoditas)
+        if window is None:
             return jsonify({"status": "error", "message": f"Data tidak ditemukan untuk '{komoditas}'"}), 404
+        harga = window.prices
 
         model, scaler = load_model(komoditas)
         if not model or not scaler:
@@ -432,9 +385,10 @@ def predict():
         if harga_np.shape[0] < 60:
             return jsonify({"status": "error", "message": "Data harga kurang dari 60 hari."}), 400
 
-        harga_scaled = scaler.transform(harga_np).reshape(1, 60, 1)
-        pred = model.predict(harga_scaled)
-        harga_prediksi = scaler.inverse_transform(pred).flatten()[0]
+        harga_prediksi = forecast_cache.get_or_compute(
+            komoditas, 1, window,
+            lambda: forecast_prices(model, scaler, harga_np, 1)
+        )[0]
 
         return jsonify({"status": "success", "komoditas": komoditas, "predicted_price": round(float(harga_prediksi), 2)})
     except Exception as e:
@@ -442,6 +396,106 @@ def predict():
         return jsonify({"status": "error", "message": f"Gagal mendapatkan prediksi: {str(e)}"}), 500
 
 
+# API prediksi banyak komoditas sekaligus
+@app.route("/api/predict-batch", methods=["POST"])
+def predict_batch():
+    """
+    Body JSON:
+        {"items": [{"komoditas": "Bawang Merah", "filter_days": 7}, ...]}
+    atau
+        {"komoditas": ["Bawang Merah", ...], "filter_days": 30}
+    Jika tidak ada komoditas yang diberikan, semua komoditas diprediksi.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"status": "error", "message": "Body JSON harus berupa objek."}), 400
+        default_days = data.get("filter_days", 30)
+
+        items = data.get("items")
+        if items is None:
+            komoditas_list = data.get("komoditas") or sorted(scraping.KOMODITAS_DIPERLUKAN)
+            if isinstance(komoditas_list, str):
+                komoditas_list = [komoditas_list]
+            if not isinstance(komoditas_list, list):
+                return jsonify({"status": "error", "message": "Parameter 'komoditas' harus berupa string atau list."}), 400
+            items = [{"komoditas": k, "filter_days": default_days} for k in komoditas_list]
+
+        # Validasi input
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return jsonify({"status": "error", "message": "Parameter 'items' harus berupa list objek."}), 400
+        for item in items:
+            if not item.get("komoditas") or not isinstance(item["komoditas"], str):
+                return jsonify({"status": "error", "message": "Setiap item membutuhkan parameter 'komoditas' berupa string."}), 400
+            if item.get("filter_days", default_days) not in [3, 7, 30]:
+                return jsonify({"status": "error", "message": "Filter hari harus 3, 7, atau 30."}), 400
+
+        try:
+            windows = prices.fetch_price_windows([item["komoditas"] for item in items])
+        except mysql.connector.Error as err:
+            logger.error(f"❌ Gagal mengambil data harga: {err}")
+            return jsonify({"status": "error", "message": "Gagal terhubung ke database"}), 500
+
+        results = []
+        batch_requests = []
+        batch_targets = []
+        completed = []
+        for item in items:
+            komoditas = item["komoditas"]
+            filter_days = item.get("filter_days", default_days)
+            key = schema.komoditas_key(komoditas)
+
+            window = windows.get(key)
+            if window is None:
+                results.append({"komoditas": komoditas, "status": "error", "message": f"Data tidak ditemukan untuk '{komoditas}'"})
+                continue
+
+            model, scaler = load_model(komoditas)
+            if not model or not scaler:
+                results.append({"komoditas": komoditas, "status": "error", "message": f"Model atau scaler untuk '{komoditas}' tidak tersedia."})
+                continue
+
+            result = {"komoditas": komoditas, "status": "success", "filter_days": filter_days}
+            results.append(result)
+
+            # Prediksi yang masih valid di cache tidak perlu dihitung ulang
+            cache_key = forecast_cache.cache_key(komoditas, filter_days, window)
+            cached = forecast_cache.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                completed.append((result, window.last_date, cached))
+                continue
+
+            batch_requests.append((model, scaler, window.prices, filter_days))
+            batch_targets.append((result, window.last_date, cache_key))
+
+        # Semua komoditas dengan arsitektur model yang sama diprediksi dalam satu graph
+        forecasts = forecast_prices_batch(batch_requests) if batch_requests else []
+
+        for (result, last_date, cache_key), predicted_prices in zip(batch_targets, forecasts):
+            if cache_key:
+                forecast_cache.cache.set(cache_key, predicted_prices)
+            completed.append((result, last_date, predicted_prices))
+
+        for result, last_date, predicted_prices in completed:
+            if isinstance(last_date, str):
+                last_date = datetime.strptime(last_date, "%Y-%m-%d")
+            result["last_date"] = last_date.strftime("%Y-%m-%d")
+            result["predictions"] = [
+                {
+                    "tanggal": (last_date + timedelta(days=i + 1)).strftime("%Y-%m-%d"),
+                    "prediksi": float(predicted_price),
+                    "hari_ke": i + 1
+                }
+                for i, predicted_price in enumerate(predicted_prices)
+            ]
+
+        return jsonify({"status": "success", "results": results})
+
+    except Exception as e:
+        logger.error(f"❌ Error di API /predict-batch: {e}")
+        return jsonify({"status": "error", "message": f"Gagal mendapatkan prediksi: {str(e)}"}), 500
+
+
 # API untuk mendapatkan harga terbaru
 @app.route('/api/get_latest_prices', methods=['GET'])
 def get_latest_prices():
@@ -451,50 +505,69 @@ def get_latest_prices():
         return jsonify({'status': 'error', 'message': 'Parameter commodity tidak ditemukan'}), 400
 
     try:
-        db = connect_db()
-        if not db:
-            return jsonify({'status': 'error', 'message': 'Gagal terhubung ke database'}), 500
-
-        with db.cursor(dictionary=True) as cursor:
-            query = """
-                SELECT harga, tanggal FROM harga_komoditas
-                WHERE LOWER(REPLACE(REPLACE(komoditas, ' ', '_'), '-', '_')) = LOWER(%s)
-                ORDER BY tanggal DESC LIMIT 60
-            """
-            cursor.execute(query, (commodity.lower().replace(" ", "_").replace("-", "_"),))
-            data = cursor.fetchall()
-
-        if not data:
+        window = prices.fetch_price_window(commodity)
+
+        if window is None:
             return jsonify({'status': 'error', 'message': f'Tidak ada data harga untuk {commodity}'}), 404
 
-        return jsonify({'status': 'success', 'latest_prices': data})
+        return jsonify({'status': 'success', 'latest_prices': window.rows})
     except Exception as e:
         logger.error(f"❌ Error saat mengambil data: {e}")
         return jsonify({'status': 'error', 'message': f'Gagal mengambil data harga: {str(e)}'}), 500
-    finally:
-        if db:
-            db.close()
             
 
 @app.route('/api/scrape', methods=['POST'])
 def scrape_data():
     """
     Endpoint untuk scraping data
+    
+    Scraping selalu berjalan sebagai job di background dan menyimpan data per chunk.
+    Mode dipilih lewat query string (?mode=incremental) atau body JSON:
+    - full (default): periksa semua tanggal dalam days_back
+    - incremental: hanya tanggal setelah high-water mark ditambah gap terbaru
+    
+    Secara default endpoint langsung mengembalikan job (202); progres dibaca
+    lewat /api/scrape/status/<job_id> atau /api/scrape/stream/<job_id>. Dengan
+    "wait": true (atau ?wait=true) endpoint menunggu job selesai dan
+    mengembalikan hasil scraping.
     """
     
     try:
-        data = request.json or {}
+        data = request.get_json(silent=True) or {}
         days_back = data.get('days_back', 70)
+        mode = request.args.get('mode') or data.get('mode', 'full')
+        wait = data.get('wait', request.args.get('wait', 'false') == 'true')
         
         if not isinstance(days_back, int) or days_back <= 0 or days_back > 365:
             return jsonify({
                 'status': 'error',
                 'message': 'parameter days_back harus berupa angka antara 1-365'
             }), 400
+        
+        if mode not in ('full', 'incremental'):
+            return jsonify({
+                'status': 'error',
+                'message': 'parameter mode harus full atau incremental'
+            }), 400
             
-        logger.info(f"menjalankan scraping untuk {days_back} hari terakhir")
-        result = scraping.scrape_and_store(days_back)
+        job, created = scrape_jobs.manager.start(days_back, mode)
+        if created:
+            logger.info(f"menjalankan scraping ({mode}) untuk {days_back} hari terakhir, job {job['id']}")
+        else:
+            logger.info(f"scraping job {job['id']} masih berjalan")
         
+        if not wait:
+            return jsonify({'status': 'accepted', 'job': job}), 202
+        
+        job = scrape_jobs.manager.wait(job['id'])
+        if job.get('result'):
+            result = dict(job['result'])
+        elif job['status'] == 'completed':
+            # Job dijalankan worker lain: hasil dibentuk dari status yang tersimpan
+            result = {'status': 'success', 'data_saved': job['data_saved'], 'failed_dates': job['failed_dates']}
+        else:
+            result = {'status': 'error', 'message': job.get('message')}
+        result['job_id'] = job['id']
         return jsonify(result)
     
     except Exception as e:
@@ -504,6 +577,34 @@ def scrape_data():
             'message': str(e)
         }), 500
 
+@app.route('/api/scrape/status', methods=['GET'])
+@app.route('/api/scrape/status/<job_id>', methods=['GET'])
+def scrape_status(job_id=None):
+    """Status job scraping (job terakhir jika job_id tidak diberikan)"""
+    try:
+        job = scrape_jobs.manager.get(job_id)
+        if not job:
+            return jsonify({'status': 'error', 'message': 'Job scraping tidak ditemukan'}), 404
+        return jsonify({'status': 'success', 'job': job})
+    
+    except Exception as e:
+        logger.error(f"Error pada endpoint /api/scrape/status: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/scrape/stream/<job_id>', methods=['GET'])
+def scrape_stream(job_id):
+    """Progres job scraping sebagai server-sent events"""
+    if not scrape_jobs.manager.get(job_id):
+        return jsonify({'status': 'error', 'message': 'Job scraping tidak ditemukan'}), 404
+    return Response(
+        stream_with_context(scrape_jobs.manager.stream(job_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/check-mapping', methods=['GET'])
 def check_mapping():
     """Endpoint untuk memeriksa integritas pemetaan komoditas"""
@@ -2,10 +2,58 @@ import os
 from datetime import timedelta
 
 class Config:
+    # Koneksi database MySQL
+    DB_HOST = os.environ.get('DB_HOST', 'localhost')
+    DB_PORT = int(os.environ.get('DB_PORT', 3306))
+    DB_USER = os.environ.get('DB_USER', 'root')
+    DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+    DB_NAME = os.environ.get('DB_NAME', 'harga_komoditas')
+    # Pool koneksi bersama (lihat db_pool.py)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))  # mysql.connector maksimal 32
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # detik menunggu koneksi kosong
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
     SECRET_KEY = 'your-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = 'mysql+pymysql://root:@localhost/harga_komoditas'
+    SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    ALLOWED_EXTENSIONS = {'csv'}
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'csv'}
+    # Muat semua model dan scaler ke memori saat aplikasi dimulai
+    MODEL_WARMUP_ON_STARTUP = os.environ.get('MODEL_WARMUP_ON_STARTUP', '1') == '1'
+    # Cache hasil prediksi (lihat forecast_cache.py)
+    FORECAST_CACHE_SIZE = int(os.environ.get('FORECAST_CACHE_SIZE', 256))
+    FORECAST_CACHE_TTL = int(os.environ.get('FORECAST_CACHE_TTL', 6 * 3600))  # detik
+    # Writer riwayat prediksi di background (lihat history_writer.py)
+    HISTORY_WRITER_BATCH_SIZE = int(os.environ.get('HISTORY_WRITER_BATCH_SIZE', 200))
+    HISTORY_WRITER_FLUSH_INTERVAL = float(os.environ.get('HISTORY_WRITER_FLUSH_INTERVAL', 2.0))  # detik
+    HISTORY_WRITER_QUEUE_SIZE = int(os.environ.get('HISTORY_WRITER_QUEUE_SIZE', 10000))
+    # Scraper API harga pangan (lihat fetch_engine.py)
+    SCRAPER_BASE_URL = os.environ.get('SCRAPER_BASE_URL', 'https://api-panelhargav2.badanpangan.go.id/api/front/harga-pangan-table-province')
+    SCRAPER_CONCURRENCY = int(os.environ.get('SCRAPER_CONCURRENCY', 8))
+    SCRAPER_RATE_LIMIT = float(os.environ.get('SCRAPER_RATE_LIMIT', 5))  # request per detik per host
+    SCRAPER_MAX_RETRIES = int(os.environ.get('SCRAPER_MAX_RETRIES', 3))
+    SCRAPER_BACKOFF = float(os.environ.get('SCRAPER_BACKOFF', 0.5))  # detik, dikali 2 setiap percobaan
+    SCRAPER_TIMEOUT = float(os.environ.get('SCRAPER_TIMEOUT', 10))
+    SCRAPER_CHUNK_SIZE = int(os.environ.get('SCRAPER_CHUNK_SIZE', 10))  # tanggal per commit
+    SCRAPER_HEARTBEAT_INTERVAL = float(os.environ.get('SCRAPER_HEARTBEAT_INTERVAL', 5))  # detik
+    SCRAPER_STALE_AFTER = int(os.environ.get('SCRAPER_STALE_AFTER', 60))  # detik tanpa heartbeat sebelum job dianggap terputus
+    # Antrian job training (lihat training_jobs.py)
+    TRAINING_MAX_CONCURRENT = int(os.environ.get('TRAINING_MAX_CONCURRENT', 1))  # job berjalan bersamaan di semua worker
+    TRAINING_POLL_INTERVAL = float(os.environ.get('TRAINING_POLL_INTERVAL', 5))  # detik
+    TRAINING_HEARTBEAT_INTERVAL = float(os.environ.get('TRAINING_HEARTBEAT_INTERVAL', 5))  # detik
+    TRAINING_STALE_AFTER = int(os.environ.get('TRAINING_STALE_AFTER', 60))  # detik tanpa heartbeat sebelum job dianggap terputus
+    TRAINING_MAX_ATTEMPTS = int(os.environ.get('TRAINING_MAX_ATTEMPTS', 2))
+    # Sumber data training: csv (datasets/) atau db (tabel harga_komoditas, lihat scripts/db_source.py)
+    TRAINING_SOURCE = os.environ.get('TRAINING_SOURCE', 'csv')
+    # Fine-tuning otomatis setelah scraping menambah data melewati watermark training (sumber db)
+    FINETUNE_AFTER_SCRAPE = os.environ.get('FINETUNE_AFTER_SCRAPE', '1') == '1'
+    FINETUNE_EPOCHS = int(os.environ.get('FINETUNE_EPOCHS', 5))
+    FINETUNE_TOLERANCE = float(os.environ.get('FINETUNE_TOLERANCE', 0.0))  # kenaikan RMSE relatif yang diterima
+    # Worker preprocessing dataset paralel (lihat preprocessing.py)
+    PREPROCESS_WORKERS = int(os.environ.get('PREPROCESS_WORKERS', 4))
+    # Total ukuran file minimal sebelum parse dipindah ke process pool (start proses spawn mahal)
+    PREPROCESS_PROCESS_MIN_BYTES = int(os.environ.get('PREPROCESS_PROCESS_MIN_BYTES', 64 * 1024 * 1024))
\ No newline at end of file
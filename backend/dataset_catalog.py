@@ -0,0 +1,173 @@
+import os
+import json
+import glob
+import hashlib
+import tempfile
+import threading
+import logging
+from datetime import datetime
+import pandas as pd
+from scripts.utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+def file_checksum(file_path, chunk_size=1024 * 1024):
+    """SHA-256 isi file, dibaca per chunk"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe_dataframe(df):
+    """
+    Statistik dataset (jumlah baris, rentang tanggal, harga min/maks).
+    Kolom yang tidak bisa dibaca menghasilkan None, bukan error.
+    """
+    stats = {"rows": int(len(df)), "start_date": None, "end_date": None, "min_price": None, "max_price": None}
+    if "Tanggal" in df.columns and len(df):
+        tanggal = df["Tanggal"]
+        if not pd.api.types.is_datetime64_any_dtype(tanggal):
+            tanggal = pd.to_datetime(tanggal, errors="coerce", dayfirst=True)
+        if tanggal.notna().any():
+            stats["start_date"] = tanggal.min().strftime("%Y-%m-%d")
+            stats["end_date"] = tanggal.max().strftime("%Y-%m-%d")
+    if "Harga" in df.columns and len(df):
+        harga = pd.to_numeric(df["Harga"], errors="coerce")
+        if harga.notna().any():
+            stats["min_price"] = float(harga.min())
+            stats["max_price"] = float(harga.max())
+    return stats
+
+
+class DatasetCatalog:
+    """
+    Katalog dataset di datasets/catalog.json: statistik, checksum dan mtime per
+    komoditas. Diperbarui saat upload, preprocessing dan hapus, sehingga daftar
+    dataset tidak perlu membaca file CSV sama sekali. Perubahan dari proses lain
+    (worker gunicorn lain) terbaca lewat mtime file katalog, dan setiap
+    baca-ubah-tulis memegang kunci file (catalog.lock) agar tidak saling menimpa.
+    """
+
+    def __init__(self, dataset_dir):
+        self.dataset_dir = dataset_dir
+        self.path = os.path.join(dataset_dir, "catalog.json")
+        self.lock_path = os.path.join(dataset_dir, ".catalog.lock")
+        self._entries = None
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+
+        if self._entries is not None and mtime_ns == self._mtime_ns:
+            return self._entries
+
+        if mtime_ns is None:
+            # Katalog belum ada: bangun sekali dari file yang sudah ada
+            self._rebuild()
+        else:
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f)
+                self._mtime_ns = mtime_ns
+            except ValueError:
+                logger.warning("⚠️ Katalog dataset rusak, dibangun ulang")
+                self._rebuild()
+        return self._entries
+
+    def _rebuild(self):
+        with file_lock(self.lock_path):
+            self._entries = {}
+            self._scan()
+            self._save()
+
+    def _read_locked(self):
+        """Isi katalog terbaru di disk; dipanggil saat memegang kunci file"""
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+            self._scan()
+        return self._entries
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.dataset_dir, prefix=".catalog.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def _scan(self):
+        for file_path in glob.glob(os.path.join(self.dataset_dir, "*.csv")):
+            komoditas = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                df = pd.read_csv(file_path, delimiter=';')
+                stats = describe_dataframe(df)
+            except Exception as e:
+                logger.error(f"Error saat membaca file {file_path}: {str(e)}")
+                stats = {"rows": 0}
+            self._entries[komoditas] = self._entry(komoditas, file_path, stats)
+
+    @staticmethod
+    def _entry(komoditas, file_path, stats):
+        stat = os.stat(file_path)
+        return {
+            "komoditas": komoditas,
+            "filename": os.path.basename(file_path),
+            **stats,
+            # Checksum dari proses upload dipakai langsung agar file tidak dibaca ulang
+            "checksum": stats.get("checksum") or file_checksum(file_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "timestamp": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def update(self, komoditas, file_path, df=None, stats=None, **extra):
+        """
+        Catat atau perbarui satu dataset
+
+        Args:
+            df: DataFrame isi file (untuk menghitung statistik), atau
+            stats: Statistik yang sudah dihitung (misalnya dari proses upload)
+            extra: Field tambahan yang ikut disimpan
+        """
+        if stats is None:
+            stats = describe_dataframe(df) if df is not None else describe_dataframe(pd.read_csv(file_path, delimiter=';'))
+        entry = {**self._entry(komoditas, file_path, stats), **extra}
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read_locked()
+            entries[komoditas] = {**entries.get(komoditas, {}), **entry}
+            self._save()
+        return entry
+
+    def remove(self, komoditas):
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read_locked()
+            if entries.pop(komoditas, None) is not None:
+                self._save()
+
+    def rebuild(self):
+        """Bangun ulang katalog dari semua file CSV"""
+        with self._lock:
+            self._rebuild()
+            return list(self._entries.values())
+
+    def list(self):
+        with self._lock:
+            return sorted(self._load().values(), key=lambda entry: entry["komoditas"])
+
+    def get(self, komoditas):
+        with self._lock:
+            return self._load().get(komoditas)
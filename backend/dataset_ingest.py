@@ -0,0 +1,244 @@
+import io
+import os
+import codecs
+import re
+import csv
+import hashlib
+import tempfile
+import logging
+import pandas as pd
+from scripts.utils import parse_dates, DateFormatError, CSV_DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+DELIMITERS = [';', ',', '\t', '|']
+THOUSANDS_DOT = re.compile(r'^\d{1,3}(\.\d{3})+$')
+THOUSANDS_COMMA = re.compile(r'^\d{1,3}(,\d{3})+$')
+
+
+class IngestError(ValueError):
+    """File upload tidak valid; dataset lama tidak diubah"""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+def detect_delimiter(header_line):
+    """Delimiter yang paling sering muncul di baris header"""
+    counts = {delimiter: header_line.count(delimiter) for delimiter in DELIMITERS}
+    delimiter = max(counts, key=counts.get)
+    if counts[delimiter] == 0:
+        raise IngestError("Delimiter tidak terdeteksi, file harus memiliki minimal 2 kolom (Tanggal dan Harga)")
+    return delimiter
+
+
+def find_columns(header):
+    """Indeks kolom tanggal dan harga (berdasarkan nama, atau kolom pertama dan kedua)"""
+    names = [name.strip().lower() for name in header]
+    date_index = names.index('tanggal') if 'tanggal' in names else 0
+    if 'harga' in names:
+        price_index = names.index('harga')
+    else:
+        price_index = next(i for i in range(len(names)) if i != date_index)
+    return date_index, price_index
+
+
+def parse_price(value):
+    """
+    Harga dengan format lokal ('Rp 15.000', '15,000', '15000,50') menjadi float.
+    Mengembalikan None untuk nilai kosong.
+    """
+    value = value.strip().replace('Rp', '').replace('rp', '').replace(' ', '')
+    if not value or value == '-':
+        return None
+    if '.' in value and ',' in value:
+        # 15.000,50 -> titik ribuan, koma desimal
+        value = value.replace('.', '').replace(',', '.')
+    elif THOUSANDS_DOT.match(value):
+        value = value.replace('.', '')
+    elif THOUSANDS_COMMA.match(value):
+        value = value.replace(',', '')
+    else:
+        value = value.replace(',', '.')
+    return float(value)
+
+
+def format_price(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def parse_chunk_dates(line_numbers, values, hint=None, hint_rows=0):
+    """
+    Parse tanggal satu chunk dengan parse_dates dari scripts/utils (registry
+    DATE_FORMATS yang sama dengan preprocessing dan training)
+
+    Returns:
+        tuple: (list string tanggal YYYY-MM-DD, format yang terdeteksi)
+
+    Raises:
+        IngestError: Format campuran atau tidak dikenali, dengan laporan per format
+    """
+    # Index = nomor baris file - 2, sehingga laporan parse_dates menyebut nomor baris file
+    series = pd.Series(values, index=[line_number - 2 for line_number in line_numbers], dtype=object)
+    try:
+        parsed, date_format = parse_dates(series, hint=hint)
+    except DateFormatError as e:
+        raise IngestError(str(e), e.report) from e
+    if hint and date_format != hint:
+        # Seluruh chunk berformat lain dari chunk sebelumnya: tetap format campuran
+        examples = [f"baris {line_number}: {value!r} ({date_format})" for line_number, value in zip(line_numbers[:5], values)]
+        report = {"formats": {hint: hint_rows, date_format: len(values)}, "detected": hint, "examples": examples}
+        raise IngestError(
+            f"Format tanggal campuran ({hint} dan {date_format}). Contoh: {'; '.join(examples)}", report
+        )
+    return parsed.dt.strftime(CSV_DATE_FORMAT).tolist(), date_format
+
+
+class _HashingWriter:
+    """File tujuan yang sekaligus menghitung checksum isi yang ditulis"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.digest.update(data)
+        self.f.write(data)
+        return len(text)
+
+
+def ingest_csv(stream, dest_path, chunk_rows=5000, max_invalid_ratio=0.1, min_rows=1):
+    """
+    Baca upload CSV secara streaming, validasi dan normalisasi dalam satu kali baca
+
+    Baris dibaca per chunk, tanggal dinormalisasi ke YYYY-MM-DD (format dideteksi
+    per chunk dengan registry yang sama dengan preprocessing; format campuran
+    ditolak), harga ke angka, delimiter ke ';'. Hasil ditulis ke file sementara di direktori yang sama lalu
+    menggantikan dest_path dengan os.replace, sehingga dataset lama tetap utuh
+    jika upload gagal di tengah jalan.
+
+    Args:
+        stream: File biner (misalnya FileStorage.stream dari Flask)
+        max_invalid_ratio: Proporsi baris tidak valid maksimal sebelum upload ditolak
+
+    Returns:
+        dict: Statistik (rows, invalid_rows, missing_price, rentang tanggal, harga min/maks,
+              delimiter, kolom, format tanggal file asli dan file tersimpan, checksum)
+
+    Raises:
+        IngestError: Jika file tidak valid
+    """
+    try:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    except AttributeError:
+        # SpooledTemporaryFile sebelum Python 3.11 tidak memiliki readable()/seekable()
+        text = codecs.getreader('utf-8-sig')(stream, errors='replace')
+    header_line = text.readline()
+    if not header_line.strip():
+        raise IngestError("File kosong")
+
+    delimiter = detect_delimiter(header_line)
+    header = next(csv.reader([header_line], delimiter=delimiter))
+    date_index, price_index = find_columns(header)
+
+    stats = {
+        "rows": 0, "invalid_rows": 0, "missing_price": 0, "duplicate_dates": 0, "out_of_order": 0,
+        "start_date": None, "end_date": None, "min_price": None, "max_price": None,
+        "delimiter": delimiter, "columns": [name.strip() for name in header], "errors": []
+    }
+    source_format = None
+    seen_dates = set()
+    last_date = None
+
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=f".{os.path.basename(dest_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            out = _HashingWriter(raw)
+            writer = csv.writer(out, delimiter=';', lineterminator='\n')
+            writer.writerow(['Tanggal', 'Harga'])
+
+            reader = csv.reader(text, delimiter=delimiter)
+
+            def invalid(line_number, message):
+                stats["invalid_rows"] += 1
+                if len(stats["errors"]) < 5:
+                    stats["errors"].append(f"Baris {line_number}: {message}")
+
+            def flush(chunk):
+                nonlocal source_format, last_date
+                if not chunk:
+                    return
+                line_numbers, raw_dates, prices = zip(*chunk)
+                days, source_format = parse_chunk_dates(list(line_numbers), list(raw_dates), source_format, stats["rows"])
+                rows = []
+                for day, harga in zip(days, prices):
+                    if day in seen_dates:
+                        stats["duplicate_dates"] += 1
+                    seen_dates.add(day)
+                    if last_date and day < last_date:
+                        stats["out_of_order"] += 1
+                    last_date = day
+
+                    stats["start_date"] = min(stats["start_date"] or day, day)
+                    stats["end_date"] = max(stats["end_date"] or day, day)
+                    if harga is None:
+                        stats["missing_price"] += 1
+                        rows.append((day, ''))
+                    else:
+                        stats["min_price"] = harga if stats["min_price"] is None else min(stats["min_price"], harga)
+                        stats["max_price"] = harga if stats["max_price"] is None else max(stats["max_price"], harga)
+                        rows.append((day, format_price(harga)))
+                stats["rows"] += len(rows)
+                writer.writerows(rows)
+
+            chunk = []
+            for line_number, row in enumerate(reader, start=2):
+                if not row or not any(cell.strip() for cell in row):
+                    continue
+                try:
+                    tanggal = row[date_index].strip()
+                    if not tanggal:
+                        raise ValueError("Tanggal kosong")
+                    harga = parse_price(row[price_index]) if price_index < len(row) else None
+                    if harga is not None and harga < 0:
+                        raise ValueError(f"Harga negatif: {harga}")
+                except (ValueError, IndexError) as e:
+                    invalid(line_number, e)
+                    continue
+
+                chunk.append((line_number, tanggal, harga))
+                if len(chunk) >= chunk_rows:
+                    flush(chunk)
+                    chunk = []
+            flush(chunk)
+
+            total = stats["rows"] + stats["invalid_rows"]
+            if stats["rows"] < min_rows:
+                raise IngestError(f"Tidak ada baris valid dalam file. {'; '.join(stats['errors'])}".strip())
+            if total and stats["invalid_rows"] / total > max_invalid_ratio:
+                raise IngestError(
+                    f"{stats['invalid_rows']} dari {total} baris tidak valid. {'; '.join(stats['errors'])}"
+                )
+
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        # Lepas wrapper tanpa menutup stream milik pemanggil
+        if hasattr(text, 'detach'):
+            text.detach()
+
+    # File tersimpan selalu YYYY-MM-DD; format asli dicatat terpisah
+    stats["source_date_format"] = source_format
+    stats["date_format"] = CSV_DATE_FORMAT
+    stats["checksum"] = out.digest.hexdigest()
+    logger.info(f"✅ {stats['rows']} baris disimpan ke {dest_path} ({stats['invalid_rows']} baris tidak valid)")
+    return stats
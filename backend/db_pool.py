@@ -0,0 +1,116 @@
+import time
+import threading
+import logging
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import pooling
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+POOL_NAME = "commoprize_pool"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Buat pool koneksi saat pertama kali dibutuhkan (bukan saat import)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=Config.DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    host=Config.DB_HOST,
+                    port=Config.DB_PORT,
+                    user=Config.DB_USER,
+                    password=Config.DB_PASSWORD,
+                    database=Config.DB_NAME,
+                    connection_timeout=Config.DB_CONNECT_TIMEOUT
+                )
+                logger.info(f"✅ Pool koneksi database dibuat (ukuran {Config.DB_POOL_SIZE})")
+    return _pool
+
+
+def get_connection():
+    """
+    Ambil koneksi dari pool. Memanggil close() pada koneksi akan
+    mengembalikannya ke pool, bukan menutup koneksi TCP.
+
+    Autocommit mati (sama seperti koneksi mysql.connector biasa): penulisan
+    harus diakhiri conn.commit(). Transaksi yang belum di-commit dibatalkan
+    saat koneksi dikembalikan ke pool (pool_reset_session).
+
+    Jika pool sedang penuh, tunggu sampai DB_POOL_TIMEOUT detik.
+    Jika DB_POOL_PRE_PING aktif, koneksi diperiksa (dan disambung ulang bila
+    terputus) sebelum diberikan.
+
+    Raises:
+        mysql.connector.Error: Jika koneksi tidak bisa didapatkan
+    """
+    deadline = time.monotonic() + Config.DB_POOL_TIMEOUT
+    while True:
+        try:
+            conn = _get_pool().get_connection()
+            break
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+    if Config.DB_POOL_PRE_PING:
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+        except mysql.connector.Error:
+            conn.close()
+            raise
+
+    return conn
+
+
+def connect_db():
+    """Ambil koneksi dari pool, atau None jika gagal (kompatibel dengan connect_db lama)"""
+    try:
+        return get_connection()
+    except mysql.connector.Error as err:
+        logger.error(f"❌ Gagal koneksi database: {err}")
+        return None
+
+
+@contextmanager
+def connection():
+    """
+    Context manager koneksi dari pool:
+
+        with db_pool.connection() as conn:
+            ...
+            conn.commit()
+
+    Jika terjadi exception, transaksi yang belum di-commit di-rollback.
+    """
+    conn = get_connection()
+    try:
+        yield conn
+    except BaseException:
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+def sqlalchemy_engine_options():
+    """Opsi engine SQLAlchemy (models.db) dengan pengaturan pool yang sama"""
+    return {
+        "pool_size": Config.DB_POOL_SIZE,
+        "max_overflow": 0,
+        "pool_timeout": Config.DB_POOL_TIMEOUT,
+        "pool_recycle": Config.DB_POOL_RECYCLE,
+        "pool_pre_ping": Config.DB_POOL_PRE_PING,
+        "connect_args": {"connect_timeout": Config.DB_CONNECT_TIMEOUT},
+    }
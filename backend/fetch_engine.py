@@ -0,0 +1,120 @@
+import time
+import random
+import threading
+import logging
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Status HTTP yang layak dicoba ulang
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket sederhana: maksimal `rate` request per detik per host"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = {}
+        self._updated = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = self._tokens.get(host, self.capacity)
+                tokens = min(self.capacity, tokens + (now - self._updated.get(host, now)) * self.rate)
+                self._updated[host] = now
+                if tokens >= 1:
+                    self._tokens[host] = tokens - 1
+                    return
+                self._tokens[host] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class FetchEngine:
+    """
+    Pengambil data API harga pangan secara paralel
+
+    - Session HTTP bersama dengan pool koneksi (keep-alive)
+    - Maksimal `concurrency` request berjalan bersamaan
+    - Rate limit per host (request per detik)
+    - Retry dengan exponential backoff untuk error jaringan dan status 429/5xx
+
+    base_url bisa diarahkan ke server stub lokal untuk pengujian.
+    """
+
+    def __init__(self, base_url=None, concurrency=None, rate_limit=None,
+                 max_retries=None, backoff=None, timeout=None):
+        self.base_url = base_url or Config.SCRAPER_BASE_URL
+        self.concurrency = concurrency or Config.SCRAPER_CONCURRENCY
+        self.max_retries = Config.SCRAPER_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.SCRAPER_BACKOFF if backoff is None else backoff
+        self.timeout = timeout or Config.SCRAPER_TIMEOUT
+        self.rate_limiter = RateLimiter(Config.SCRAPER_RATE_LIMIT if rate_limit is None else rate_limit)
+        self.host = urlparse(self.base_url).netloc
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, params):
+        """
+        Request GET dengan rate limit dan retry
+
+        Returns:
+            dict: Respons JSON
+
+        Raises:
+            requests.RequestException: Jika semua percobaan gagal
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(self.host)
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    raise requests.HTTPError(f"{response.status_code} dari server", response=response)
+                response.raise_for_status()
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as err:
+                status = err.response.status_code if getattr(err, "response", None) is not None else None
+                retryable = status is None or status in RETRY_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+                attempt += 1
+                logger.warning(f"⚠️ Request gagal ({err}), mencoba lagi ({attempt}/{self.max_retries}) dalam {delay:.1f} detik")
+                time.sleep(delay)
+
+    def fetch_many(self, jobs):
+        """
+        Jalankan banyak request secara paralel
+
+        Args:
+            jobs (list): List of (key, params)
+
+        Yields:
+            tuple: (key, data, error) sesuai urutan selesai; data None jika error
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self.fetch, params): key for key, params in jobs}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    yield key, future.result(), None
+                except Exception as err:
+                    yield key, None, err
+
+    def close(self):
+        self.session.close()
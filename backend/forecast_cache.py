@@ -0,0 +1,128 @@
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from config import Config
+import schema
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastCache:
+    """
+    Cache hasil prediksi di memori dengan eviction LRU dan TTL.
+
+    Hasil prediksi deterministik untuk kombinasi (komoditas, jumlah hari,
+    versi data, versi model), sehingga kombinasi tersebut dipakai sebagai key.
+    Versi data berisi tanggal terakhir dan hash window harga, jadi data baru
+    maupun backfill di dalam window (dari proses mana pun) serta model hasil
+    training ulang otomatis menghasilkan key baru di semua worker; invalidate()
+    hanya membuang entri lama di proses ini lebih awal.
+    """
+
+    def __init__(self, max_size=256, ttl=6 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(komoditas, steps, data_version, model_version):
+        return (schema.komoditas_key(komoditas), int(steps), data_version, model_version)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, komoditas=None):
+        """Hapus entri satu komoditas, atau semua entri jika komoditas None"""
+        with self._lock:
+            if komoditas is None:
+                count = len(self._entries)
+                self._entries.clear()
+            else:
+                key_name = schema.komoditas_key(komoditas)
+                stale = [key for key in self._entries if key[0] == key_name]
+                for key in stale:
+                    del self._entries[key]
+                count = len(stale)
+        if count:
+            logger.info(f"🧹 {count} cache prediksi dihapus ({komoditas or 'semua komoditas'})")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# Cache bersama untuk seluruh proses
+cache = ForecastCache(max_size=Config.FORECAST_CACHE_SIZE, ttl=Config.FORECAST_CACHE_TTL)
+
+
+def data_version(window):
+    """Versi data dari PriceWindow: tanggal terakhir dan hash harga di window input"""
+    last_date = window.last_date
+    if hasattr(last_date, "strftime"):
+        last_date = last_date.strftime("%Y-%m-%d")
+    digest = hashlib.sha1(np.asarray(window.prices, dtype=np.float64).tobytes()).hexdigest()[:16]
+    return f"{last_date}:{digest}"
+
+
+def cache_key(komoditas, steps, window):
+    """Key cache untuk komoditas dan PriceWindow, atau None jika model/scaler tidak tersedia"""
+    # Import di sini agar modul ini (dipakai scraper) tidak ikut memuat TensorFlow
+    import model_registry
+
+    version = model_registry.registry.version(komoditas)
+    if version is None:
+        return None
+    return ForecastCache.make_key(komoditas, steps, data_version(window), version)
+
+
+def get_or_compute(komoditas, steps, window, compute):
+    """
+    Ambil prediksi dari cache, atau hitung dengan compute() lalu simpan
+
+    Args:
+        compute: Fungsi tanpa argumen yang mengembalikan array harga prediksi
+
+    Returns:
+        np.ndarray: Harga prediksi dengan shape (steps,)
+    """
+    key = cache_key(komoditas, steps, window)
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    predicted = np.asarray(compute(), dtype=np.float64)
+    if key is not None:
+        cache.set(key, predicted)
+    return predicted
@@ -0,0 +1,131 @@
+import time
+import queue
+import atexit
+import threading
+import logging
+import db_pool
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+INSERT_QUERY = """
+    INSERT INTO prediksi_history
+    (komoditas, tanggal_prediksi, tanggal_dibuat, harga_prediksi, filter_days, user_id)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+class PredictionHistoryWriter:
+    """
+    Penulis riwayat prediksi di background.
+
+    Request hanya memasukkan baris ke antrian; thread writer mengumpulkan baris
+    dan menulisnya dengan executemany (multi-row INSERT) ketika jumlah baris
+    mencapai batch_size atau setelah flush_interval detik. Jika antrian penuh,
+    baris dibuang dan dihitung di `dropped` agar request tidak pernah tertahan.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=2.0, max_queue_size=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_flush = None
+        self.last_error = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="prediction-history-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, rows):
+        """
+        Masukkan baris riwayat ke antrian (tidak blocking)
+
+        Args:
+            rows (list): Tuple (komoditas, tanggal_prediksi, tanggal_dibuat, harga_prediksi, filter_days, user_id)
+
+        Returns:
+            int: Jumlah baris yang diterima antrian
+        """
+        self.start()
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+                accepted += 1
+            except queue.Full:
+                self.dropped += 1
+        if accepted < len(rows):
+            logger.warning(f"⚠️ Antrian riwayat prediksi penuh, {len(rows) - accepted} baris dibuang")
+        return accepted
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop.is_set() and self._queue.empty()):
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                # Ambil sisa isi antrian tanpa menunggu, sampai batas batch
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline or self._stop.is_set():
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with db_pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.executemany(INSERT_QUERY, batch)
+                conn.commit()
+            self.written += len(batch)
+            self.last_flush = time.time()
+        except Exception as e:
+            self.failed += len(batch)
+            self.last_error = str(e)
+            logger.error(f"❌ Gagal menyimpan {len(batch)} riwayat prediksi: {e}")
+
+    def shutdown(self, timeout=10):
+        """Hentikan writer setelah semua isi antrian ditulis"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "last_flush": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_flush)) if self.last_flush else None,
+            "last_error": self.last_error,
+            "running": self._thread is not None and self._thread.is_alive()
+        }
+
+
+# Writer bersama untuk seluruh proses; antrian dikosongkan saat proses berhenti
+writer = PredictionHistoryWriter(
+    batch_size=Config.HISTORY_WRITER_BATCH_SIZE,
+    flush_interval=Config.HISTORY_WRITER_FLUSH_INTERVAL,
+    max_queue_size=Config.HISTORY_WRITER_QUEUE_SIZE
+)
+atexit.register(writer.shutdown)
@@ -0,0 +1,125 @@
+import os
+import threading
+import logging
+import joblib
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+SCALER_DIR = os.path.join(BASE_DIR, "scalers")
+
+
+def format_komoditas(komoditas):
+    """Format nama komoditas menjadi nama file (mis. 'Bawang Merah' -> 'bawang_merah')"""
+    return komoditas.lower().replace(" ", "_").replace("-", "_")
+
+
+class ModelRegistry:
+    """
+    Registry model Keras dan scaler yang disimpan di memori proses.
+
+    Setiap pasangan model/scaler hanya dimuat sekali, lalu dipakai ulang untuk
+    request berikutnya. Jika file model atau scaler berubah (mtime berbeda,
+    misalnya setelah training ulang), pasangan tersebut dimuat ulang otomatis.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, scaler_dir=SCALER_DIR):
+        self.model_dir = model_dir
+        self.scaler_dir = scaler_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def paths(self, komoditas):
+        komoditas_formatted = format_komoditas(komoditas)
+        model_path = os.path.join(self.model_dir, f"{komoditas_formatted}_model.h5")
+        scaler_path = os.path.join(self.scaler_dir, f"{komoditas_formatted}_scaler.pkl")
+        return model_path, scaler_path
+
+    def _file_version(self, komoditas):
+        """Versi file berupa pasangan mtime model dan scaler, atau None jika salah satu tidak ada"""
+        model_path, scaler_path = self.paths(komoditas)
+        try:
+            return (os.stat(model_path).st_mtime_ns, os.stat(scaler_path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _load_lock(self, key):
+        with self._lock:
+            if key not in self._load_locks:
+                self._load_locks[key] = threading.Lock()
+            return self._load_locks[key]
+
+    def get(self, komoditas):
+        """
+        Ambil model dan scaler untuk komoditas
+
+        Returns:
+            tuple: (model, scaler) atau (None, None) jika tidak tersedia
+        """
+        key = format_komoditas(komoditas)
+        version = self._file_version(komoditas)
+
+        if version is None:
+            logger.warning(f"❌ Model atau scaler untuk {komoditas} tidak ditemukan.")
+            self.evict(komoditas)
+            return None, None
+
+        entry = self._entries.get(key)
+        if entry and entry["version"] == version:
+            return entry["model"], entry["scaler"]
+
+        # Hanya satu thread yang memuat model yang sama, thread lain menunggu hasilnya
+        with self._load_lock(key):
+            entry = self._entries.get(key)
+            if entry and entry["version"] == version:
+                return entry["model"], entry["scaler"]
+
+            model_path, scaler_path = self.paths(komoditas)
+            try:
+                model = tf.keras.models.load_model(model_path)
+                scaler = joblib.load(scaler_path)
+            except Exception as e:
+                logger.error(f"❌ Gagal memuat model atau scaler untuk {komoditas}: {e}")
+                return None, None
+
+            self._entries[key] = {"model": model, "scaler": scaler, "version": version}
+            logger.info(f"✅ Model dan scaler {key} dimuat ke registry.")
+            return model, scaler
+
+    def version(self, komoditas):
+        """Versi model yang sedang dipakai (mtime file model dan scaler)"""
+        return self._file_version(komoditas)
+
+    def evict(self, komoditas=None):
+        """Hapus satu komoditas (atau semua jika None) dari registry"""
+        with self._lock:
+            if komoditas is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(format_komoditas(komoditas), None)
+
+    def warm_up(self, komoditas_list):
+        """
+        Muat model dan scaler untuk semua komoditas di awal
+
+        Returns:
+            dict: Status pemuatan per komoditas
+        """
+        status = {}
+        for komoditas in komoditas_list:
+            model, scaler = self.get(komoditas)
+            status[komoditas] = model is not None and scaler is not None
+        loaded = sum(1 for ok in status.values() if ok)
+        logger.info(f"🔥 Warm-up registry model: {loaded}/{len(status)} komoditas dimuat")
+        return status
+
+    def loaded(self):
+        """Daftar komoditas yang saat ini ada di registry"""
+        return sorted(self._entries.keys())
+
+
+# Registry bersama untuk seluruh proses
+registry = ModelRegistry()
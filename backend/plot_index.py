@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import glob
+import tempfile
+import threading
+import logging
+from datetime import datetime
+from scripts.utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+PLOT_TYPES = ("predictions", "training_history")
+# <komoditas>_<tipe>[_YYYYmmdd_HHMMSS].png
+PLOT_FILE_PATTERN = re.compile(r"^(?P<komoditas>.+?)_(?P<plot_type>predictions|training_history)(_\d{8}_\d{6})?\.png$")
+# Kunci yang sama dengan scripts/visualization.INDEX_LOCK_FILE
+INDEX_LOCK_FILE = ".index.lock"
+
+
+def plot_entry(plot_dir, filename):
+    """Metadata satu file plot (format sama dengan scripts/visualization.record_plot)"""
+    stat = os.stat(os.path.join(plot_dir, filename))
+    return {
+        "file": filename,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "etag": f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    }
+
+
+class PlotIndex:
+    """
+    Plot terbaru per (komoditas, tipe) dari plots/index.json, yang diperbarui
+    oleh visualization.py setiap kali plot baru disimpan. Indeks disimpan di
+    memori dan hanya dibaca ulang jika mtime file indeks berubah, sehingga
+    endpoint gambar tidak perlu glob dan sort direktori plot di setiap request.
+    Setiap penulisan indeks memegang kunci file yang sama dengan record_plot,
+    sehingga tidak menimpa plot yang baru dicatat proses training.
+    """
+
+    def __init__(self, plot_dir):
+        self.plot_dir = plot_dir
+        self.path = os.path.join(plot_dir, "index.json")
+        self.lock_path = os.path.join(plot_dir, INDEX_LOCK_FILE)
+        self._entries = None
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+
+        if self._entries is not None and mtime_ns == self._mtime_ns:
+            return self._entries
+
+        if mtime_ns is None:
+            # Indeks belum ada (plot dari versi lama): bangun sekali dari isi direktori
+            self._rebuild()
+        else:
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f)
+                self._mtime_ns = mtime_ns
+            except ValueError:
+                logger.warning("⚠️ Indeks plot rusak, dibangun ulang")
+                self._rebuild()
+        return self._entries
+
+    def _rebuild(self):
+        with file_lock(self.lock_path):
+            self._entries = self._scan()
+            self._save()
+
+    def _read_locked(self):
+        """Isi indeks terbaru di disk; dipanggil saat memegang kunci file"""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return self._scan()
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.plot_dir, prefix=".index.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def _scan(self):
+        entries = {}
+        for file_path in glob.glob(os.path.join(self.plot_dir, "*.png")):
+            match = PLOT_FILE_PATTERN.match(os.path.basename(file_path))
+            if not match:
+                continue
+            entry = plot_entry(self.plot_dir, os.path.basename(file_path))
+            current = entries.setdefault(match["komoditas"], {}).get(match["plot_type"])
+            if current is None or entry["mtime"] > current["mtime"]:
+                entries[match["komoditas"]][match["plot_type"]] = entry
+        return entries
+
+    def latest(self, komoditas, plot_type):
+        """
+        Plot terbaru untuk komoditas dan tipe tertentu
+
+        Returns:
+            dict: Metadata plot ditambah 'path', atau None jika tidak ada
+        """
+        with self._lock:
+            entry = self._load().get(komoditas, {}).get(plot_type)
+            if entry is None:
+                return None
+            path = os.path.join(self.plot_dir, entry["file"])
+            if not os.path.exists(path):
+                # File dihapus di luar visualization.py: bangun ulang indeks
+                self._rebuild()
+                entry = self._entries.get(komoditas, {}).get(plot_type)
+                if entry is None:
+                    return None
+                path = os.path.join(self.plot_dir, entry["file"])
+            return {**entry, "path": path}
+
+    def all(self):
+        with self._lock:
+            return {komoditas: dict(plots) for komoditas, plots in self._load().items()}
+
+    def remove(self, komoditas):
+        """Hapus semua plot komoditas beserta entri indeksnya"""
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read_locked()
+            for entry in entries.pop(komoditas, {}).values():
+                try:
+                    os.remove(os.path.join(self.plot_dir, entry["file"]))
+                except FileNotFoundError:
+                    pass
+            self._entries = entries
+            self._save()
+
+    @staticmethod
+    def timestamp(entry):
+        return datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M:%S") if entry else None
@@ -0,0 +1,173 @@
+import os
+import time
+import hashlib
+import tempfile
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import Config
+from dataset_catalog import DatasetCatalog, describe_dataframe, file_checksum
+from scripts.utils import load_and_clean_data, store_clean_cache, DateFormatError, CSV_DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_ROWS = 5
+
+
+def read_sample(file_path, lines=5):
+    """Beberapa baris pertama file asli untuk ditampilkan di dashboard"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return ''.join(next(f, '') for _ in range(lines))
+    except OSError:
+        return ""
+
+
+def build_preview(df, rows=PREVIEW_ROWS):
+    """
+    Preview beberapa baris pertama beserta harga ternormalisasi (0-1).
+    Normalisasi dihitung dari min/maks kolom, sama dengan MinMaxScaler,
+    tanpa iterasi per baris.
+    """
+    harga = df['Harga'].astype(float)
+    low, high = harga.min(), harga.max()
+    scale = (high - low) or 1.0
+    head = df.head(rows)
+    tanggal = head['Tanggal']
+    tanggal = tanggal.dt.strftime('%Y-%m-%d') if hasattr(tanggal, 'dt') else tanggal.astype(str)
+    harga_head = head['Harga'].astype(float)
+    normalized = (harga_head - low) / scale
+    return [
+        {'Tanggal': t, 'Harga': h, 'Harga_Normalized': n}
+        for t, h, n in zip(tanggal.tolist(), harga_head.tolist(), normalized.tolist())
+    ]
+
+
+def _is_clean(entry, stat):
+    """File sudah dipreprocess dan tidak berubah sejak itu (ukuran dan mtime sama dengan katalog)"""
+    return bool(entry and entry.get('preprocessed')
+                and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime)
+
+
+def _write_atomic(file_path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def preprocess_file(file_path, catalog, force=False):
+    """
+    Preprocessing satu dataset
+
+    - File yang tercatat bersih di katalog dan tidak berubah dilewati
+      (data dibaca dari cache .npz, tanpa parse tanggal dan tanpa tulis ulang)
+    - File lain dibersihkan, lalu hanya ditulis ulang jika isinya berbeda
+
+    Returns:
+        dict: Hasil per file dengan status success/skipped/failed dan waktu per tahap
+    """
+    filename = os.path.basename(file_path)
+    komoditas_name = os.path.splitext(filename)[0]
+    timings = {}
+    started = time.perf_counter()
+
+    try:
+        original_sample = read_sample(file_path)
+        stat = os.stat(file_path)
+        entry = catalog.get(komoditas_name)
+        skip = not force and _is_clean(entry, stat)
+
+        t = time.perf_counter()
+        df = load_and_clean_data(file_path, date_format=entry.get('date_format') if entry else None)
+        date_format = df.attrs.get('date_format')
+        timings['load'] = round(time.perf_counter() - t, 4)
+
+        rewritten = False
+        if not skip:
+            t = time.perf_counter()
+            data = df.to_csv(sep=';', index=False, date_format=CSV_DATE_FORMAT).encode('utf-8')
+            checksum = hashlib.sha256(data).hexdigest()
+            unchanged = (entry and entry.get('checksum') == checksum
+                         and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime)
+            if not unchanged and (stat.st_size != len(data) or file_checksum(file_path) != checksum):
+                _write_atomic(file_path, data)
+                # File di disk sekarang berformat CSV_DATE_FORMAT, bukan format aslinya
+                date_format = df.attrs['date_format'] = CSV_DATE_FORMAT
+                store_clean_cache(file_path, df)
+                rewritten = True
+            timings['write'] = round(time.perf_counter() - t, 4)
+
+            t = time.perf_counter()
+            stats = {**describe_dataframe(df), 'checksum': checksum}
+            if date_format:
+                stats['date_format'] = date_format
+            catalog.update(komoditas_name, file_path, stats=stats, preprocessed=True)
+            timings['catalog'] = round(time.perf_counter() - t, 4)
+
+        t = time.perf_counter()
+        preview_data = build_preview(df)
+        timings['preview'] = round(time.perf_counter() - t, 4)
+
+        processing_time = time.perf_counter() - started
+        logger.info(f"Preprocessing {'dilewati' if skip else 'berhasil'} untuk {filename}: {len(df)} baris ({processing_time:.2f} detik)")
+        return {
+            "komoditas": komoditas_name,
+            "file": filename,
+            "rows": len(df),
+            "date_format": date_format,
+            "original_sample": original_sample,
+            "preview_data": preview_data,
+            "processing_time": round(processing_time, 2),
+            "timings": timings,
+            "rewritten": rewritten,
+            "status": "skipped" if skip else "success"
+        }
+    except Exception as e:
+        logger.error(f"Error saat preprocessing {filename}: {str(e)}")
+        return {
+            "komoditas": komoditas_name,
+            "file": filename,
+            "error": str(e),
+            "date_report": e.report if isinstance(e, DateFormatError) else None,
+            "processing_time": round(time.perf_counter() - started, 2),
+            "status": "failed"
+        }
+
+
+def _preprocess_in_worker(file_path, dataset_dir, force):
+    """Entry point worker proses; katalog dibuka ulang di worker (aman antar proses)"""
+    return preprocess_file(file_path, DatasetCatalog(dataset_dir), force)
+
+
+def _use_processes(file_paths, workers):
+    """
+    Parse dan clean sebagian besar memegang GIL, tetapi start worker spawn
+    (import pandas/sklearn) butuh beberapa detik. Process pool hanya dipakai jika
+    ada lebih dari satu CPU dan total data cukup besar untuk menutup biaya itu.
+    """
+    if workers < 2 or (os.cpu_count() or 1) < 2:
+        return False
+    total_bytes = sum(os.path.getsize(file_path) for file_path in file_paths if os.path.exists(file_path))
+    return total_bytes >= Config.PREPROCESS_PROCESS_MIN_BYTES
+
+
+def preprocess_files(file_paths, catalog, workers=None, force=False):
+    """
+    Preprocessing beberapa dataset secara paralel: process pool untuk batch besar,
+    thread pool untuk batch kecil (lihat _use_processes).
+    Urutan hasil sama dengan urutan file_paths.
+    """
+    workers = max(1, min(workers or Config.PREPROCESS_WORKERS, len(file_paths)))
+    if _use_processes(file_paths, workers):
+        # spawn: proses aplikasi bisa memegang thread TensorFlow yang tidak aman di-fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            return list(executor.map(_preprocess_in_worker, file_paths, [catalog.dataset_dir] * len(file_paths),
+                                     [force] * len(file_paths)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda file_path: preprocess_file(file_path, catalog, force), file_paths))
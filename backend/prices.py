@@ -0,0 +1,90 @@
+import logging
+from collections import namedtuple
+import numpy as np
+import db_pool
+import schema
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SIZE = 60
+
+# prices    : harga untuk input model, urut terlama -> terbaru, selalu `window` nilai
+#             (dipadding dengan rata-rata jika data historis kurang)
+# rows      : baris asli dari database {"harga", "tanggal"}, urut terbaru -> terlama
+# last_date : tanggal data terbaru
+PriceWindow = namedtuple("PriceWindow", ["prices", "rows", "last_date"])
+
+
+def _build_window(rows, window):
+    """Susun PriceWindow dari baris database (urut tanggal DESC)"""
+    prices = [row["harga"] for row in rows]
+
+    if len(prices) < window:
+        avg_price = np.mean(prices)
+        prices.extend([avg_price] * (window - len(prices)))
+
+    return PriceWindow(list(reversed(prices)), rows, rows[0]["tanggal"])
+
+
+def fetch_price_window(komoditas, window=WINDOW_SIZE):
+    """
+    Ambil `window` harga terakhir beserta tanggalnya dengan satu query
+
+    Returns:
+        PriceWindow atau None jika tidak ada data untuk komoditas
+
+    Raises:
+        mysql.connector.Error: Jika query atau koneksi database gagal
+    """
+    with db_pool.connection() as conn:
+        with conn.cursor(dictionary=True) as cursor:
+            query = """
+                SELECT harga, tanggal FROM harga_komoditas
+                WHERE komoditas_key = %s
+                ORDER BY tanggal DESC LIMIT %s
+            """
+            cursor.execute(query, (schema.komoditas_key(komoditas), window))
+            rows = cursor.fetchall()
+
+    if not rows:
+        logger.warning(f"⚠️ Tidak ada data harga untuk {komoditas}")
+        return None
+
+    return _build_window(rows, window)
+
+
+def fetch_price_windows(komoditas_list, window=WINDOW_SIZE):
+    """
+    Ambil `window` harga terakhir untuk banyak komoditas sekaligus (satu query)
+
+    Returns:
+        dict: komoditas_key -> PriceWindow (komoditas tanpa data tidak disertakan)
+
+    Raises:
+        mysql.connector.Error: Jika query atau koneksi database gagal
+    """
+    keys = sorted({schema.komoditas_key(k) for k in komoditas_list})
+    if not keys:
+        return {}
+
+    with db_pool.connection() as conn:
+        with conn.cursor(dictionary=True) as cursor:
+            placeholders = ','.join(['%s'] * len(keys))
+            query = f"""
+                SELECT komoditas_key, harga, tanggal FROM (
+                    SELECT komoditas_key, harga, tanggal,
+                           ROW_NUMBER() OVER (PARTITION BY komoditas_key ORDER BY tanggal DESC) AS rn
+                    FROM harga_komoditas
+                    WHERE komoditas_key IN ({placeholders})
+                ) AS terakhir
+                WHERE rn <= %s
+                ORDER BY komoditas_key, tanggal DESC
+            """
+            cursor.execute(query, keys + [window])
+            rows = cursor.fetchall()
+
+    rows_by_key = {}
+    for row in rows:
+        rows_by_key.setdefault(row.pop("komoditas_key"), []).append(row)
+
+    return {key: _build_window(key_rows, window) for key, key_rows in rows_by_key.items()}
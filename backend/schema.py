@@ -0,0 +1,246 @@
+import logging
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# Ekspresi normalisasi nama komoditas ('Bawang Merah' -> 'bawang_merah').
+# Harus sama dengan komoditas_key() di bawah.
+KOMODITAS_KEY_EXPR = "LOWER(REPLACE(REPLACE(komoditas, ' ', '_'), '-', '_'))"
+
+
+def komoditas_key(komoditas):
+    """Normalisasi nama komoditas, sama dengan kolom komoditas_key di database"""
+    return komoditas.lower().replace(" ", "_").replace("-", "_")
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def _create_base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS harga_komoditas (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            komoditas VARCHAR(100) NOT NULL,
+            harga DECIMAL(12, 2) NOT NULL,
+            tanggal DATE NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prediksi_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            komoditas VARCHAR(100) NOT NULL,
+            tanggal_prediksi DATE NOT NULL,
+            tanggal_dibuat DATETIME NOT NULL,
+            harga_prediksi DECIMAL(12, 2) NOT NULL,
+            filter_days INT NOT NULL,
+            user_id INT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS model_training_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            komoditas VARCHAR(100) NOT NULL,
+            training_date DATETIME NOT NULL,
+            rmse FLOAT DEFAULT 0,
+            mae FLOAT DEFAULT 0,
+            next_training_date DATETIME NULL
+        )
+    """)
+
+
+def _add_komoditas_key(cursor):
+    """
+    Tambahkan kolom komoditas_key (generated column STORED) dan index komposit.
+    Kolom STORED dihitung MySQL untuk semua baris lama saat ALTER dijalankan,
+    dan otomatis terisi untuk setiap INSERT/UPDATE berikutnya.
+    """
+    for table, date_column in [("harga_komoditas", "tanggal"), ("prediksi_history", "tanggal_dibuat")]:
+        if not _column_exists(cursor, table, "komoditas_key"):
+            logger.info(f"🔧 Menambahkan kolom komoditas_key ke {table} (backfill semua baris)")
+            cursor.execute(f"""
+                ALTER TABLE {table}
+                ADD COLUMN komoditas_key VARCHAR(100)
+                GENERATED ALWAYS AS ({KOMODITAS_KEY_EXPR}) STORED
+            """)
+
+        index_name = f"idx_{table}_key_{date_column}"
+        if not _index_exists(cursor, table, index_name):
+            logger.info(f"🔧 Membuat index {index_name}")
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} (komoditas_key, {date_column})")
+
+
+def _add_unique_komoditas_tanggal(cursor):
+    """
+    Satu harga per komoditas per tanggal. Duplikat lama dihapus (baris dengan id
+    terkecil dipertahankan) sebelum unique key dibuat, agar scraper bisa memakai
+    INSERT ... ON DUPLICATE KEY UPDATE.
+    """
+    if not _index_exists(cursor, "harga_komoditas", "uq_harga_komoditas_tanggal"):
+        cursor.execute("""
+            DELETE h1 FROM harga_komoditas h1
+            JOIN harga_komoditas h2
+              ON h1.komoditas = h2.komoditas AND h1.tanggal = h2.tanggal AND h1.id > h2.id
+        """)
+        if cursor.rowcount:
+            logger.info(f"🧹 {cursor.rowcount} baris duplikat harga_komoditas dihapus")
+        cursor.execute("ALTER TABLE harga_komoditas ADD UNIQUE KEY uq_harga_komoditas_tanggal (komoditas, tanggal)")
+
+    # Index tanggal untuk pengecekan data per rentang tanggal (scraper, status data)
+    if not _index_exists(cursor, "harga_komoditas", "idx_harga_komoditas_tanggal"):
+        cursor.execute("CREATE INDEX idx_harga_komoditas_tanggal ON harga_komoditas (tanggal)")
+
+
+def _create_scrape_watermarks(cursor):
+    """High-water mark scraper per komoditas untuk mode incremental"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_watermarks (
+            komoditas VARCHAR(100) PRIMARY KEY,
+            high_water DATE NOT NULL,
+            updated_at DATETIME NOT NULL
+        )
+    """)
+
+
+def _create_scrape_jobs(cursor):
+    """Status job scraping di background, dipakai untuk progres dan resume"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id VARCHAR(36) PRIMARY KEY,
+            status VARCHAR(20) NOT NULL,
+            mode VARCHAR(20) NOT NULL,
+            days_back INT NOT NULL,
+            dates_total INT NOT NULL DEFAULT 0,
+            dates_done INT NOT NULL DEFAULT 0,
+            data_saved INT NOT NULL DEFAULT 0,
+            failed_dates TEXT NULL,
+            message TEXT NULL,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL
+        )
+    """)
+
+
+def _create_training_jobs(cursor):
+    """Antrian job training model, dibagi oleh semua proses worker aplikasi"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS training_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            komoditas VARCHAR(100) NULL,
+            status VARCHAR(20) NOT NULL,
+            progress INT NOT NULL DEFAULT 0,
+            details TEXT NULL,
+            message TEXT NULL,
+            cancel_requested TINYINT(1) NOT NULL DEFAULT 0,
+            attempts INT NOT NULL DEFAULT 0,
+            worker VARCHAR(100) NULL,
+            created_at DATETIME NOT NULL,
+            started_at DATETIME NULL,
+            finished_at DATETIME NULL,
+            heartbeat_at DATETIME NULL,
+            INDEX idx_training_jobs_status (status, id)
+        )
+    """)
+
+
+def _add_training_job_options(cursor):
+    """Opsi job training (misalnya force) yang diteruskan ke trainer"""
+    if not _column_exists(cursor, "training_jobs", "options"):
+        cursor.execute("ALTER TABLE training_jobs ADD COLUMN options TEXT NULL AFTER details")
+
+
+def _add_scrape_job_owner(cursor):
+    """Pemilik dan heartbeat job scraping, agar hanya satu worker yang melanjutkan job terputus"""
+    if not _column_exists(cursor, "scrape_jobs", "worker"):
+        cursor.execute("ALTER TABLE scrape_jobs ADD COLUMN worker VARCHAR(100) NULL")
+    if not _column_exists(cursor, "scrape_jobs", "heartbeat_at"):
+        cursor.execute("ALTER TABLE scrape_jobs ADD COLUMN heartbeat_at DATETIME NULL")
+
+
+def _add_training_job_pid(cursor):
+    """PID proses training, agar proses yatim bisa dihentikan saat job dipulihkan"""
+    if not _column_exists(cursor, "training_jobs", "pid"):
+        cursor.execute("ALTER TABLE training_jobs ADD COLUMN pid INT NULL AFTER worker")
+
+
+# Daftar migrasi berurutan: (versi, deskripsi, fungsi(cursor))
+MIGRATIONS = [
+    (1, "Tabel dasar harga_komoditas, prediksi_history, model_training_history", _create_base_tables),
+    (2, "Kolom komoditas_key dan index (komoditas_key, tanggal)", _add_komoditas_key),
+    (3, "Unique key (komoditas, tanggal) dan index tanggal", _add_unique_komoditas_tanggal),
+    (4, "Tabel scrape_watermarks", _create_scrape_watermarks),
+    (5, "Tabel scrape_jobs", _create_scrape_jobs),
+    (6, "Tabel training_jobs", _create_training_jobs),
+    (7, "Kolom options pada training_jobs", _add_training_job_options),
+    (8, "Kolom worker dan heartbeat_at pada scrape_jobs", _add_scrape_job_owner),
+    (9, "Kolom pid pada training_jobs", _add_training_job_pid),
+]
+
+
+def ensure_schema():
+    """
+    Jalankan semua migrasi yang belum diterapkan. Aman dipanggil berulang kali
+    dan dari beberapa proses sekaligus (dilindungi GET_LOCK MySQL).
+
+    Returns:
+        list: Versi migrasi yang baru diterapkan
+
+    Raises:
+        RuntimeError: Jika kunci migrasi tidak didapat dalam 60 detik
+    """
+    applied_now = []
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK('commoprize_schema', 60)")
+        locked = cursor.fetchone()[0]
+        if locked != 1:
+            # Proses lain masih menjalankan migrasi; jangan lanjut tanpa kunci
+            cursor.close()
+            raise RuntimeError("Gagal mendapatkan kunci migrasi skema (GET_LOCK timeout)")
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at DATETIME NOT NULL
+                )
+            """)
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+
+            for version, description, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                logger.info(f"🔧 Migrasi {version}: {description}")
+                migrate(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, NOW())",
+                    (version, description)
+                )
+                conn.commit()
+                applied_now.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('commoprize_schema')")
+            cursor.fetchone()
+            cursor.close()
+
+    if applied_now:
+        logger.info(f"✅ Migrasi diterapkan: {applied_now}")
+    return applied_now
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ensure_schema()
@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import logging
+from datetime import datetime
+import db_pool
+import scraping
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class ScrapeJobManager:
+    """
+    Menjalankan scraping sebagai job di background.
+
+    Hanya satu job berjalan dalam satu waktu di semua worker. Job diklaim di bawah
+    GET_LOCK MySQL dan pemiliknya memperbarui heartbeat_at secara berkala. Progres
+    (tanggal selesai, data tersimpan, tanggal gagal) disimpan ke tabel scrape_jobs
+    setiap kali scraper menyimpan satu chunk, sehingga bisa dibaca lewat endpoint
+    status atau SSE. Job yang heartbeat-nya berhenti (proses pemiliknya mati)
+    diklaim ulang oleh satu worker lewat resume_interrupted(); scraper otomatis
+    melewati tanggal yang sudah disimpan.
+    """
+
+    def __init__(self, on_success=None):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # Dipanggil dengan job dict setelah job selesai dengan sukses
+        self.on_success = on_success
+        self._jobs = {}
+        self._current_id = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def start(self, days_back=70, mode="full"):
+        """
+        Mulai job baru, atau kembalikan job yang sedang berjalan (di worker mana pun)
+
+        Returns:
+            tuple: (job dict, bool apakah job baru dibuat)
+        """
+        with self._lock:
+            current = self._jobs.get(self._current_id)
+            if current and current["status"] in ACTIVE_STATUSES:
+                return dict(current), False
+
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "mode": mode,
+            "days_back": days_back,
+            "dates_total": 0,
+            "dates_done": 0,
+            "data_saved": 0,
+            "failed_dates": [],
+            "message": None,
+            "created_at": now,
+            "updated_at": now,
+            "revision": 0
+        }
+        active = self._claim_new(job)
+        if active is not None:
+            return active, False
+        return self._launch(job), True
+
+    def _launch(self, job):
+        """Jalankan job yang sudah diklaim proses ini"""
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._current_id = job["id"]
+            snapshot = dict(job)
+        threading.Thread(target=self._run, args=(job["id"],), name=f"scrape-job-{job['id'][:8]}", daemon=True).start()
+        return snapshot
+
+    def _claim_new(self, job):
+        """
+        Simpan job baru atas nama worker ini, kecuali ada job aktif yang
+        heartbeat-nya masih hidup (dicek dan disimpan di bawah GET_LOCK)
+
+        Returns:
+            dict: Job aktif milik worker lain, atau None jika job baru tersimpan
+        """
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT GET_LOCK('commoprize_scrape_jobs', 10) AS locked")
+                if cursor.fetchone()["locked"] != 1:
+                    raise RuntimeError("Gagal mendapatkan kunci job scraping")
+                try:
+                    cursor.execute("""
+                        SELECT id FROM scrape_jobs
+                        WHERE status IN ('queued', 'running')
+                          AND heartbeat_at >= NOW() - INTERVAL %s SECOND
+                        ORDER BY created_at DESC LIMIT 1
+                    """, (Config.SCRAPER_STALE_AFTER,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        self._write(cursor, job)
+                    conn.commit()
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK('commoprize_scrape_jobs')")
+                    cursor.fetchone()
+        return self._load(row["id"]) if row else None
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            job = self._jobs[job_id]
+            job.update(fields)
+            job["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            job["revision"] += 1
+            snapshot = dict(job)
+            self._changed.notify_all()
+        self._persist(snapshot)
+        return snapshot
+
+    def _heartbeat_loop(self, job_id, finished):
+        while not finished.wait(Config.SCRAPER_HEARTBEAT_INTERVAL):
+            try:
+                with db_pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(
+                            "UPDATE scrape_jobs SET heartbeat_at = NOW() WHERE id = %s AND worker = %s",
+                            (job_id, self.worker_id)
+                        )
+                    conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Gagal memperbarui heartbeat job scraping {job_id}: {e}")
+
+    def _run(self, job_id):
+        finished = threading.Event()
+        threading.Thread(
+            target=self._heartbeat_loop, args=(job_id, finished), name=f"scrape-heartbeat-{job_id[:8]}", daemon=True
+        ).start()
+        try:
+            self._execute(job_id)
+        finally:
+            finished.set()
+
+    def _execute(self, job_id):
+        job = self._update(job_id, status="running")
+        logger.info(f"🚀 Job scraping {job_id} dimulai ({job['mode']}, {job['days_back']} hari)")
+
+        def on_progress(progress):
+            self._update(
+                job_id,
+                dates_total=progress["dates_total"],
+                dates_done=progress["dates_done"],
+                data_saved=progress["data_saved"],
+                failed_dates=progress["failed_dates"]
+            )
+
+        try:
+            result = scraping.scrape_and_store(job["days_back"], mode=job["mode"], progress=on_progress)
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+
+        if result.get("status") == "success":
+            job = self._update(job_id, status="completed", result=result)
+            logger.info(f"✅ Job scraping {job_id} selesai: {result['data_saved']} data disimpan")
+            if self.on_success:
+                try:
+                    self.on_success(job)
+                except Exception as e:
+                    logger.error(f"❌ Error setelah job scraping {job_id} selesai: {e}")
+        else:
+            self._update(job_id, status="failed", message=result.get("message"), result=result)
+            logger.error(f"❌ Job scraping {job_id} gagal: {result.get('message')}")
+
+    def _write(self, cursor, job):
+        cursor.execute("""
+            INSERT INTO scrape_jobs
+            (id, status, mode, days_back, dates_total, dates_done, data_saved,
+             failed_dates, message, created_at, updated_at, worker, heartbeat_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                status = VALUES(status), dates_total = VALUES(dates_total),
+                dates_done = VALUES(dates_done), data_saved = VALUES(data_saved),
+                failed_dates = VALUES(failed_dates), message = VALUES(message),
+                updated_at = VALUES(updated_at), worker = VALUES(worker), heartbeat_at = NOW()
+        """, (
+            job["id"], job["status"], job["mode"], job["days_back"], job["dates_total"],
+            job["dates_done"], job["data_saved"], json.dumps(job["failed_dates"]),
+            job["message"], job["created_at"], job["updated_at"], self.worker_id
+        ))
+
+    def _persist(self, job):
+        try:
+            with db_pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    self._write(cursor, job)
+                conn.commit()
+        except Exception as e:
+            # Progres di memori tetap tersedia walaupun database tidak bisa ditulis
+            logger.warning(f"⚠️ Gagal menyimpan status job scraping {job['id']}: {e}")
+
+    def _load(self, job_id=None):
+        """Baca job dari database (job tertentu, atau job terakhir)"""
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                if job_id:
+                    cursor.execute("SELECT * FROM scrape_jobs WHERE id = %s", (job_id,))
+                else:
+                    cursor.execute("SELECT * FROM scrape_jobs ORDER BY created_at DESC LIMIT 1")
+                row = cursor.fetchone()
+        if not row:
+            return None
+        row["failed_dates"] = json.loads(row["failed_dates"] or "[]")
+        for column in ("created_at", "updated_at", "heartbeat_at"):
+            if isinstance(row[column], datetime):
+                row[column] = row[column].strftime("%Y-%m-%d %H:%M:%S")
+        return row
+
+    def get(self, job_id=None):
+        """Status job tertentu, atau job terakhir jika job_id None"""
+        with self._lock:
+            job = self._jobs.get(job_id or self._current_id)
+            if job:
+                return dict(job)
+        return self._load(job_id)
+
+    def wait(self, job_id, timeout=None, poll_interval=2):
+        """
+        Tunggu job selesai, lalu kembalikan status terakhir. Job milik worker
+        lain dipantau lewat database.
+        """
+        with self._changed:
+            if job_id in self._jobs:
+                self._changed.wait_for(lambda: self._jobs[job_id]["status"] not in ACTIVE_STATUSES, timeout)
+                return dict(self._jobs[job_id])
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self._load(job_id)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def stream(self, job_id, heartbeat=15):
+        """
+        Generator status job untuk server-sent events. Mengirim status setiap ada
+        perubahan dan berhenti setelah job selesai.
+        """
+        with self._lock:
+            in_memory = job_id in self._jobs
+        if not in_memory:
+            # Job milik worker lain atau proses sebelumnya: pantau lewat database
+            last_updated = None
+            while True:
+                job = self._load(job_id)
+                if job is None:
+                    return
+                if job["updated_at"] != last_updated:
+                    last_updated = job["updated_at"]
+                    yield f"data: {json.dumps(job)}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+                if job["status"] not in ACTIVE_STATUSES:
+                    return
+                time.sleep(min(heartbeat, 2))
+
+        last_revision = None
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    break
+                if job["revision"] == last_revision and job["status"] in ACTIVE_STATUSES:
+                    self._changed.wait(heartbeat)
+                snapshot = dict(job)
+
+            if snapshot["revision"] == last_revision:
+                yield ": keep-alive\n\n"
+                continue
+            last_revision = snapshot["revision"]
+            yield f"data: {json.dumps(snapshot)}\n\n"
+            if snapshot["status"] not in ACTIVE_STATUSES:
+                break
+
+    def resume_interrupted(self):
+        """
+        Lanjutkan job terakhir yang terputus. Hanya job yang heartbeat-nya sudah
+        kedaluwarsa (pemiliknya mati) yang diklaim, dan klaim dilakukan dengan
+        UPDATE atomik sehingga hanya satu worker yang melanjutkannya.
+        """
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("""
+                    SELECT id FROM scrape_jobs
+                    WHERE status IN ('queued', 'running')
+                    ORDER BY created_at DESC LIMIT 1
+                """)
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                cursor.execute("""
+                    UPDATE scrape_jobs SET worker = %s, heartbeat_at = NOW()
+                    WHERE id = %s AND status IN ('queued', 'running')
+                      AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - INTERVAL %s SECOND)
+                """, (self.worker_id, row["id"], Config.SCRAPER_STALE_AFTER))
+                claimed = cursor.rowcount == 1
+            conn.commit()
+
+        if not claimed:
+            return None
+        job = self._load(row["id"])
+        logger.info(f"🔁 Melanjutkan job scraping {job['id']} yang terputus")
+        job.update(status="queued", revision=0)
+        job.pop("worker", None)
+        job.pop("heartbeat_at", None)
+        return self._launch(job)
+
+
+# Manager bersama untuk seluruh proses
+manager = ScrapeJobManager()
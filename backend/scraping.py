@@ -1,5 +1,8 @@
-import requests
-import mysql.connector
+import db_pool
+import schema
+import forecast_cache
+from fetch_engine import FetchEngine
+from config import Config
 from datetime import datetime, timedelta
 import logging
 
@@ -47,70 +50,257 @@ KOMODITAS_DIPERLUKAN = {
 }
 
 def connect_db():
-    """Fungsi untuk koneksi ke database MySQL"""
-    try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="harga_komoditas",
-            autocommit=True
-        )
-    except mysql.connector.Error as err:
-        logger.error(f"❌ Gagal koneksi database: {err}")
-        return None
-
-def scrape_and_store(days_back=70):
+    """Fungsi untuk koneksi ke database MySQL (dari pool bersama)"""
+    return db_pool.connect_db()
+
+INSERT_QUERY = """
+    INSERT INTO harga_komoditas (komoditas, harga, tanggal) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE harga = VALUES(harga)
+"""
+
+
+def load_existing_pairs(cursor, start_date, end_date):
+    """
+    Ambil semua pasangan (komoditas, tanggal) yang sudah ada dalam rentang tanggal
+    dengan satu query
+
+    Returns:
+        set: {(komoditas, 'YYYY-MM-DD'), ...}
+    """
+    cursor.execute(
+        "SELECT komoditas, tanggal FROM harga_komoditas WHERE tanggal BETWEEN %s AND %s",
+        (start_date, end_date)
+    )
+    return {(komoditas, tanggal.strftime("%Y-%m-%d")) for komoditas, tanggal in cursor.fetchall()}
+
+
+def find_missing_dates(existing_pairs, dates):
+    """Tanggal yang belum memiliki data lengkap untuk semua komoditas yang diperlukan"""
+    return [
+        tanggal for tanggal in dates
+        if any((komoditas, tanggal) not in existing_pairs for komoditas in KOMODITAS_DIPERLUKAN)
+    ]
+
+
+def date_range(days):
+    """N tanggal terakhir (termasuk hari ini), urut terbaru -> terlama"""
+    return [(datetime.today() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
+
+def load_watermarks(cursor):
+    """
+    High-water mark per komoditas: tanggal terakhir di mana semua tanggal
+    sebelumnya (dalam rentang scraping) sudah berhasil diambil dari API
+
+    Returns:
+        dict: {komoditas: 'YYYY-MM-DD'}
+    """
+    cursor.execute("SELECT komoditas, high_water FROM scrape_watermarks")
+    return {komoditas: high_water.strftime("%Y-%m-%d") for komoditas, high_water in cursor.fetchall()}
+
+
+def save_watermarks(cursor, watermarks):
+    if not watermarks:
+        return
+    cursor.executemany("""
+        INSERT INTO scrape_watermarks (komoditas, high_water, updated_at) VALUES (%s, %s, NOW())
+        ON DUPLICATE KEY UPDATE high_water = VALUES(high_water), updated_at = NOW()
+    """, list(watermarks.items()))
+
+
+def find_gaps(existing_pairs, dates, watermarks):
+    """
+    Tanggal kosong per komoditas yang berada di belakang high-water mark
+    (seharusnya sudah terisi tetapi tidak ada datanya)
+
+    Returns:
+        dict: {komoditas: [tanggal, ...]} urut terbaru -> terlama
+    """
+    gaps = {}
+    for komoditas in sorted(KOMODITAS_DIPERLUKAN):
+        high_water = watermarks.get(komoditas)
+        gaps[komoditas] = [
+            tanggal for tanggal in dates
+            if (komoditas, tanggal) not in existing_pairs and (high_water is None or tanggal <= high_water)
+        ]
+    return gaps
+
+
+def load_coverage(cursor, days):
+    """
+    Data ketersediaan yang dipakai bersama oleh scraper dan get_data_status
+
+    Returns:
+        dict: dates, existing_pairs, watermarks, gaps
+    """
+    dates = date_range(days)
+    existing_pairs = load_existing_pairs(cursor, dates[-1], dates[0])
+    watermarks = load_watermarks(cursor)
+
+    # Komoditas tanpa watermark tersimpan: gunakan tanggal data terakhir di rentang ini
+    for komoditas in KOMODITAS_DIPERLUKAN:
+        if komoditas not in watermarks:
+            found = [tanggal for tanggal in dates if (komoditas, tanggal) in existing_pairs]
+            if found:
+                watermarks[komoditas] = found[0]
+
+    return {
+        "dates": dates,
+        "existing_pairs": existing_pairs,
+        "watermarks": watermarks,
+        "gaps": find_gaps(existing_pairs, dates, watermarks)
+    }
+
+
+def advance_watermarks(watermarks, dates, existing_pairs, fetched_dates):
+    """
+    Majukan high-water mark setiap komoditas selama tanggal berikutnya sudah ada
+    datanya atau sudah berhasil diambil dari API. Berhenti di tanggal pertama yang
+    gagal, sehingga tanggal tersebut diambil lagi pada scraping berikutnya.
+    """
+    updated = {}
+    for komoditas in KOMODITAS_DIPERLUKAN:
+        high_water = watermarks.get(komoditas)
+        new_high_water = high_water
+        for tanggal in reversed(dates):  # terlama -> terbaru
+            if high_water is not None and tanggal <= high_water:
+                continue
+            if (komoditas, tanggal) in existing_pairs or tanggal in fetched_dates:
+                new_high_water = tanggal
+            else:
+                break
+        if new_high_water and new_high_water != high_water:
+            updated[komoditas] = new_high_water
+    return updated
+
+
+def scrape_and_store(days_back=70, base_url=None, concurrency=None, mode="full", gap_days=7,
+                     chunk_size=None, progress=None):
     """
     Mengambil data dari API dan menyimpan ke database
     
     Args:
         days_back (int): Jumlah hari ke belakang untuk pengambilan data
+        base_url (str): URL API (default Config.SCRAPER_BASE_URL, bisa diarahkan ke stub lokal)
+        concurrency (int): Jumlah request paralel (default Config.SCRAPER_CONCURRENCY)
+        mode (str): "full" memeriksa semua tanggal dalam days_back,
+                    "incremental" hanya mengambil tanggal setelah high-water mark
+                    ditambah gap dalam gap_days hari terakhir
+        gap_days (int): Rentang (hari) gap yang ikut diambil ulang pada mode incremental
+        chunk_size (int): Data disimpan (commit) setiap chunk_size tanggal selesai
+                          (default Config.SCRAPER_CHUNK_SIZE)
+        progress (callable): Dipanggil dengan dict progres setiap kali chunk disimpan
     
     Returns:
         dict: Informasi hasil scraping
     """
     try:
-        db = connect_db()
-        if not db:
-            raise Exception("Gagal koneksi ke database")
-            
-        cursor = db.cursor()
-        
-        BASE_URL = "https://api-panelhargav2.badanpangan.go.id/api/front/harga-pangan-table-province"
         province_id = 15  # Jawa Timur
         level_harga_id = 3  # Harga rata-rata (Konsumen)
         
+        chunk_size = chunk_size or Config.SCRAPER_CHUNK_SIZE
         total_data_saved = 0
         failed_dates = []
-        data_to_insert = []  # Menyimpan data untuk batch insert
+        fetched_dates = set()
+        data_to_insert = []  # Data chunk berjalan yang belum disimpan
+        dates_done = 0
         
-        for i in range(days_back):
-            date_str = (datetime.today() - timedelta(days=i)).strftime("%d/%m/%Y")
-            tanggal = (datetime.today() - timedelta(days=i)).strftime("%Y-%m-%d")
-            
-            # Periksa apakah data sudah ada untuk tanggal ini
-            cursor.execute("SELECT COUNT(*) FROM harga_komoditas WHERE tanggal=%s", (tanggal,))
-            count = cursor.fetchone()[0]
-            
-            if count >= len(KOMODITAS_DIPERLUKAN):
-                logger.info(f"✅ Data untuk {tanggal} sudah lengkap, skip.")
-                continue
-                
-            # Fetch dari API
+        # Ambil data yang sudah ada, high-water mark dan gap dengan sekali koneksi
+        db = connect_db()
+        if not db:
+            raise Exception("Gagal koneksi ke database")
+        try:
+            with db.cursor() as cursor:
+                coverage = load_coverage(cursor, days_back)
+        finally:
+            db.close()
+        
+        dates = coverage["dates"]
+        existing_pairs = coverage["existing_pairs"]
+        watermarks = coverage["watermarks"]
+        
+        # Tentukan tanggal yang perlu diambil dari API
+        if mode == "incremental":
+            recent_dates = set(dates[:gap_days])
+            wanted = set()
+            for komoditas in KOMODITAS_DIPERLUKAN:
+                high_water = watermarks.get(komoditas)
+                wanted.update(tanggal for tanggal in dates if high_water is None or tanggal > high_water)
+                wanted.update(tanggal for tanggal in coverage["gaps"][komoditas] if tanggal in recent_dates)
+            missing_dates = [tanggal for tanggal in dates if tanggal in wanted]
+        else:
+            missing_dates = find_missing_dates(existing_pairs, dates)
+        logger.info(f"✅ Mode {mode}: {len(dates) - len(missing_dates)} tanggal dilewati, {len(missing_dates)} tanggal perlu diambil.")
+        
+        # Diambil dari tanggal terlama agar high-water mark bisa maju setiap chunk
+        jobs = []
+        for tanggal in reversed(missing_dates):
             params = {
                 "province_id": province_id,
                 "level_harga_id": level_harga_id,
-                "period_date": date_str
+                "period_date": datetime.strptime(tanggal, "%Y-%m-%d").strftime("%d/%m/%Y")
             }
-            
+            jobs.append((tanggal, params))
+        
+        saved_watermarks = dict(watermarks)
+        
+        def report(stage):
+            if progress:
+                progress({
+                    "stage": stage,
+                    "dates_total": len(jobs),
+                    "dates_done": dates_done,
+                    "data_saved": total_data_saved,
+                    "failed_dates": list(failed_dates)
+                })
+        
+        def flush_chunk():
+            """Simpan data chunk berjalan dan majukan high-water mark dalam satu commit"""
+            nonlocal data_to_insert, total_data_saved
+            new_watermarks = advance_watermarks(saved_watermarks, dates, existing_pairs, fetched_dates)
+            if not data_to_insert and not new_watermarks:
+                return
+            # Unique key (komoditas, tanggal) mencegah duplikat jika ada proses
+            # lain yang menyimpan data yang sama
+            db = connect_db()
+            if not db:
+                raise Exception("Gagal koneksi ke database")
             try:
-                response = requests.get(BASE_URL, params=params, timeout=10)
-                response.raise_for_status()  # Memastikan respons sukses
-                data = response.json()
-                
-                # Proses data jika ada
-                if "grand_total" in data:
+                # Transaksi eksplisit: data dan watermark tersimpan bersama atau
+                # tidak sama sekali, apa pun setelan autocommit koneksinya
+                db.start_transaction()
+                with db.cursor() as cursor:
+                    if data_to_insert:
+                        cursor.executemany(INSERT_QUERY, data_to_insert)
+                    save_watermarks(cursor, new_watermarks)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            saved_watermarks.update(new_watermarks)
+            
+            if data_to_insert:
+                total_data_saved += len(data_to_insert)
+                logger.info(f"💾 {len(data_to_insert)} data disimpan ({dates_done}/{len(jobs)} tanggal)")
+                # Data harga baru membuat prediksi lama tidak berlaku lagi
+                for komoditas_db in {row[0] for row in data_to_insert}:
+                    forecast_cache.cache.invalidate(komoditas_db)
+            data_to_insert = []
+        
+        report("fetching")
+        
+        # Fetch dari API secara paralel, simpan setiap chunk_size tanggal
+        engine = FetchEngine(base_url=base_url, concurrency=concurrency)
+        try:
+            for tanggal, data, error in engine.fetch_many(jobs):
+                dates_done += 1
+                if error is not None:
+                    logger.error(f"❌ Gagal request API untuk {tanggal}: {str(error)}")
+                    failed_dates.append(tanggal)
+                elif "grand_total" in data:
+                    fetched_dates.add(tanggal)
                     items_found = 0
                     for item in data["grand_total"]:
                         komoditas_api = item["komoditas"]
@@ -124,11 +314,7 @@ def scrape_and_store(days_back=70):
                             if komoditas_db in KOMODITAS_DIPERLUKAN:
                                 # Validasi harga agar tidak NULL, non-numeric, atau negatif
                                 if isinstance(harga, (int, float)) and harga > 0:
-                                    cursor.execute(
-                                        "SELECT COUNT(*) FROM harga_komoditas WHERE komoditas=%s AND tanggal=%s", 
-                                        (komoditas_db, tanggal)
-                                    )
-                                    if cursor.fetchone()[0] == 0:
+                                    if (komoditas_db, tanggal) not in existing_pairs:
                                         data_to_insert.append((komoditas_db, harga, tanggal))
                                         items_found += 1
                                 else:
@@ -138,29 +324,28 @@ def scrape_and_store(days_back=70):
                 else:
                     logger.warning(f"⚠️ Tidak ada data grand_total untuk {tanggal}")
                     failed_dates.append(tanggal)
-            
-            except requests.RequestException as req_err:
-                logger.error(f"❌ Gagal request API untuk {tanggal}: {str(req_err)}")
-                failed_dates.append(tanggal)
-                continue
+                
+                if dates_done % chunk_size == 0:
+                    flush_chunk()
+                    report("fetching")
+        finally:
+            engine.close()
+        
+        flush_chunk()
+        report("done")
         
-        # Batch insert untuk mempercepat penyimpanan
-        if data_to_insert:
-            query = "INSERT INTO harga_komoditas (komoditas, harga, tanggal) VALUES (%s, %s, %s)"
-            cursor.executemany(query, data_to_insert)
-            db.commit()
-            total_data_saved = len(data_to_insert)
+        if total_data_saved:
             logger.info(f"✅ {total_data_saved} data berhasil disimpan.")
         else:
             logger.info("ℹ️ Tidak ada data baru untuk disimpan.")
         
-        cursor.close()
-        db.close()
-        
         result = {
             "status": "success",
+            "mode": mode,
+            "dates_requested": len(jobs),
             "data_saved": total_data_saved,
-            "failed_dates": failed_dates if failed_dates else None
+            "failed_dates": failed_dates if failed_dates else None,
+            "watermarks": saved_watermarks
         }
         
         return result
@@ -211,57 +396,30 @@ def get_data_status(days=70):
         db = connect_db()
         if not db:
             raise Exception("Gagal koneksi ke database")
-            
-        cursor = db.cursor(dictionary=True)
         
-        # Dapatkan N hari terakhir
-        dates = []
-        for i in range(days):
-            date = (datetime.today() - timedelta(days=i)).strftime("%Y-%m-%d")
-            dates.append(date)
+        # Data yang sama dengan yang dipakai scraper mode incremental
+        try:
+            with db.cursor() as cursor:
+                coverage = load_coverage(cursor, days)
+        finally:
+            db.close()
         
-        # Query untuk mendapatkan jumlah data per tanggal
-        placeholders = ','.join(['%s'] * len(dates))
-        query = f"""
-            SELECT 
-                tanggal, 
-                COUNT(*) as jumlah_data
-            FROM harga_komoditas 
-            WHERE tanggal IN ({placeholders})
-            GROUP BY tanggal
-            ORDER BY tanggal DESC
-        """
-        
-        cursor.execute(query, dates)
-        results = cursor.fetchall()
-        
-        # Buat dictionary untuk mempermudah akses data
-        data_by_date = {}
-        for row in results:
-            data_by_date[row['tanggal'].strftime('%Y-%m-%d')] = row
-        
-        # Buat response dengan semua tanggal, termasuk yang tidak ada datanya
-        response_data = []
-        for date in dates:
-            if date in data_by_date:
-                # Konversi tanggal menjadi string agar bisa di-serialize ke JSON
-                row = data_by_date[date]
-                if isinstance(row['tanggal'], datetime):
-                    row['tanggal'] = row['tanggal'].strftime('%Y-%m-%d')
-                response_data.append(row)
-            else:
-                response_data.append({
-                    'tanggal': date,
-                    'jumlah_data': 0
-                })
+        # Hitung jumlah data per tanggal, termasuk tanggal yang tidak ada datanya
+        jumlah_per_tanggal = {}
+        for _, tanggal in coverage["existing_pairs"]:
+            jumlah_per_tanggal[tanggal] = jumlah_per_tanggal.get(tanggal, 0) + 1
         
-        cursor.close()
-        db.close()
+        response_data = [
+            {'tanggal': date, 'jumlah_data': jumlah_per_tanggal.get(date, 0)}
+            for date in coverage["dates"]
+        ]
         
         return {
             'status': 'success',
             'data': response_data,
-            'total_komoditas_diperlukan': len(KOMODITAS_DIPERLUKAN)
+            'total_komoditas_diperlukan': len(KOMODITAS_DIPERLUKAN),
+            'watermarks': coverage["watermarks"],
+            'gaps': coverage["gaps"]
         }
     
     except Exception as e:
@@ -283,5 +441,6 @@ if __name__ == "__main__":
             logger.error(f"  - Pemetaan tidak valid: {', '.join(mapping_check['invalid_mappings'])}")
     else:
         logger.info("✅ Pemetaan komoditas valid.")
+        schema.ensure_schema()
         result = scrape_and_store()
         logger.info(f"Hasil scraping: {result}")
\ No newline at end of file
@@ -0,0 +1,120 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from utils import save_series_npz, load_series_npz, load_json, save_json_atomic
+
+# Modul backend (db_pool, config) ada satu direktori di atas scripts/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+SNAPSHOT_DIR = os.path.join(BACKEND_DIR, "datasets", "db_snapshot")
+INDEX_FILE = os.path.join(SNAPSHOT_DIR, "index.json")
+FETCH_SIZE = 5000
+
+
+def _connect():
+    import db_pool
+    return db_pool.connection()
+
+
+def _where(keys):
+    if not keys:
+        return "", []
+    return f"WHERE komoditas_key IN ({', '.join(['%s'] * len(keys))})", list(keys)
+
+
+def load_signatures(cursor, keys=None):
+    """
+    Tanda tangan ringan per komoditas (jumlah baris, tanggal terakhir, total harga)
+    untuk mendeteksi perubahan tanpa membaca semua baris
+
+    Returns:
+        dict: {komoditas_key: [count, last_date, sum]}
+    """
+    where, params = _where(keys)
+    cursor.execute(f"""
+        SELECT komoditas_key, COUNT(*), MAX(tanggal), SUM(harga)
+        FROM harga_komoditas {where}
+        GROUP BY komoditas_key
+    """, params)
+    return {
+        key: [int(count), last_date.strftime("%Y-%m-%d"), f"{total:.2f}"]
+        for key, count, last_date, total in cursor.fetchall()
+    }
+
+
+def fetch_series(cursor, keys):
+    """
+    Ambil series beberapa komoditas dengan satu query, dibaca bertahap (fetchmany)
+
+    Returns:
+        dict: {komoditas_key: (array tanggal, array harga)}
+    """
+    where, params = _where(keys)
+    cursor.execute(f"""
+        SELECT komoditas_key, tanggal, harga FROM harga_komoditas {where}
+        ORDER BY komoditas_key, tanggal
+    """, params)
+
+    columns = {}
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for key, tanggal, harga in rows:
+            dates, values = columns.setdefault(key, ([], []))
+            dates.append(tanggal)
+            values.append(float(harga))
+
+    return {
+        key: (np.array(dates, dtype='datetime64[D]'), np.array(values, dtype=np.float64))
+        for key, (dates, values) in columns.items()
+    }
+
+
+def load_db_datasets(komoditas_keys=None, min_rows=60):
+    """
+    Dataset training dari tabel harga_komoditas
+
+    Setiap komoditas disimpan sebagai snapshot .npz di datasets/db_snapshot/.
+    Komoditas yang tanda tangannya tidak berubah dibaca dari snapshot; hanya
+    komoditas yang berubah diambil dari database (satu query untuk semuanya).
+
+    Returns:
+        tuple: (dict {komoditas_key: DataFrame Tanggal/Harga}, set komoditas yang berubah)
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    index = load_json(INDEX_FILE, {})
+
+    with _connect() as conn:
+        with conn.cursor() as cursor:
+            signatures = load_signatures(cursor, komoditas_keys)
+            changed = {
+                key for key, signature in signatures.items()
+                if index.get(key) != signature or not os.path.exists(os.path.join(SNAPSHOT_DIR, f"{key}.npz"))
+            }
+            fetched = fetch_series(cursor, sorted(changed)) if changed else {}
+
+    for key, (dates, values) in fetched.items():
+        save_series_npz(os.path.join(SNAPSHOT_DIR, f"{key}.npz"), dates, values, {"signature": signatures[key]})
+        index[key] = signatures[key]
+    if fetched:
+        save_json_atomic(INDEX_FILE, index)
+
+    datasets = {}
+    for key in sorted(signatures):
+        df, _ = load_series_npz(os.path.join(SNAPSHOT_DIR, f"{key}.npz"))
+        if df is None:
+            print(f"Error loading snapshot {key}")
+            continue
+        if len(df) < min_rows:
+            print(f"Data {key} tidak cukup untuk model LSTM: {len(df)} baris, minimal {min_rows}")
+            continue
+        datasets[key] = df
+        status = "diperbarui" if key in changed else "dari snapshot"
+        print(f"Loaded dataset: {key} ({status}), shape: {df.shape}")
+
+    return datasets, changed
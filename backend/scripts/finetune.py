@@ -0,0 +1,149 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from tensorflow.keras.models import load_model
+from tensorflow.keras.optimizers import Adam
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from utils import sliding_windows, save_json_atomic, load_json, _temp_path, _replace_or_cleanup
+from model import evaluate_model
+from main import load_datasets, training_meta_path, MODEL_DIR, SCALER_DIR
+import progress
+
+
+def finetune_model(dataset_name, df, epochs=5, learning_rate=1e-4, tolerance=0.0, time_step=60):
+    """
+    Fine-tuning model yang sudah ada dengan data baru sejak watermark training terakhir
+
+    Model lama dimuat dari <komoditas>_model.h5 dan dilatih beberapa epoch hanya
+    pada window yang targetnya setelah watermark. Scaler lama tetap dipakai agar
+    skala input tidak berubah. Hasilnya divalidasi pada 20% window terakhir
+    sebelum watermark (set uji yang sama dengan training penuh) dan hanya
+    dipromosikan jika RMSE tidak lebih buruk dari model lama pada window yang sama.
+
+    Args:
+        tolerance: Kenaikan RMSE relatif yang masih diterima (0.0 = tidak boleh lebih buruk)
+
+    Returns:
+        dict: status 'promoted', 'rejected', 'skipped' atau 'failed'
+    """
+    model_path = os.path.join(MODEL_DIR, f"{dataset_name}_model.h5")
+    scaler_path = os.path.join(SCALER_DIR, f"{dataset_name}_scaler.pkl")
+    metrics_path = os.path.join(MODEL_DIR, f"{dataset_name}_metrics.json")
+    meta = load_json(training_meta_path(dataset_name))
+
+    if not os.path.exists(model_path) or not os.path.exists(scaler_path) or not meta:
+        return {'status': 'skipped', 'message': 'Model atau watermark training belum ada, jalankan training penuh'}
+
+    try:
+        if 'Tanggal' in df.columns:
+            df = df.set_index('Tanggal')
+        dates = pd.to_datetime(df.index)
+        watermark = pd.Timestamp(meta['last_date'])
+        first_new = int(np.searchsorted(dates.values, watermark.to_datetime64(), side='right'))
+        if first_new >= len(df):
+            return {'status': 'skipped', 'message': f"Tidak ada data baru setelah {meta['last_date']}"}
+
+        scaler = joblib.load(scaler_path)
+        series = scaler.transform(df[['Harga']].values)[:, 0]
+
+        # Window ke-i memprediksi series[i + time_step]
+        X_all = sliding_windows(series, time_step, len(series) - time_step)[..., np.newaxis]
+        y_all = series[time_step:]
+        targets = np.arange(time_step, len(series))
+
+        new_mask = targets >= first_new
+        old_count = int((~new_mask).sum())
+        if old_count == 0:
+            return {'status': 'skipped', 'message': 'Data lama tidak cukup untuk validasi'}
+        X_new, y_new = X_all[new_mask], y_all[new_mask]
+        val_start = int(old_count * 0.8)
+        X_val, y_val = X_all[val_start:old_count], y_all[val_start:old_count]
+
+        model = load_model(model_path)
+        # Acuan: model lama pada X_val yang sama. Metrik tersimpan diukur pada window
+        # uji lain (dan setelah promosi pertama window ini sudah ikut di-fine-tune)
+        baseline = evaluate_model(model, X_val, y_val)
+        reference_rmse = baseline['rmse']
+
+        progress.emit("commodity_begin", komoditas=dataset_name)
+        model.compile(optimizer=Adam(learning_rate=learning_rate), loss='mean_squared_error')
+        model.fit(
+            X_new, y_new,
+            epochs=epochs,
+            batch_size=min(32, len(X_new)),
+            callbacks=[progress.ProgressCallback(dataset_name, epochs)],
+            verbose=1 if sys.stdout.isatty() else 2
+        )
+        metrics = evaluate_model(model, X_val, y_val)
+
+        result = {
+            'new_windows': int(len(X_new)),
+            'metrics': metrics,
+            'baseline_metrics': baseline,
+            'reference_rmse': float(reference_rmse)
+        }
+        if metrics['rmse'] > reference_rmse * (1 + tolerance):
+            print(f"Fine-tuning {dataset_name} ditolak: RMSE {metrics['rmse']:.4f} > {reference_rmse:.4f}")
+            return {'status': 'rejected', **result}
+
+        # Promosi atomik: tulis ke file sementara lalu os.replace, agar pembaca
+        # (model registry) tidak pernah melihat file model yang setengah tertulis
+        _replace_or_cleanup(_temp_path(model_path, suffix=".tmp.h5"), model_path, model.save)
+        save_json_atomic(metrics_path, metrics)
+        save_json_atomic(training_meta_path(dataset_name), {
+            **meta,
+            'last_date': dates[-1].strftime("%Y-%m-%d"),
+            'trained_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'mode': 'finetune',
+            'samples': int(len(df))
+        })
+
+        print(f"Fine-tuning {dataset_name} dipromosikan: RMSE {metrics['rmse']:.4f} (acuan {reference_rmse:.4f})")
+        return {'status': 'promoted', 'model_path': model_path, **result}
+
+    except Exception as e:
+        print(f"Error fine-tuning model for {dataset_name}: {e}")
+        return {'status': 'failed', 'error': str(e)}
+
+
+def finetune_models(komoditas=None, epochs=5, tolerance=0.0, source=None):
+    """Fine-tuning semua dataset (atau satu komoditas); source sama dengan load_datasets"""
+    datasets = load_datasets(komoditas, source=source)
+    progress.emit("run_begin", komoditas=sorted(datasets), epochs=epochs)
+
+    results = {}
+    for dataset_name, df in datasets.items():
+        results[dataset_name] = finetune_model(dataset_name, df, epochs=epochs, tolerance=tolerance)
+        progress.emit(
+            "commodity_end",
+            komoditas=dataset_name,
+            status=results[dataset_name]['status'],
+            metrics=results[dataset_name].get('metrics'),
+            error=results[dataset_name].get('error')
+        )
+    return results
+
+
+# Jika file dijalankan langsung
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fine-tuning model LSTM dengan data baru sejak training terakhir')
+    parser.add_argument('--komoditas', type=str, help='Nama komoditas spesifik (opsional)')
+    parser.add_argument('--epochs', type=int, default=5, help='Jumlah epoch fine-tuning (default 5)')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Kenaikan RMSE relatif yang masih diterima, misalnya 0.02 untuk 2%%')
+    parser.add_argument('--source', choices=['csv', 'db'], default=None,
+                        help='Sumber data: csv atau db (default env TRAINING_SOURCE)')
+
+    args = parser.parse_args()
+    results = finetune_models(args.komoditas, epochs=args.epochs, tolerance=args.tolerance, source=args.source)
+
+    for dataset_name, result in results.items():
+        print(f"{dataset_name}: {result['status']} {result.get('message') or result.get('error') or ''}".rstrip())
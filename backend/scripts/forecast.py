@@ -0,0 +1,309 @@
+import json
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import tensorflow as tf
+
+# Cache fungsi rollout yang sudah dikompilasi per model
+_ROLLOUT_FNS = weakref.WeakKeyDictionary()
+_ROLLOUT_LOCK = threading.Lock()
+
+
+def _build_rollout_fn(model):
+    """
+    Buat tf.function yang menjalankan prediksi autoregresif seluruh horizon
+    di dalam satu graph. Output LSTM langsung dimasukkan kembali ke window
+    input tanpa keluar dari device.
+    """
+    @tf.function(input_signature=[
+        tf.TensorSpec(shape=(None, None, 1), dtype=tf.float32),
+        tf.TensorSpec(shape=(), dtype=tf.int32),
+    ])
+    def rollout(window, steps):
+        outputs = tf.TensorArray(tf.float32, size=steps)
+        for i in tf.range(steps):
+            next_pred = model(window, training=False)  # (batch, 1)
+            outputs = outputs.write(i, next_pred[:, 0])
+            # Geser window: buang nilai terlama, tambahkan prediksi terbaru
+            window = tf.concat([window[:, 1:, :], next_pred[:, None, :]], axis=1)
+        # (steps, batch) -> (batch, steps)
+        return tf.transpose(outputs.stack())
+
+    return rollout
+
+
+def get_rollout_fn(model):
+    with _ROLLOUT_LOCK:
+        fn = _ROLLOUT_FNS.get(model)
+        if fn is None:
+            fn = _build_rollout_fn(model)
+            _ROLLOUT_FNS[model] = fn
+        return fn
+
+
+def rollout(model, scaled_window, steps):
+    """
+    Prediksi autoregresif `steps` langkah ke depan dari window yang sudah dinormalisasi
+
+    Args:
+        model: Model Keras (input: [batch, time_step, 1], output: [batch, 1])
+        scaled_window: Array ternormalisasi dengan shape (time_step,), (time_step, 1)
+                       atau (batch, time_step, 1)
+        steps (int): Jumlah langkah prediksi
+
+    Returns:
+        np.ndarray: Prediksi ternormalisasi dengan shape (batch, steps)
+    """
+    window = np.asarray(scaled_window, dtype=np.float32)
+    if window.ndim == 1:
+        window = window.reshape(1, -1, 1)
+    elif window.ndim == 2:
+        window = window.reshape(1, window.shape[0], 1)
+
+    if steps <= 0:
+        return np.zeros((window.shape[0], 0), dtype=np.float32)
+
+    fn = get_rollout_fn(model)
+    return fn(tf.constant(window), tf.constant(int(steps), dtype=tf.int32)).numpy()
+
+
+def forecast_prices(model, scaler, prices, steps, time_step=60):
+    """
+    Prediksi harga `steps` hari ke depan dari harga historis (belum dinormalisasi)
+
+    Normalisasi dan denormalisasi masing-masing hanya dilakukan satu kali.
+
+    Args:
+        model: Model Keras
+        scaler: Scaler yang dipakai saat training
+        prices: Harga historis urut dari terlama ke terbaru (minimal `time_step` nilai)
+        steps (int): Jumlah hari prediksi
+        time_step (int): Panjang window input model
+
+    Returns:
+        np.ndarray: Harga prediksi dengan shape (steps,)
+    """
+    harga_np = np.asarray(prices, dtype=np.float32).reshape(-1, 1)[-time_step:]
+    harga_scaled = scaler.transform(harga_np).reshape(1, time_step, 1)
+    preds_scaled = rollout(model, harga_scaled, steps)
+    return scaler.inverse_transform(preds_scaled.reshape(-1, 1)).flatten()
+
+
+# Fungsi rollout bertumpuk per signature arsitektur (LRU, dibatasi STACKED_CACHE_SIZE).
+# Weight model adalah argumen fungsi, sehingga subset dan urutan komoditas apa pun
+# dengan arsitektur sama memakai graph yang sama tanpa tracing ulang.
+STACKED_CACHE_SIZE = 8
+_STACKED_ROLLOUT_FNS = OrderedDict()
+# Weight numpy per model (hilang otomatis saat model dibuang registry)
+_MODEL_WEIGHTS = weakref.WeakKeyDictionary()
+
+
+def architecture_signature(model):
+    """
+    Signature arsitektur model (jenis layer dan konfigurasinya, tanpa nama layer).
+    Model dengan signature sama bisa dijalankan bersama dalam satu graph.
+    """
+    layers = []
+    for layer in model.layers:
+        config = {k: v for k, v in layer.get_config().items() if k not in ("name", "trainable")}
+        layers.append((layer.__class__.__name__, json.dumps(config, sort_keys=True, default=str)))
+    return (str(model.input_shape), tuple(layers))
+
+
+def _layer_plan(model):
+    """
+    Rencana eksekusi bertumpuk: list (jenis, konfigurasi, jumlah weight) per layer.
+    Mengembalikan None jika model memakai layer atau opsi yang tidak didukung.
+    """
+    plan = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        config = layer.get_config()
+        if kind in ("InputLayer", "Dropout"):
+            # Dropout tidak aktif saat inferensi
+            plan.append((kind, None, 0))
+        elif kind == "LSTM":
+            if config.get("go_backwards") or config.get("stateful") or config.get("return_state"):
+                return None
+            plan.append((kind, {
+                "units": config["units"],
+                "activation": config.get("activation", "tanh"),
+                "recurrent_activation": config.get("recurrent_activation", "sigmoid"),
+                "return_sequences": bool(config.get("return_sequences")),
+                "use_bias": config.get("use_bias", True)
+            }, len(layer.get_weights())))
+        elif kind == "Dense":
+            plan.append((kind, {
+                "activation": config.get("activation", "linear"),
+                "use_bias": config.get("use_bias", True)
+            }, len(layer.get_weights())))
+        else:
+            return None
+    return plan
+
+
+def _stacked_lstm(config, weights, x):
+    """
+    LSTM untuk n model sekaligus. x: (n, batch, time, input), weight bertumpuk
+    dengan dimensi pertama n. Urutan gate sama dengan Keras: i, f, c, o.
+    """
+    kernel, recurrent_kernel = weights[0], weights[1]
+    activation = tf.keras.activations.get(config["activation"])
+    recurrent_activation = tf.keras.activations.get(config["recurrent_activation"])
+
+    # Proyeksi input semua timestep sekaligus: (n, batch, time, 4 * units)
+    z_input = tf.einsum("nbti,nij->nbtj", x, kernel)
+    if config["use_bias"]:
+        z_input += weights[2][:, None, None, :]
+
+    shape = tf.shape(x)
+    state = tf.zeros([shape[0], shape[1], config["units"]], dtype=x.dtype)
+
+    def step(carry, z_t):
+        h, c = carry
+        z = z_t + tf.einsum("nbu,nuj->nbj", h, recurrent_kernel)
+        z_i, z_f, z_c, z_o = tf.split(z, 4, axis=-1)
+        c = recurrent_activation(z_f) * c + recurrent_activation(z_i) * activation(z_c)
+        h = recurrent_activation(z_o) * activation(c)
+        return h, c
+
+    # scan di sepanjang sumbu waktu: (time, n, batch, 4 * units)
+    hidden, _ = tf.scan(step, tf.transpose(z_input, [2, 0, 1, 3]), initializer=(state, state))
+    if config["return_sequences"]:
+        return tf.transpose(hidden, [1, 2, 0, 3])
+    return hidden[-1]
+
+
+def _stacked_dense(config, weights, x):
+    y = tf.einsum("n...i,nio->n...o", x, weights[0])
+    if config["use_bias"]:
+        bias = weights[1]
+        y += tf.reshape(bias, tf.concat([tf.shape(bias)[:1], tf.ones([x.shape.rank - 2], tf.int32), tf.shape(bias)[1:]], 0))
+    return tf.keras.activations.get(config["activation"])(y)
+
+
+def _stacked_forward(plan, weights, x):
+    """Forward pass n model berarsitektur sama dengan weight bertumpuk"""
+    position = 0
+    for kind, config, count in plan:
+        layer_weights = weights[position:position + count]
+        position += count
+        if kind == "LSTM":
+            x = _stacked_lstm(config, layer_weights, x)
+        elif kind == "Dense":
+            x = _stacked_dense(config, layer_weights, x)
+    return x
+
+
+def _build_stacked_rollout_fn(plan, weight_shapes):
+    """
+    Satu tf.function untuk n model dengan arsitektur sama. Weight semua model
+    ditumpuk sehingga setiap langkah horizon adalah satu forward pass untuk
+    semua komoditas, bukan satu panggilan model per komoditas.
+    """
+    @tf.function(input_signature=[
+        tf.TensorSpec(shape=(None, None, 1), dtype=tf.float32),
+        tf.TensorSpec(shape=(), dtype=tf.int32),
+        [tf.TensorSpec(shape=(None,) + tuple(shape), dtype=tf.float32) for shape in weight_shapes],
+    ])
+    def rollout(windows, steps, weights):
+        outputs = tf.TensorArray(tf.float32, size=steps)
+        for i in tf.range(steps):
+            # (n, 1, time, 1) -> (n, 1, 1): satu window per model
+            next_preds = _stacked_forward(plan, weights, windows[:, None, :, :])[:, 0, :]
+            outputs = outputs.write(i, next_preds[:, 0])
+            windows = tf.concat([windows[:, 1:, :], next_preds[:, None, :]], axis=1)
+        return tf.transpose(outputs.stack())
+
+    return rollout
+
+
+def get_stacked_rollout_fn(model):
+    """
+    Fungsi rollout bertumpuk untuk arsitektur model ini, atau None jika
+    arsitekturnya tidak didukung
+    """
+    signature = architecture_signature(model)
+    with _ROLLOUT_LOCK:
+        if signature in _STACKED_ROLLOUT_FNS:
+            _STACKED_ROLLOUT_FNS.move_to_end(signature)
+            return _STACKED_ROLLOUT_FNS[signature]
+
+    plan = _layer_plan(model)
+    fn = _build_stacked_rollout_fn(plan, [w.shape for w in _model_weights(model)]) if plan else None
+    with _ROLLOUT_LOCK:
+        _STACKED_ROLLOUT_FNS[signature] = fn
+        _STACKED_ROLLOUT_FNS.move_to_end(signature)
+        while len(_STACKED_ROLLOUT_FNS) > STACKED_CACHE_SIZE:
+            _STACKED_ROLLOUT_FNS.popitem(last=False)
+    return fn
+
+
+def _model_weights(model):
+    with _ROLLOUT_LOCK:
+        weights = _MODEL_WEIGHTS.get(model)
+        if weights is None:
+            weights = [np.asarray(w, dtype=np.float32) for w in model.get_weights()]
+            _MODEL_WEIGHTS[model] = weights
+        return weights
+
+
+def _scaled_window(scaler, prices, time_step):
+    return scaler.transform(
+        np.asarray(prices, dtype=np.float32).reshape(-1, 1)[-time_step:]
+    ).astype(np.float32)
+
+
+def forecast_prices_batch(requests, time_step=60):
+    """
+    Prediksi harga untuk banyak komoditas sekaligus
+
+    Model dengan arsitektur yang sama dijalankan sebagai satu model bertumpuk
+    (weight semua model ditumpuk), sehingga setiap langkah horizon adalah satu
+    forward pass untuk semua komoditas. Arsitektur yang tidak didukung
+    dikelompokkan per model dan dijalankan sebagai satu batch per model.
+    Horizon tiap kelompok mengikuti permintaan terpanjang.
+
+    Args:
+        requests (list): List of (model, scaler, prices, steps)
+        time_step (int): Panjang window input model
+
+    Returns:
+        list: Harga prediksi (np.ndarray shape (steps,)) sesuai urutan requests
+    """
+    results = [None] * len(requests)
+
+    groups = {}
+    for index, (model, scaler, prices, steps) in enumerate(requests):
+        groups.setdefault(architecture_signature(model), []).append(index)
+
+    for indices in groups.values():
+        max_steps = max(int(requests[i][3]) for i in indices)
+        if max_steps <= 0:
+            for i in indices:
+                results[i] = np.zeros(0, dtype=np.float32)
+            continue
+
+        windows = np.stack([_scaled_window(requests[i][1], requests[i][2], time_step) for i in indices])
+        fn = get_stacked_rollout_fn(requests[indices[0]][0])
+
+        if fn is not None:
+            model_weights = [_model_weights(requests[i][0]) for i in indices]
+            stacked = [tf.constant(np.stack(layer)) for layer in zip(*model_weights)]
+            preds_scaled = fn(tf.constant(windows), tf.constant(max_steps, dtype=tf.int32), stacked).numpy()
+        else:
+            # Fallback: satu batch per model (permintaan dengan model sama digabung)
+            preds_scaled = np.empty((len(indices), max_steps), dtype=np.float32)
+            by_model = {}
+            for row, i in enumerate(indices):
+                by_model.setdefault(id(requests[i][0]), []).append(row)
+            for rows in by_model.values():
+                model = requests[indices[rows[0]]][0]
+                preds_scaled[rows] = rollout(model, windows[rows], max_steps)
+
+        for row, i in enumerate(indices):
+            scaler, steps = requests[i][1], int(requests[i][3])
+            results[i] = scaler.inverse_transform(preds_scaled[row, :steps].reshape(-1, 1)).flatten()
+
+    return results
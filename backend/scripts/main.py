@@ -10,12 +10,18 @@ from sklearn.preprocessing import MinMaxScaler
 import argparse
 import json
 import sys
+import hashlib
+import inspect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from utils import load_and_clean_data, create_dataset, split_data
+from utils import load_and_clean_data, create_dataset, split_data, save_json_atomic, load_json
+import progress
 from model import build_lstm_model, train_model, evaluate_model, predict_future
 import visualization
 
@@ -26,11 +32,34 @@ MODEL_DIR = os.path.join(BASE_DIR, "models")
 SCALER_DIR = os.path.join(BASE_DIR, "scalers")
 PLOT_DIR = os.path.join(BASE_DIR, "plots")
 
+EPOCHS = 100
+
+# Hyperparameter training, bagian dari fingerprint model
+HYPERPARAMETERS = {
+    'time_step': 60,
+    'epochs': EPOCHS,
+    'batch_size': 32,
+    'train_size': 0.8
+}
 
 for directory in [DATASET_DIR, MODEL_DIR, SCALER_DIR, PLOT_DIR]:
     os.makedirs(directory, exist_ok=True)
 
-def load_datasets(specific_komoditas=None):
+def load_datasets(specific_komoditas=None, source=None):
+    """
+    Muat dataset training per komoditas
+
+    Args:
+        specific_komoditas: Nama komoditas spesifik (opsional)
+        source: 'csv' (datasets/<komoditas>.csv) atau 'db' (tabel harga_komoditas,
+                di-cache sebagai snapshot .npz). Default env TRAINING_SOURCE atau 'csv'.
+    """
+    source = source or os.environ.get('TRAINING_SOURCE', 'csv')
+    if source == 'db':
+        from db_source import load_db_datasets
+        keys = [specific_komoditas.lower().replace(" ", "_").replace("-", "_")] if specific_komoditas else None
+        datasets, _ = load_db_datasets(keys)
+        return datasets
 
     datasets = {}
     
@@ -54,96 +83,250 @@ def load_datasets(specific_komoditas=None):
     
     return datasets
 
-def train_models(komoditas=None):
+def training_meta_path(dataset_name):
+    return os.path.join(MODEL_DIR, f"{dataset_name}_training_meta.json")
+
+def fingerprint_path(dataset_name):
+    return os.path.join(MODEL_DIR, f"{dataset_name}_fingerprint.json")
+
+def code_version():
+    """Hash kode yang menentukan hasil training (model.py, utils.py dan train_single_model)"""
+    digest = hashlib.sha256()
+    for module_file in ("model.py", "utils.py"):
+        with open(os.path.join(current_dir, module_file), 'rb') as f:
+            digest.update(f.read())
+    digest.update(inspect.getsource(train_single_model).encode())
+    return digest.hexdigest()
+
+def dataset_fingerprint(df, code_hash):
+    """
+    Fingerprint training satu komoditas: hash isi series (tanggal dan harga),
+    hyperparameter dan versi kode
+    """
+    series = df.set_index('Tanggal') if 'Tanggal' in df.columns else df
+    data_hash = hashlib.sha256()
+    data_hash.update(pd.to_datetime(series.index).values.astype('datetime64[ns]').tobytes())
+    data_hash.update(series['Harga'].to_numpy(dtype=np.float64).tobytes())
+    return {
+        'data_hash': data_hash.hexdigest(),
+        'hyperparameters': HYPERPARAMETERS,
+        'code_hash': code_hash
+    }
+
+def is_up_to_date(dataset_name, fingerprint):
+    """Model sudah ada dan dilatih dengan fingerprint yang sama"""
+    model_path = os.path.join(MODEL_DIR, f"{dataset_name}_model.h5")
+    return os.path.exists(model_path) and load_json(fingerprint_path(dataset_name)) == fingerprint
+
+@contextmanager
+def _worker_env(threads):
+    """
+    Batas thread untuk worker lewat variabel lingkungan. Harus sudah di-set saat
+    worker di-spawn, karena TensorFlow dan OpenMP membacanya ketika modul ini
+    diimport di worker, sebelum initializer berjalan.
+    """
+    values = {
+        "OMP_NUM_THREADS": str(threads),
+        "TF_NUM_INTRAOP_THREADS": str(threads),
+        "TF_NUM_INTEROP_THREADS": "1"
+    }
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def _init_worker(threads):
+    """Batasi thread TensorFlow per proses worker agar worker tidak saling berebut core"""
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def train_single_model(dataset_name, df):
+    """
+    Training, evaluasi dan penyimpanan model untuk satu komoditas.
+    Error ditangkap dan dikembalikan sebagai hasil 'failed' agar tidak
+    menghentikan komoditas lain.
+    """
+    print(f"Training model for {dataset_name}...")
+    progress.emit("commodity_begin", komoditas=dataset_name)
+    
+    try:
+        # Pastikan Tanggal menjadi index
+        if 'Tanggal' in df.columns:
+            df = df.set_index('Tanggal')
+        
+        # Normalisasi data
+        scaler = MinMaxScaler(feature_range=(0, 1))
+        scaled_data = scaler.fit_transform(df[['Harga']].values)
+        
+        # Simpan scaler untuk digunakan saat prediksi nanti
+        scaler_path = os.path.join(SCALER_DIR, f"{dataset_name}_scaler.pkl")
+        joblib.dump(scaler, scaler_path)
+        
+        # Buat time series dataset
+        X, y = create_dataset(scaled_data, time_step=HYPERPARAMETERS['time_step'])
+        
+        # Reshape data untuk LSTM [samples, time steps, features]
+        X = X.reshape(X.shape[0], X.shape[1], 1)
+        
+        # Split data untuk training dan testing
+        X_train, X_test, y_train, y_test = split_data(X, y, train_size=HYPERPARAMETERS['train_size'])
+        
+        # Buat model LSTM
+        model = build_lstm_model(X_train)
+        
+        # Training model
+        # verbose=2 (satu baris per epoch) jika output tidak ke terminal, misalnya dijalankan dari admin
+        history = train_model(
+            model, X_train, y_train, X_test, y_test,
+            epochs=HYPERPARAMETERS['epochs'], batch_size=HYPERPARAMETERS['batch_size'],
+            callbacks=[progress.ProgressCallback(dataset_name, HYPERPARAMETERS['epochs'])],
+            verbose=1 if sys.stdout.isatty() else 2
+        )
+        
+        # Simpan model
+        model_path = os.path.join(MODEL_DIR, f"{dataset_name}_model.h5")
+        model.save(model_path)
+        
+        # Plot dan simpan history training (loss) dengan timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        loss_plot_filename = visualization.plot_training_history(history, dataset_name, PLOT_DIR)
+        
+        # Evaluasi model
+        y_pred = model.predict(X_test)
+        
+        # Denormalisasi prediksi dan data aktual untuk evaluasi
+        y_pred_denorm = scaler.inverse_transform(y_pred)
+        y_test_denorm = scaler.inverse_transform(y_test.reshape(-1, 1))
+        
+        # Hitung metrik
+        metrics = evaluate_model(model, X_test, y_test)
+        
+        # Simpan metrik ke file
+        metrics_path = os.path.join(MODEL_DIR, f"{dataset_name}_metrics.json")
+        save_json_atomic(metrics_path, metrics)
+        
+        # Watermark training: tanggal data terakhir yang sudah dipelajari model (dipakai finetune.py)
+        save_json_atomic(training_meta_path(dataset_name), {
+            'last_date': pd.Timestamp(df.index[-1]).strftime("%Y-%m-%d"),
+            'trained_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'mode': 'full',
+            'samples': int(len(df))
+        })
+        
+        # Plot dan simpan prediksi vs aktual dengan timestamp
+        predictions = {dataset_name: {'y_pred': y_pred_denorm, 'y_test': y_test_denorm}}
+        evaluations = {dataset_name: metrics}
+        # pred_plot_filename = visualization.plot_predictions(dataset_name, predictions, evaluations, PLOT_DIR)
+        try:
+            pred_plot_filename = visualization.plot_predictions(dataset_name, predictions, evaluations, PLOT_DIR)
+            print(f"Plot prediksi berhasil dibuat: {pred_plot_filename}")
+        except Exception as e:
+            print(f"Error membuat plot prediksi: {e}")
+            pred_plot_filename = None
+                    
+        # Hasil training komoditas ini
+        result = {
+            'metrics': metrics,
+            'model_path': model_path,
+            'loss_plot': os.path.join(PLOT_DIR, loss_plot_filename),
+            'pred_plot': os.path.join(PLOT_DIR, pred_plot_filename)
+        }
+        
+        print(f"Training completed for {dataset_name}")
+        print(f"RMSE: {metrics['rmse']:.4f}, MAE: {metrics['mae']:.4f}")
+        
+        return result
+        
+    except Exception as e:
+        print(f"Error training model for {dataset_name}: {e}")
+        return {
+            'error': str(e),
+            'status': 'failed'
+        }
+
+def _report_result(dataset_name, result):
+    """Kirim event selesai per komoditas ke pembaca progres (admin)"""
+    progress.emit(
+        "commodity_end",
+        komoditas=dataset_name,
+        status=result.get('status', 'completed'),
+        metrics=result.get('metrics'),
+        error=result.get('error')
+    )
+
+def train_models(komoditas=None, workers=1, source=None, force=False):
+    """
+    Training model untuk semua dataset (atau satu komoditas)
+
+    Args:
+        komoditas: Nama komoditas spesifik (opsional)
+        workers: Jumlah proses training paralel. Setiap worker mendapat bagian
+                 core CPU yang sama sebagai batas thread TensorFlow.
+        source: Sumber data 'csv' atau 'db' (lihat load_datasets)
+        force: Latih ulang walaupun fingerprint tidak berubah
+    """
 
     # Proses dataset
-    datasets = load_datasets(komoditas)
+    datasets = load_datasets(komoditas, source=source)
     
     # Dictionary untuk menyimpan hasil
     results = {}
     
-    for dataset_name, df in datasets.items():
-        print(f"Training model for {dataset_name}...")
-        
-        try:
-            # Pastikan Tanggal menjadi index
-            if 'Tanggal' in df.columns:
-                df = df.set_index('Tanggal')
-            
-            # Normalisasi data
-            scaler = MinMaxScaler(feature_range=(0, 1))
-            scaled_data = scaler.fit_transform(df[['Harga']].values)
-            
-            # Simpan scaler untuk digunakan saat prediksi nanti
-            scaler_path = os.path.join(SCALER_DIR, f"{dataset_name}_scaler.pkl")
-            joblib.dump(scaler, scaler_path)
-            
-            # Buat time series dataset
-            X, y = create_dataset(scaled_data, time_step=60)
-            
-            # Reshape data untuk LSTM [samples, time steps, features]
-            X = X.reshape(X.shape[0], X.shape[1], 1)
-            
-            # Split data untuk training dan testing
-            X_train, X_test, y_train, y_test = split_data(X, y, train_size=0.8)
-            
-            # Buat model LSTM
-            model = build_lstm_model(X_train)
-            
-            # Training model
-            history = train_model(model, X_train, y_train, X_test, y_test)
-            
-            # Simpan model
-            model_path = os.path.join(MODEL_DIR, f"{dataset_name}_model.h5")
-            model.save(model_path)
-            
-            # Plot dan simpan history training (loss) dengan timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            loss_plot_filename = visualization.plot_training_history(history, dataset_name, PLOT_DIR)
-            
-            # Evaluasi model
-            y_pred = model.predict(X_test)
-            
-            # Denormalisasi prediksi dan data aktual untuk evaluasi
-            y_pred_denorm = scaler.inverse_transform(y_pred)
-            y_test_denorm = scaler.inverse_transform(y_test.reshape(-1, 1))
-            
-            # Hitung metrik
-            metrics = evaluate_model(model, X_test, y_test)
-            
-            # Simpan metrik ke file
-            metrics_path = os.path.join(MODEL_DIR, f"{dataset_name}_metrics.json")
-            with open(metrics_path, 'w') as f:
-                json.dump(metrics, f)
-            
-            # Plot dan simpan prediksi vs aktual dengan timestamp
-            predictions = {dataset_name: {'y_pred': y_pred_denorm, 'y_test': y_test_denorm}}
-            evaluations = {dataset_name: metrics}
-            # pred_plot_filename = visualization.plot_predictions(dataset_name, predictions, evaluations, PLOT_DIR)
+    progress.emit("run_begin", komoditas=sorted(datasets), epochs=EPOCHS)
+    
+    # Lewati komoditas yang data, hyperparameter dan kodenya sama dengan model tersimpan
+    code_hash = code_version()
+    fingerprints = {name: dataset_fingerprint(df, code_hash) for name, df in datasets.items()}
+    if not force:
+        for dataset_name in list(datasets):
+            if is_up_to_date(dataset_name, fingerprints[dataset_name]):
+                print(f"Skipping {dataset_name}: fingerprint tidak berubah")
+                results[dataset_name] = {
+                    'status': 'skipped',
+                    'message': 'Data, hyperparameter dan kode tidak berubah sejak training terakhir',
+                    'metrics': load_json(os.path.join(MODEL_DIR, f"{dataset_name}_metrics.json"))
+                }
+                _report_result(dataset_name, results[dataset_name])
+                del datasets[dataset_name]
+    
+    def finish(dataset_name, result):
+        results[dataset_name] = result
+        if 'error' not in result:
+            save_json_atomic(fingerprint_path(dataset_name), fingerprints[dataset_name])
+        _report_result(dataset_name, result)
+    
+    workers = max(1, min(workers, len(datasets)))
+    if workers == 1:
+        for dataset_name, df in datasets.items():
+            finish(dataset_name, train_single_model(dataset_name, df))
+        return results
+    
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Training {len(datasets)} model dengan {workers} worker ({threads} thread per worker)")
+    
+    # spawn: setiap worker memulai TensorFlow sendiri, tidak mewarisi state dari parent
+    # Worker hasil spawn mewarisi os.environ parent saat dibuat
+    with _worker_env(threads), ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                   initializer=_init_worker, initargs=(threads,)) as executor:
+        futures = {executor.submit(train_single_model, name, df): name for name, df in datasets.items()}
+        for future in as_completed(futures):
+            dataset_name = futures[future]
             try:
-                pred_plot_filename = visualization.plot_predictions(dataset_name, predictions, evaluations, PLOT_DIR)
-                print(f"Plot prediksi berhasil dibuat: {pred_plot_filename}")
+                result = future.result()
             except Exception as e:
-                print(f"Error membuat plot prediksi: {e}")
-                pred_plot_filename = None
-                        
-            # Simpan hasil ke dictionary
-            results[dataset_name] = {
-                'metrics': metrics,
-                'model_path': model_path,
-                'loss_plot': os.path.join(PLOT_DIR, loss_plot_filename),
-                'pred_plot': os.path.join(PLOT_DIR, pred_plot_filename)
-            }
-            
-            print(f"Training completed for {dataset_name}")
-            print(f"RMSE: {metrics['rmse']:.4f}, MAE: {metrics['mae']:.4f}")
-            
-        except Exception as e:
-            print(f"Error training model for {dataset_name}: {e}")
-            results[dataset_name] = {
-                'error': str(e),
-                'status': 'failed'
-            }
+                # Worker mati (misalnya kehabisan memori) tanpa sempat mengembalikan hasil
+                print(f"Error training model for {dataset_name}: {e}")
+                result = {
+                    'error': str(e),
+                    'status': 'failed'
+                }
+            finish(dataset_name, result)
     
     return results
 
@@ -171,16 +354,24 @@ def train_commodity_model(komoditas):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Train LSTM models for prediksi harga komoditas')
     parser.add_argument('--komoditas', type=str, help='Nama komoditas spesifik untuk dilatih (opsional)')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('TRAINING_WORKERS', 1)),
+                        help='Jumlah proses training paralel (default 1 atau env TRAINING_WORKERS)')
+    parser.add_argument('--source', choices=['csv', 'db'], default=None,
+                        help='Sumber data training: csv (datasets/) atau db (tabel harga_komoditas)')
+    parser.add_argument('--force', action='store_true',
+                        help='Latih ulang semua komoditas walaupun fingerprint tidak berubah')
     
     args = parser.parse_args()
     
     # Train model
-    results = train_models(args.komoditas)
+    results = train_models(args.komoditas, workers=args.workers, source=args.source, force=args.force)
     
     # Print hasil
     for dataset_name, result in results.items():
         if 'error' in result:
             print(f"Error training {dataset_name}: {result['error']}")
+        elif result.get('status') == 'skipped':
+            print(f"Skipped {dataset_name}: {result['message']}")
         else:
             print(f"Training completed for {dataset_name}")
             print(f"RMSE: {result['metrics']['rmse']:.4f}, MAE: {result['metrics']['mae']:.4f}")
\ No newline at end of file
@@ -4,6 +4,7 @@ from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping
 import numpy as np
 from sklearn.metrics import mean_squared_error, mean_absolute_error
+from forecast import rollout
 
 def build_lstm_model(X_train):
    
@@ -23,7 +24,7 @@ def build_lstm_model(X_train):
     
     return model
 
-def train_model(model, X_train, y_train, X_test, y_test, epochs=100, batch_size=32):
+def train_model(model, X_train, y_train, X_test, y_test, epochs=100, batch_size=32, callbacks=None, verbose=1):
     
     # berhenti cepat agar ga overfitting
     early_stopping = EarlyStopping(
@@ -38,8 +39,8 @@ def train_model(model, X_train, y_train, X_test, y_test, epochs=100, batch_size=
         epochs=epochs,
         batch_size=batch_size,
         validation_data=(X_test, y_test),
-        callbacks=[early_stopping],
-        verbose=1
+        callbacks=[early_stopping] + list(callbacks or []),
+        verbose=verbose
     )
     
     return history
@@ -59,20 +60,8 @@ def evaluate_model(model, X_test, y_test):
 
 def predict_future(model, scaler, last_sequence, days=30):
     
-    predictions = []
-    
-    #copy sequence terakhir untuk prediksi
-    current_sequence = last_sequence.copy()
-    
-    # prediksi n hari ke depan
-    for _ in range(days):
-       
-        x_input = current_sequence.reshape(1, current_sequence.shape[0], 1)
-        next_pred = model.predict(x_input)[0][0]
-        predictions.append(next_pred)
-        current_sequence = np.append(current_sequence[1:], [next_pred])
-        
-    predictions = np.array(predictions).reshape(-1, 1)
+    # prediksi n hari ke depan dalam satu graph (autoregresif)
+    predictions = rollout(model, last_sequence, days).reshape(-1, 1)
     
     predictions_denorm = scaler.inverse_transform(predictions)
     
@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 import joblib
 from tensorflow.keras.models import load_model
+from forecast import rollout
+from utils import sliding_windows
 
 def load_model_and_scaler(model_path, scaler_path):
     """
@@ -18,35 +20,20 @@ def prepare_input_data(data, scaler, time_step=60):
     # Normalisasi data
     scaled_data = scaler.transform(data)
     
-    # Membuat sequence data
-    X = []
-    for i in range(len(scaled_data) - time_step):
-        X.append(scaled_data[i:(i + time_step), 0])
+    # Membuat sequence data (view tanpa salinan per window)
+    X = sliding_windows(scaled_data[:, 0], time_step, len(scaled_data) - time_step)
     
-    return np.array(X).reshape(-1, time_step, 1)
+    return X[..., np.newaxis]
 
 def predict_future(model, last_sequence, steps_ahead=30, scaler=None):
-#    prediksi masa depann
-    future_predictions = []
-    current_sequence = last_sequence.copy()
-    
-    for _ in range(steps_ahead):
-        
-        current_reshape = current_sequence.reshape(1, -1, 1)
-      
-        next_pred = model.predict(current_reshape)[0, 0]
-        
-        future_predictions.append(next_pred)
-       
-        current_sequence = np.append(current_sequence[1:], next_pred)
+#    prediksi masa depann (seluruh horizon dalam satu graph)
+    future_predictions = rollout(model, last_sequence, steps_ahead)[0]
     
     # Denormalisasi jika scaler disediakan
     if scaler:
-        future_predictions = scaler.inverse_transform(
-            np.array(future_predictions).reshape(-1, 1)
-        )
+        return scaler.inverse_transform(future_predictions.reshape(-1, 1))
     
-    return future_predictions
+    return list(future_predictions)
 
 def predict_bpp(data_file, model_file, scaler_file, future_days=30):
 
@@ -0,0 +1,58 @@
+import sys
+import json
+import time
+from tensorflow.keras.callbacks import Callback
+
+# Penanda baris progres di stdout, agar bisa dipisahkan dari log biasa
+PROGRESS_PREFIX = "@@progress "
+
+
+def emit(event, **fields):
+    """Tulis satu event progres sebagai baris JSON (satu write agar tidak tercampur antar worker)"""
+    payload = {"event": event, "time": time.time(), **fields}
+    sys.stdout.write(PROGRESS_PREFIX + json.dumps(payload) + "\n")
+    sys.stdout.flush()
+
+
+def parse_line(line):
+    """
+    Ambil event progres dari satu baris output trainer
+
+    Returns:
+        dict atau None jika baris bukan event progres
+    """
+    line = line.strip()
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PROGRESS_PREFIX):])
+    except ValueError:
+        return None
+
+
+class ProgressCallback(Callback):
+    """Callback Keras yang mengirim event progres per epoch untuk satu komoditas"""
+
+    def __init__(self, komoditas, epochs):
+        super().__init__()
+        self.komoditas = komoditas
+        self.epochs = epochs
+        self._epoch_start = None
+
+    def on_train_begin(self, logs=None):
+        emit("train_begin", komoditas=self.komoditas, epochs=self.epochs)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        emit(
+            "epoch",
+            komoditas=self.komoditas,
+            epoch=epoch + 1,
+            epochs=self.epochs,
+            loss=float(logs["loss"]) if "loss" in logs else None,
+            val_loss=float(logs["val_loss"]) if "val_loss" in logs else None,
+            epoch_time=time.time() - self._epoch_start if self._epoch_start else None
+        )
@@ -1,33 +1,123 @@
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import MinMaxScaler
 import os
+import json
+import tempfile
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import MinMaxScaler
-import os
 
-def load_and_clean_data(file_path):
+# Format tanggal yang dikenali, dicoba berurutan (format hari-dulu didahulukan).
+# Tambahkan format baru dengan register_date_format.
+DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S']
+DATE_SAMPLE_SIZE = 50
+# Format tanggal file dataset setelah upload atau preprocessing ditulis ulang
+CSV_DATE_FORMAT = '%Y-%m-%d'
+
+class DateFormatError(ValueError):
+    """Kolom tanggal berisi format campuran atau nilai yang tidak dikenali"""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report or {}
+
+def register_date_format(date_format, first=False):
+    """Tambahkan format tanggal ke daftar deteksi"""
+    if date_format in DATE_FORMATS:
+        return
+    if first:
+        DATE_FORMATS.insert(0, date_format)
+    else:
+        DATE_FORMATS.append(date_format)
+
+def _matches(values, date_format):
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    return parsed.notna()
+
+def detect_date_format(values, formats=None, hint=None, sample_size=DATE_SAMPLE_SIZE):
+    """
+    Tentukan format tanggal dari sampel baris pertama
+
+    Args:
+        values: Series string tanggal
+        hint: Format yang dicoba lebih dulu (misalnya format yang tercatat sebelumnya)
+
+    Returns:
+        str: Format pertama yang cocok dengan semua sampel, atau None
+    """
+    candidates = list(formats or DATE_FORMATS)
+    if hint:
+        candidates = [hint] + [date_format for date_format in candidates if date_format != hint]
+    sample = values.dropna().astype(str).str.strip().head(sample_size)
+    if sample.empty:
+        return None
+    for date_format in candidates:
+        if _matches(sample, date_format).all():
+            return date_format
+    return None
+
+def _date_format_report(values, formats):
+    """Jumlah baris per format (format pertama yang cocok) dan format tiap baris"""
+    remaining = values.notna()
+    counts = {}
+    first_match = pd.Series(None, index=values.index, dtype=object)
+    for date_format in formats:
+        matched = remaining & _matches(values, date_format)
+        if matched.any():
+            counts[date_format] = int(matched.sum())
+            first_match[matched] = date_format
+            remaining &= ~matched
+    unknown = values.notna() & first_match.isna()
+    if unknown.any():
+        counts['tidak dikenali'] = int(unknown.sum())
+    return counts, first_match
+
+def parse_dates(values, formats=None, hint=None):
+    """
+    Parse kolom tanggal dengan satu panggilan to_datetime vektor setelah format
+    dideteksi dari sampel. Kolom dengan format campuran ditolak dengan laporan
+    jumlah baris per format, bukan diinferensi per elemen.
+
+    Returns:
+        tuple: (Series datetime, format yang dipakai)
+
+    Raises:
+        DateFormatError: Jika format tidak dikenali atau campuran
+    """
+    formats = list(formats or DATE_FORMATS)
+    values = values.astype(str).str.strip().where(values.notna())
+    date_format = detect_date_format(values, formats, hint=hint)
+
+    if date_format is not None:
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+        bad = parsed.isna() & values.notna()
+        if not bad.any():
+            return parsed, date_format
+    else:
+        bad = values.notna()
+
+    counts, first_match = _date_format_report(values, formats)
+    # Nomor baris file (header = baris 1)
+    examples = [
+        f"baris {index + 2}: {values[index]!r} ({first_match[index] or 'tidak dikenali'})"
+        for index in bad[bad].index[:5]
+    ]
+    summary = ", ".join(f"{count} baris {name}" for name, count in counts.items())
+    raise DateFormatError(
+        f"Format tanggal campuran atau tidak dikenali ({summary}). Contoh: {'; '.join(examples)}",
+        {"formats": counts, "detected": date_format, "examples": examples}
+    )
+
+def _parse_and_clean(file_path, date_format=None):
   
     try:
         print(f"Memproses file: {file_path}")
-        df = pd.read_csv(file_path, delimiter=';')
+        df = pd.read_csv(file_path, delimiter=';', dtype={'Tanggal': str})
    
-        date_formats = ['%d/%m/%Y', '%Y-%m-%d']
-        for date_format in date_formats:
-            try:
-                df['Tanggal'] = pd.to_datetime(df['Tanggal'], format=date_format)
-                print(f"Berhasil mengkonversi tanggal dengan format {date_format}")
-                break
-            except Exception as e:
-                print(f"Error konversi tanggal dengan format {date_format}: {e}")
-                continue
-        else:
-            try:
-                df['Tanggal'] = pd.to_datetime(df['Tanggal'])
-                print("Berhasil mengkonversi tanggal dengan format default")
-            except Exception as e2:
-                raise ValueError(f"Gagal mengkonversi tanggal: {e2}")
+        if 'Tanggal' not in df.columns:
+            raise ValueError("Kolom Tanggal tidak ditemukan")
+        df['Tanggal'], detected = parse_dates(df['Tanggal'], hint=date_format)
+        print(f"Berhasil mengkonversi tanggal dengan format {detected}")
         
         # Jika kolom tidak bernama "Harga", coba temukan
         if "Harga" not in df.columns:
@@ -47,15 +137,73 @@ def load_and_clean_data(file_path):
             raise ValueError(f"Data tidak cukup untuk model LSTM. Hanya tersedia {len(df)} baris, minimal 60 baris diperlukan.")
     
         df = df.reset_index()
+        df.attrs['date_format'] = detected
         
         print(f"Preprocessing berhasil: {len(df)} baris data")
         return df
     
+    except DateFormatError as e:
+        print(f"Error saat memuat atau membersihkan data: {e}")
+        raise
     except Exception as e:
         error_msg = f"Error saat memuat atau membersihkan data: {str(e)}"
         print(error_msg)
         raise Exception(error_msg)
 
+# Versi format cache; naikkan jika logika pembersihan data berubah
+CLEAN_CACHE_VERSION = 2
+
+def clean_cache_path(file_path):
+    """Lokasi cache data bersih: datasets/.cache/<file>.csv.npz"""
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), ".cache", f"{os.path.basename(file_path)}.npz")
+
+def _file_signature(file_path):
+    stat = os.stat(file_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'version': CLEAN_CACHE_VERSION}
+
+def store_clean_cache(file_path, df, signature=None):
+    """
+    Simpan series bersih (Tanggal, Harga) sebagai cache untuk file_path.
+    signature adalah mtime dan ukuran file yang dibaca untuk menghasilkan df
+    (default: file saat ini). Data dengan kolom lain tidak di-cache.
+    """
+    if set(df.columns) != {'Tanggal', 'Harga'}:
+        return
+    cache_path = clean_cache_path(file_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    meta = {
+        **(signature or _file_signature(file_path)),
+        'harga_dtype': str(df['Harga'].dtype),
+        'date_format': df.attrs.get('date_format')
+    }
+    save_series_npz(cache_path, df['Tanggal'].values, df['Harga'].values, meta)
+
+def load_and_clean_data(file_path, use_cache=True, date_format=None):
+    """
+    Baca dan bersihkan dataset CSV. Hasilnya di-cache sebagai .npz kolumnar
+    (key: mtime dan ukuran file), sehingga CSV hanya di-parse ulang jika berubah.
+    Format tanggal yang terdeteksi ada di df.attrs['date_format'] dan disimpan
+    di metadata cache; date_format (jika ada) dicoba lebih dulu saat deteksi.
+    """
+    # Signature diambil sebelum parse: jika file berubah selama parse, cache
+    # tercatat dengan versi lama dan akan di-parse ulang, bukan sebaliknya
+    signature = _file_signature(file_path)
+    if use_cache:
+        df, meta = load_series_npz(clean_cache_path(file_path))
+        if df is not None and all(meta.get(key) == value for key, value in signature.items()):
+            df['Harga'] = df['Harga'].astype(meta.get('harga_dtype', 'float64'))
+            df.attrs['date_format'] = meta.get('date_format')
+            print(f"Memuat data bersih dari cache: {file_path} ({len(df)} baris)")
+            return df
+
+    df = _parse_and_clean(file_path, date_format)
+    if use_cache:
+        try:
+            store_clean_cache(file_path, df, signature)
+        except OSError as e:
+            print(f"Gagal menyimpan cache data bersih: {e}")
+    return df
+
 def normalize_data(df, dataset_name, scalers):
     
     if 'Tanggal' in df.columns:
@@ -69,13 +217,57 @@ def normalize_data(df, dataset_name, scalers):
     
     return df_scaled
 
+def sliding_windows(series, time_step=60, count=None):
+    """
+    Semua window berurutan sepanjang time_step dari series 1 dimensi sebagai view
+    (tanpa menyalin data). Window ke-i adalah series[i:i + time_step].
+
+    Args:
+        series: Array 1 dimensi
+        time_step: Panjang window
+        count: Jumlah window yang diambil dari awal (default semua)
+
+    Returns:
+        np.ndarray: View read-only dengan shape (count, time_step)
+    """
+    series = np.asarray(series)
+    available = max(len(series) - time_step + 1, 0)
+    count = available if count is None else max(min(count, available), 0)
+    if count == 0:
+        return np.empty((0, time_step), dtype=series.dtype)
+    return sliding_window_view(series, time_step)[:count]
+
 def create_dataset(data, time_step=60):
- 
-    X, y = [], []
-    for i in range(len(data) - time_step - 1):
-        X.append(data[i:(i + time_step), 0])
-        y.append(data[i + time_step, 0])
-    return np.array(X), np.array(y)
+    """
+    Buat pasangan X (window time_step hari) dan y (harga hari berikutnya).
+    X adalah view dari data sehingga tidak ada salinan per window.
+    """
+    data = np.asarray(data)
+    count = max(len(data) - time_step - 1, 0)
+    X = sliding_windows(data[:, 0], time_step, count)
+    y = data[time_step:time_step + count, 0]
+    return X, y
+
+def create_tf_dataset(data, time_step=60, batch_size=32, shuffle=False):
+    """
+    Versi tf.data dari create_dataset untuk series yang terlalu besar untuk
+    dibentuk sebagai array X sekaligus. Window dibuat per batch saat training,
+    dengan pasangan (X, y) yang sama persis dengan create_dataset.
+
+    Returns:
+        tf.data.Dataset: Batch (X dengan shape (batch, time_step, 1), y)
+    """
+    import tensorflow as tf
+
+    data = np.asarray(data, dtype=np.float32)
+    count = max(len(data) - time_step - 1, 0)
+    return tf.keras.utils.timeseries_dataset_from_array(
+        data[:count + time_step - 1, :1],
+        data[time_step:time_step + count, 0],
+        sequence_length=time_step,
+        batch_size=batch_size,
+        shuffle=shuffle
+    )
 
 def split_data(X, y, train_size=0.8):
     train_len = int(len(X) * train_size)
@@ -93,4 +285,87 @@ def evaluate_model(model, X_test, y_test):
     y_pred = model.predict(X_test)
     rmse = np.sqrt(mean_squared_error(y_test, y_pred))
     mae = mean_absolute_error(y_test, y_pred)
-    return rmse, mae
\ No newline at end of file
+    return rmse, mae
+
+@contextmanager
+def file_lock(lock_path):
+    """
+    Kunci eksklusif antar proses (flock pada file lock_path), agar beberapa proses
+    tidak menjalankan baca-ubah-tulis file bersama secara bersamaan
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # Windows: tanpa kunci antar proses
+        yield
+        return
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _temp_path(path, suffix=".tmp"):
+    """File sementara unik di direktori yang sama dengan path (os.replace tetap atomik)"""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', prefix=f".{os.path.basename(path)}.", suffix=suffix
+    )
+    os.close(fd)
+    return tmp_path
+
+def _replace_or_cleanup(tmp_path, path, write):
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_json_atomic(path, data):
+    """Tulis JSON ke file sementara unik lalu ganti file lama dengan os.replace (atomik)"""
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+    _replace_or_cleanup(_temp_path(path), path, write)
+
+def load_json(path, default=None):
+    """Baca file JSON, atau kembalikan default jika file tidak ada / rusak"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_series_npz(path, dates, values, meta=None):
+    """
+    Simpan series harga sebagai snapshot kolumnar .npz (tanggal dan harga sebagai
+    array terpisah), ditulis atomik lewat file sementara
+    """
+    def write(tmp_path):
+        np.savez(
+            tmp_path,
+            tanggal=np.asarray(dates, dtype='datetime64[D]'),
+            harga=np.asarray(values, dtype=np.float64),
+            meta=np.array(json.dumps(meta or {}))
+        )
+    _replace_or_cleanup(_temp_path(path, suffix=".tmp.npz"), path, write)
+
+def load_series_npz(path):
+    """
+    Baca snapshot dari save_series_npz
+
+    Returns:
+        tuple: (DataFrame dengan kolom Tanggal dan Harga, dict meta), atau (None, None)
+    """
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            df = pd.DataFrame({
+                'Tanggal': pd.to_datetime(data['tanggal']),
+                'Harga': data['harga']
+            })
+            meta = json.loads(str(data['meta']))
+        return df, meta
+    except (OSError, ValueError, KeyError):
+        return None, None
@@ -2,6 +2,36 @@ import os
 import datetime
 import matplotlib.pyplot as plt
 
+from utils import save_json_atomic, load_json, file_lock
+
+# Indeks plot terbaru per (komoditas, tipe), dibaca oleh backend (plot_index.py)
+PLOT_INDEX_FILE = "index.json"
+# Kunci bersama untuk baca-ubah-tulis indeks (juga dipakai plot_index.py)
+INDEX_LOCK_FILE = ".index.lock"
+
+def _index_lock(plot_path):
+    """Kunci file agar beberapa proses training tidak menimpa indeks bersamaan"""
+    return file_lock(os.path.join(plot_path, INDEX_LOCK_FILE))
+
+def record_plot(plot_path, dataset_name, plot_type, filename):
+    """
+    Catat plot terbaru untuk (komoditas, tipe) di plots/index.json beserta
+    mtime, ukuran dan ETag, sehingga backend tidak perlu glob direktori plot
+    """
+    stat = os.stat(os.path.join(plot_path, filename))
+    entry = {
+        'file': filename,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'etag': f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    }
+    index_path = os.path.join(plot_path, PLOT_INDEX_FILE)
+    with _index_lock(plot_path):
+        index = load_json(index_path, {})
+        index.setdefault(dataset_name, {})[plot_type] = entry
+        save_json_atomic(index_path, index)
+    return entry
+
 def plot_training_history(history, dataset_name, plot_path):
     """
     Plot riwayat pelatihan model dan simpan sebagai gambar
@@ -27,6 +57,7 @@ def plot_training_history(history, dataset_name, plot_path):
     # Simpan plot baru
     plt.savefig(os.path.join(plot_path, filename))
     plt.close()
+    record_plot(plot_path, dataset_name, 'training_history', filename)
     
     # Return path file untuk referensi
     return filename
@@ -77,6 +108,7 @@ def plot_predictions(dataset_name, predictions, evaluations, plot_path):
     plt.savefig(full_path)
     print(f"Plot prediksi disimpan di: {full_path}")
     plt.close()
+    record_plot(plot_path, dataset_name, 'predictions', filename)
     
     # Return path file untuk referensi
     return filename
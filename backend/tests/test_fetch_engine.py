@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import requests
+
+from fetch_engine import FetchEngine, RateLimiter
+
+
+class StubServer:
+    """
+    Server HTTP lokal pengganti API harga pangan.
+
+    Respons per key (parameter `key`) diatur lewat `script`: list status yang
+    dikembalikan berurutan (status terakhir diulang), dan `delays` untuk
+    menunda respons. Body 200 berisi kembali key yang diminta.
+    """
+
+    def __init__(self):
+        self.script = {}
+        self.delays = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                key = parse_qs(urlparse(self.path).query).get("key", [""])[0]
+                with stub.lock:
+                    count = stub.calls.get(key, 0)
+                    stub.calls[key] = count + 1
+                statuses = stub.script.get(key, [200])
+                status = statuses[min(count, len(statuses) - 1)]
+                time.sleep(stub.delays.get(key, 0))
+
+                body = json.dumps({"key": key} if status == 200 else {"error": status}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    with StubServer() as server:
+        yield server
+
+
+def make_engine(stub, **kwargs):
+    options = {"concurrency": 4, "rate_limit": 0, "max_retries": 3, "backoff": 0.01, "timeout": 5}
+    options.update(kwargs)
+    return FetchEngine(base_url=stub.url, **options)
+
+
+def test_retry_on_5xx_then_success(stub):
+    stub.script["a"] = [503, 500, 200]
+    engine = make_engine(stub)
+
+    assert engine.fetch({"key": "a"}) == {"key": "a"}
+    assert stub.calls["a"] == 3
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.script["a"] = [502]
+    engine = make_engine(stub, max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        engine.fetch({"key": "a"})
+    assert stub.calls["a"] == 3
+
+
+def test_client_error_is_not_retried(stub):
+    stub.script["a"] = [404]
+    engine = make_engine(stub)
+
+    with pytest.raises(requests.HTTPError):
+        engine.fetch({"key": "a"})
+    assert stub.calls["a"] == 1
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(rate=20, burst=1)
+
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire("host")
+    # Token pertama langsung tersedia, 5 berikutnya masing-masing 1/20 detik
+    assert time.monotonic() - start >= 5 / 20 * 0.9
+
+
+def test_rate_limiter_is_per_host():
+    limiter = RateLimiter(rate=1, burst=1)
+
+    start = time.monotonic()
+    limiter.acquire("a")
+    limiter.acquire("b")
+    assert time.monotonic() - start < 0.5
+
+
+def test_engine_applies_rate_limit(stub):
+    engine = make_engine(stub, rate_limit=20)
+    engine.rate_limiter.capacity = 1
+
+    start = time.monotonic()
+    results = list(engine.fetch_many([(i, {"key": str(i)}) for i in range(6)]))
+    assert len(results) == 6
+    assert time.monotonic() - start >= 5 / 20 * 0.9
+
+
+def test_fetch_many_pairs_results_with_keys(stub):
+    # Request awal paling lambat, sehingga urutan selesai berbeda dari urutan job
+    keys = [str(i) for i in range(4)]
+    for i, key in enumerate(keys):
+        stub.delays[key] = 0.05 * (len(keys) - i)
+    stub.script["3"] = [500, 200]
+    engine = make_engine(stub)
+
+    results = list(engine.fetch_many([(key, {"key": key}) for key in keys]))
+
+    assert sorted(key for key, _, _ in results) == keys
+    assert [key for key, _, _ in results] != keys
+    for key, data, error in results:
+        assert error is None
+        assert data == {"key": key}
+
+
+def test_fetch_many_reports_errors_per_key(stub):
+    stub.script["bad"] = [404]
+    engine = make_engine(stub)
+
+    results = {key: (data, error) for key, data, error in engine.fetch_many([
+        ("good", {"key": "good"}),
+        ("bad", {"key": "bad"}),
+    ])}
+
+    assert results["good"] == ({"key": "good"}, None)
+    assert results["bad"][0] is None
+    assert isinstance(results["bad"][1], requests.HTTPError)
@@ -0,0 +1,413 @@
+import os
+import json
+import signal
+import socket
+import threading
+import logging
+from datetime import datetime
+import db_pool
+import schema
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# Field progres dari run_training_process yang disimpan di kolom details
+DETAIL_FIELDS = (
+    "current_komoditas", "epoch", "epochs", "loss", "val_loss",
+    "eta_seconds", "komoditas_done", "komoditas_total", "komoditas_skipped"
+)
+
+
+def _terminate_process_group(pid):
+    """
+    Hentikan proses training beserta worker ProcessPool-nya. Trainer dijalankan
+    dengan start_new_session, sehingga PID-nya juga ID process group.
+    """
+    if not hasattr(os, "killpg"):
+        # Windows: tidak ada process group, hentikan proses utama saja
+        os.kill(pid, signal.SIGTERM)
+        return
+    try:
+        pgid = os.getpgid(pid)
+        if pgid != pid:
+            # PID sudah dipakai proses lain yang bukan pemimpin group trainer
+            return
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _format_datetime(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["details"] = json.loads(job["details"] or "{}")
+    job["options"] = json.loads(job.get("options") or "{}")
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    for column in ("created_at", "started_at", "finished_at", "heartbeat_at"):
+        job[column] = _format_datetime(job[column])
+    return job
+
+
+def _conflicts(komoditas, running):
+    """Job training semua komoditas (None) bentrok dengan job apa pun; selain itu per komoditas"""
+    if komoditas is None:
+        return bool(running)
+    key = schema.komoditas_key(komoditas)
+    return any(other is None or schema.komoditas_key(other) == key for other in running)
+
+
+def to_training_status(job):
+    """Bentuk status lama (TRAINING_STATUS) dari satu job, untuk frontend yang sudah ada"""
+    if job is None:
+        return {
+            "is_training": False, "komoditas": None, "start_time": None, "end_time": None,
+            "progress": 0, "status": None, "message": None, "job_id": None,
+            **{field: None for field in DETAIL_FIELDS}
+        }
+    return {
+        "is_training": job["status"] in ACTIVE_STATUSES,
+        "komoditas": job["komoditas"],
+        "start_time": job["started_at"],
+        "end_time": job["finished_at"],
+        "progress": job["progress"],
+        "status": job["status"],
+        "message": job["message"],
+        "job_id": job["id"],
+        **{field: job["details"].get(field) for field in DETAIL_FIELDS}
+    }
+
+
+class TrainingJobQueue:
+    """
+    Antrian job training yang disimpan di tabel training_jobs.
+
+    Setiap proses aplikasi menjalankan dispatcher yang mengambil job antrian
+    (diklaim di bawah GET_LOCK MySQL, sehingga aman dengan banyak worker gunicorn).
+    Batasan:
+    - Maksimal Config.TRAINING_MAX_CONCURRENT job berjalan di semua proses
+    - Satu job per komoditas; job semua komoditas berjalan sendirian
+    Job yang berjalan memperbarui progres dan heartbeat secara berkala. Job yang
+    heartbeat-nya berhenti (proses mati) dikembalikan ke antrian sampai
+    Config.TRAINING_MAX_ATTEMPTS kali, setelah itu ditandai gagal.
+    """
+
+    def __init__(self, runner):
+        """
+        Args:
+            runner: Fungsi runner(komoditas, status, on_start, **options) yang menjalankan
+                    training, memperbarui dict status dan memanggil on_start(process)
+        """
+        self.runner = runner
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ---------- Operasi antrian ----------
+
+    def enqueue(self, komoditas=None, options=None):
+        """
+        Tambahkan job ke antrian. Job aktif dengan komoditas yang sama dikembalikan
+        apa adanya agar permintaan ganda tidak menumpuk.
+
+        Args:
+            options (dict): Opsi tambahan untuk runner, misalnya {"force": True}
+
+        Returns:
+            tuple: (job dict, bool apakah job baru dibuat)
+        """
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT GET_LOCK('commoprize_training_queue', 10) AS locked")
+                if cursor.fetchone()["locked"] != 1:
+                    raise RuntimeError("Gagal mendapatkan kunci antrian training")
+                try:
+                    cursor.execute(
+                        "SELECT * FROM training_jobs WHERE status IN ('queued', 'running') ORDER BY id"
+                    )
+                    for row in cursor.fetchall():
+                        same_scope = (row["komoditas"] is None and komoditas is None) or (
+                            row["komoditas"] is not None and komoditas is not None
+                            and schema.komoditas_key(row["komoditas"]) == schema.komoditas_key(komoditas)
+                        )
+                        if same_scope:
+                            return _row_to_job(row), False
+
+                    cursor.execute(
+                        "INSERT INTO training_jobs (komoditas, status, options, created_at) VALUES (%s, 'queued', %s, NOW())",
+                        (komoditas, json.dumps(options or {}))
+                    )
+                    job_id = cursor.lastrowid
+                    conn.commit()
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK('commoprize_training_queue')")
+                    cursor.fetchone()
+
+        logger.info(f"📥 Job training {job_id} masuk antrian ({komoditas or 'semua komoditas'})")
+        return self.get(job_id), True
+
+    def get(self, job_id):
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT * FROM training_jobs WHERE id = %s", (job_id,))
+                row = cursor.fetchone()
+        return _row_to_job(row) if row else None
+
+    def current(self):
+        """Job yang sedang berjalan, job antrian terdepan, atau job terakhir"""
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("""
+                    SELECT * FROM training_jobs
+                    ORDER BY CASE status WHEN 'running' THEN 0 WHEN 'queued' THEN 1 ELSE 2 END,
+                             CASE WHEN status = 'queued' THEN id ELSE -id END
+                    LIMIT 1
+                """)
+                row = cursor.fetchone()
+        return _row_to_job(row) if row else None
+
+    def history(self, limit=50, status=None):
+        query = "SELECT * FROM training_jobs"
+        params = []
+        if status:
+            query += " WHERE status = %s"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT %s"
+        params.append(limit)
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def cancel(self, job_id):
+        """
+        Batalkan job. Job antrian langsung dibatalkan; job yang berjalan diberi tanda
+        dan prosesnya dihentikan oleh worker pemiliknya pada heartbeat berikutnya.
+
+        Returns:
+            dict atau None jika job tidak ditemukan
+        """
+        with db_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE training_jobs
+                    SET status = 'cancelled', finished_at = NOW(), message = 'Dibatalkan sebelum dimulai'
+                    WHERE id = %s AND status = 'queued'
+                """, (job_id,))
+                cursor.execute(
+                    "UPDATE training_jobs SET cancel_requested = 1 WHERE id = %s AND status = 'running'",
+                    (job_id,)
+                )
+            conn.commit()
+        return self.get(job_id)
+
+    # ---------- Dispatcher ----------
+
+    def start(self):
+        """Mulai thread dispatcher di proses ini (aman dipanggil berulang kali)"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._dispatch_loop, name="training-dispatcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._recover_stale()
+                job = self._claim_next()
+                if job:
+                    threading.Thread(
+                        target=self._run_job, args=(job,), name=f"training-job-{job['id']}", daemon=True
+                    ).start()
+                    continue  # Mungkin masih ada slot untuk job lain
+            except Exception as e:
+                logger.error(f"❌ Error pada dispatcher training: {e}")
+            self._stop.wait(Config.TRAINING_POLL_INTERVAL)
+
+    def _recover_stale(self):
+        """
+        Kembalikan job running yang heartbeat-nya berhenti (proses pemiliknya mati).
+        Proses training yatim milik worker di host ini ikut dihentikan agar tidak
+        berjalan ganda dengan percobaan berikutnya.
+        """
+        host = socket.gethostname()
+        with db_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, worker, pid FROM training_jobs
+                    WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+                """, (Config.TRAINING_STALE_AFTER,))
+                for job_id, worker, pid in cursor.fetchall():
+                    if pid and worker and worker.rsplit(":", 1)[0] == host:
+                        logger.warning(f"🛑 Menghentikan proses training yatim job {job_id} (pid {pid})")
+                        _terminate_process_group(pid)
+
+                cursor.execute("""
+                    UPDATE training_jobs
+                    SET status = CASE
+                            WHEN cancel_requested = 1 THEN 'cancelled'
+                            WHEN attempts >= %s THEN 'failed'
+                            ELSE 'queued'
+                        END,
+                        finished_at = CASE
+                            WHEN cancel_requested = 1 OR attempts >= %s THEN NOW()
+                            ELSE NULL
+                        END,
+                        message = 'Proses training terputus',
+                        worker = NULL,
+                        pid = NULL
+                    WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+                """, (Config.TRAINING_MAX_ATTEMPTS, Config.TRAINING_MAX_ATTEMPTS, Config.TRAINING_STALE_AFTER))
+                if cursor.rowcount:
+                    logger.warning(f"⚠️ {cursor.rowcount} job training terputus dipulihkan")
+            conn.commit()
+
+    def _claim_next(self):
+        """Klaim satu job antrian yang boleh berjalan sesuai batasan concurrency"""
+        with db_pool.connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT GET_LOCK('commoprize_training_queue', 10) AS locked")
+                if not cursor.fetchone()["locked"]:
+                    return None
+                try:
+                    cursor.execute("SELECT komoditas FROM training_jobs WHERE status = 'running'")
+                    running = [row["komoditas"] for row in cursor.fetchall()]
+                    if len(running) >= Config.TRAINING_MAX_CONCURRENT:
+                        return None
+
+                    cursor.execute("SELECT id, komoditas FROM training_jobs WHERE status = 'queued' ORDER BY id")
+                    candidate = next(
+                        (row for row in cursor.fetchall() if not _conflicts(row["komoditas"], running)), None
+                    )
+                    if candidate is None:
+                        return None
+
+                    cursor.execute("""
+                        UPDATE training_jobs
+                        SET status = 'running', progress = 0, started_at = NOW(), heartbeat_at = NOW(),
+                            worker = %s, pid = NULL, attempts = attempts + 1, message = 'Proses training sedang berjalan'
+                        WHERE id = %s AND status = 'queued'
+                    """, (self.worker_id, candidate["id"]))
+                    conn.commit()
+                    if not cursor.rowcount:
+                        return None
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK('commoprize_training_queue')")
+                    cursor.fetchone()
+
+        logger.info(f"🚀 Job training {candidate['id']} dimulai di {self.worker_id}")
+        return self.get(candidate["id"])
+
+    def _heartbeat(self, job_id, status):
+        """
+        Simpan progres dan heartbeat
+
+        Returns:
+            tuple: (apakah job diminta dibatalkan, apakah job masih milik worker ini)
+        """
+        details = {field: status.get(field) for field in DETAIL_FIELDS}
+        with db_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE training_jobs SET progress = %s, details = %s, heartbeat_at = NOW()
+                    WHERE id = %s AND worker = %s
+                """, (status.get("progress", 0), json.dumps(details), job_id, self.worker_id))
+                cursor.execute("SELECT cancel_requested, worker FROM training_jobs WHERE id = %s", (job_id,))
+                row = cursor.fetchone()
+            conn.commit()
+        if not row:
+            return False, False
+        return bool(row[0]), row[1] == self.worker_id
+
+    def _set_pid(self, job_id, pid):
+        with db_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE training_jobs SET pid = %s WHERE id = %s AND worker = %s",
+                    (pid, job_id, self.worker_id)
+                )
+            conn.commit()
+
+    def _run_job(self, job):
+        job_id = job["id"]
+        status = {"progress": 0, "status": "running", "message": None}
+        process_holder = {}
+        cancelled = threading.Event()
+        finished = threading.Event()
+
+        lost = threading.Event()
+
+        def stop_process():
+            process = process_holder.get("process")
+            if process is not None and process.poll() is None:
+                _terminate_process_group(process.pid)
+
+        def on_start(process):
+            process_holder["process"] = process
+            try:
+                self._set_pid(job_id, process.pid)
+            except Exception as e:
+                logger.warning(f"⚠️ Gagal menyimpan PID job training {job_id}: {e}")
+            if cancelled.is_set() or lost.is_set():
+                stop_process()
+
+        def heartbeat_loop():
+            while not finished.wait(Config.TRAINING_HEARTBEAT_INTERVAL):
+                try:
+                    cancel_requested, owned = self._heartbeat(job_id, status)
+                    if not owned and not lost.is_set():
+                        # Job sudah dipulihkan worker lain: jangan training ganda
+                        logger.warning(f"⚠️ Job training {job_id} sudah diambil alih, proses dihentikan")
+                        lost.set()
+                        stop_process()
+                    elif cancel_requested and not cancelled.is_set():
+                        logger.info(f"🛑 Membatalkan job training {job_id}")
+                        cancelled.set()
+                        stop_process()
+                except Exception as e:
+                    logger.warning(f"⚠️ Gagal memperbarui heartbeat job training {job_id}: {e}")
+
+        heartbeat = threading.Thread(target=heartbeat_loop, name=f"training-heartbeat-{job_id}", daemon=True)
+        heartbeat.start()
+        try:
+            self.runner(job["komoditas"], status=status, on_start=on_start, **job["options"])
+        except Exception as e:
+            status["status"] = "failed"
+            status["message"] = f"Training gagal: {str(e)}"
+        finally:
+            finished.set()
+            heartbeat.join()
+
+        if lost.is_set():
+            logger.info(f"🏁 Job training {job_id} dilepas, status ditentukan worker pemilik baru")
+            return
+
+        final_status = "cancelled" if cancelled.is_set() else status.get("status", "failed")
+        if final_status not in FINISHED_STATUSES:
+            final_status = "failed"
+        message = "Training dibatalkan" if final_status == "cancelled" else status.get("message")
+        details = {field: status.get(field) for field in DETAIL_FIELDS}
+        try:
+            with db_pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE training_jobs
+                        SET status = %s, progress = %s, details = %s, message = %s,
+                            finished_at = NOW(), heartbeat_at = NOW()
+                        WHERE id = %s AND worker = %s
+                    """, (final_status, status.get("progress", 0), json.dumps(details), message, job_id, self.worker_id))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Gagal menyimpan hasil job training {job_id}: {e}")
+        logger.info(f"🏁 Job training {job_id} selesai dengan status {final_status}")
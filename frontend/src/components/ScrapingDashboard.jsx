@@ -1,8 +1,22 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import axios from 'axios';
 import './ScrapingDashboard.css';
 
 const API_BASE_URL = 'http://localhost:5000/api';
+const SCRAPE_POLL_INTERVAL = 2000; // ms
+const ACTIVE_JOB_STATUSES = ['queued', 'running'];
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Hasil job scraping dalam bentuk yang sama dengan respons scraping lama
+const jobToResult = (job) => {
+  if (job.result) {
+    return { ...job.result, job_id: job.id };
+  }
+  return job.status === 'completed'
+    ? { status: 'success', data_saved: job.data_saved, failed_dates: job.failed_dates, job_id: job.id }
+    : { status: 'error', message: job.message || 'Job scraping gagal', job_id: job.id };
+};
 
 const ScrapingDashboard = () => {
   const [isLoading, setIsLoading] = useState(false);
@@ -13,6 +27,15 @@ const ScrapingDashboard = () => {
   const [daysBack, setDaysBack] = useState(70);
   const [komoditasList, setKomoditasList] = useState([]);
   const [error, setError] = useState(null);
+  const [scrapingProgress, setScrapingProgress] = useState(null);
+  const mountedRef = useRef(true);
+
+  useEffect(() => {
+    mountedRef.current = true;
+    return () => {
+      mountedRef.current = false;
+    };
+  }, []);
 
   // Fungsi untuk mengambil data dengan menggunakan useCallback agar tidak dibuat ulang saat render
   const fetchDataStatus = useCallback(async () => {
@@ -60,12 +83,25 @@ const ScrapingDashboard = () => {
       setError(null);
       setIsScrapingRunning(true);
       setScrapingResult(null);
+      setScrapingProgress(null);
 
+      // Scraping berjalan sebagai job di background (202); status dipantau
+      // lewat /api/scrape/status/<job_id> sampai job selesai
       const response = await axios.post(`${API_BASE_URL}/scrape`, {
         days_back: daysBack
       });
+      let job = response.data.job;
+
+      while (job && ACTIVE_JOB_STATUSES.includes(job.status)) {
+        if (!mountedRef.current) return;
+        setScrapingProgress({ done: job.dates_done, total: job.dates_total, saved: job.data_saved });
+        await sleep(SCRAPE_POLL_INTERVAL);
+        const statusResponse = await axios.get(`${API_BASE_URL}/scrape/status/${job.id}`);
+        job = statusResponse.data.job;
+      }
+      if (!mountedRef.current) return;
 
-      setScrapingResult(response.data);
+      setScrapingResult(job ? jobToResult(job) : response.data);
       
       // Refresh data status after scraping
       await fetchDataStatus();
@@ -73,7 +109,10 @@ const ScrapingDashboard = () => {
       setError(`Error running scraping: ${err.message}`);
       console.error('Error running scraping:', err);
     } finally {
-      setIsScrapingRunning(false);
+      if (mountedRef.current) {
+        setIsScrapingRunning(false);
+        setScrapingProgress(null);
+      }
     }
   };
 
@@ -196,7 +235,10 @@ const ScrapingDashboard = () => {
           >
             {isScrapingRunning ? (
               <>
-                <span className="spinner"></span> Sedang Scraping...
+                <span className="spinner"></span> Sedang Scraping
+                {scrapingProgress && scrapingProgress.total > 0
+                  ? ` (${scrapingProgress.done}/${scrapingProgress.total} tanggal, ${scrapingProgress.saved} data)`
+                  : '...'}
               </>
             ) : (
               'Mulai Scraping'